@@ -3,9 +3,10 @@ from datetime import timedelta
 from flask import Flask, redirect, url_for, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_login import LoginManager, current_user
+from flask_login import LoginManager
 from flask_mail import Mail
 from dotenv import load_dotenv
+from services.replica import RoutingSession
 
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -17,21 +18,108 @@ for candidate in [os.path.join(ROOT_DIR, '.env'), os.path.join(BASE_DIR, '.env')
         load_dotenv(candidate)
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 mail = Mail()
 
 
+def engine_options(url: str, read_only: bool = False) -> dict:
+    """Параметры движка SQLAlchemy из окружения (DB_*).
+
+    Пул — на процесс: DB_POOL_SIZE под число потоков воркера (gunicorn.conf.py
+    задаёт его сам). pre_ping проверяет соединение перед выдачей из пула —
+    после рестарта Postgres запрос получит новое соединение, а не 500.
+    DB_PGBOUNCER=true — за PgBouncer в режиме transaction: своего пула нет,
+    параметры сессии при подключении не передаются (statement_timeout задаётся
+    на роли), у psycopg 3 отключены подготовленные запросы. read_only — для
+    реплики: случайная запись на ней упадёт и на базе, которая репликой не является.
+    """
+    from sqlalchemy.pool import NullPool
+
+    connect_args = {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))}
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true',
+        'connect_args': connect_args,
+    }
+    if os.getenv('DB_PGBOUNCER', 'False').lower() == 'true':
+        options['poolclass'] = NullPool
+        if url.startswith('postgresql+psycopg:'):
+            connect_args['prepare_threshold'] = None
+        return options
+    options.update(
+        pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '5')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    )
+    startup = []
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    if statement_timeout:
+        startup.append(f'-c statement_timeout={statement_timeout}')
+    if read_only:
+        startup.append('-c default_transaction_read_only=on')
+    if startup:
+        connect_args['options'] = ' '.join(startup)
+    return options
+
+
 def create_app() -> Flask:
     app = Flask(__name__, template_folder=os.path.join(BASE_DIR, 'templates'), static_folder=os.path.join(BASE_DIR, 'static'))
 
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'change-me')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://localhost/postgres')
+    # Пул соединений и таймауты — DB_* (см. engine_options и gunicorn.conf.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Реплика для чтения отчётов и публичных страниц (services/replica.py);
+    # после своей записи пользователь REPLICA_STICKY_SECONDS читает с основной базы
+    app.config['DATABASE_REPLICA_URL'] = os.getenv('DATABASE_REPLICA_URL')
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+    if app.config['DATABASE_REPLICA_URL']:
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {
+            'url': app.config['DATABASE_REPLICA_URL'],
+            **engine_options(app.config['DATABASE_REPLICA_URL'], read_only=True),
+        }}
+    # LISTEN для досок (services/events.py) — напрямую в Postgres: через PgBouncer
+    # в режиме transaction подписка не работает
+    app.config['EVENTS_DATABASE_URL'] = os.getenv('EVENTS_DATABASE_URL')
     app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=7)
     app.config['PORTAL_URL'] = os.getenv('PORTAL_URL', '#')
 
+    # Автосписание по техкартам: склад продаж (по умолчанию первый) и фоновое проведение
+    # (задачей в очереди jobs, её выполняет manage.py worker)
+    app.config['SALES_WAREHOUSE_ID'] = int(os.getenv('SALES_WAREHOUSE_ID')) if os.getenv('SALES_WAREHOUSE_ID') else None
+    app.config['BACKFLUSH_ASYNC'] = os.getenv('BACKFLUSH_ASYNC', 'False').lower() == 'true'
+
+    # Кэши сайта: как часто воркер сверяет версии данных с БД и сколько страниц держит
+    app.config['CACHE_VERSION_CHECK_SECONDS'] = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', '2'))
+    app.config['PAGE_CACHE_SIZE'] = int(os.getenv('PAGE_CACHE_SIZE', '256'))
+
+    # Корзина сайта: db | filesystem | memory (memory — только для одного процесса)
+    app.config['CART_STORE'] = os.getenv('CART_STORE', 'db')
+    app.config['CART_TTL_SECONDS'] = int(os.getenv('CART_TTL_SECONDS', str(30 * 24 * 3600)))
+
+    # Загрузки картинок: исходники ждут обработки вне static; IMAGES_ASYNC=false —
+    # обрабатывать в запросе (без manage.py worker)
+    app.config['UPLOAD_INCOMING_DIR'] = os.getenv('UPLOAD_INCOMING_DIR', os.path.join(app.instance_path, 'uploads'))
+    app.config['IMAGES_ASYNC'] = os.getenv('IMAGES_ASYNC', 'True').lower() == 'true'
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '16')) * 1024 * 1024
+
+    # Кэш пользователя с ролью для загрузчика Flask-Login: сколько секунд другие
+    # воркеры могут видеть прежнюю роль и сколько пользователей держать
+    app.config['AUTH_CACHE_SECONDS'] = float(os.getenv('AUTH_CACHE_SECONDS', '30'))
+    app.config['AUTH_CACHE_SIZE'] = int(os.getenv('AUTH_CACHE_SIZE', '1024'))
+
+    # Профилирование запросов (/crm/_perf): доля запросов в выборке, размер
+    # кольцевого буфера, сколько самых долгих SQL хранить на запрос и токен
+    # для сбора /crm/_perf/metrics Prometheus'ом без входа в CRM
+    app.config['PROFILING'] = os.getenv('PROFILING', 'False').lower() == 'true'
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.getenv('PROFILING_SAMPLE_RATE', '0.1'))
+    app.config['PROFILING_BUFFER'] = int(os.getenv('PROFILING_BUFFER', '1000'))
+    app.config['PROFILING_SLOWEST'] = int(os.getenv('PROFILING_SLOWEST', '3'))
+    app.config['PROFILING_METRICS_TOKEN'] = os.getenv('PROFILING_METRICS_TOKEN')
+
     # Mail
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'localhost')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '25'))
@@ -41,10 +129,15 @@ def create_app() -> Flask:
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=os.path.join(BASE_DIR, 'migrations'))
     login_manager.init_app(app)
     mail.init_app(app)
     login_manager.login_view = 'auth.login'
+    # Оборачивает wsgi_app: в замер попадает весь запрос, включая загрузку пользователя
+    from services import profiling
+    profiling.init_app(app)
+    from services import replica
+    replica.init_app(app)
 
     # Import models to register with SQLAlchemy metadata (absolute imports)
     from models import user, catalog, orders, crm, inventory, reviews  # noqa: F401
@@ -62,6 +155,7 @@ def create_app() -> Flask:
     from views.delivery import bp as delivery_bp
     from views.applications import bp as applications_bp
     from views.users import bp as users_bp
+    from views.perf import bp as perf_bp
 
     app.register_blueprint(site_bp)
     app.register_blueprint(auth_bp)
@@ -75,6 +169,18 @@ def create_app() -> Flask:
     app.register_blueprint(delivery_bp)
     app.register_blueprint(users_bp)
     app.register_blueprint(applications_bp)
+    app.register_blueprint(perf_bp)
+
+    from services.idempotency import new_key
+    app.add_template_global(new_key, 'idempotency_key')
+    from services.images import sources as image_sources
+    app.add_template_global(image_sources, 'image_sources')
+    from services import assets, auth
+    app.add_url_rule('/static/dist/<path:filename>', 'assets', assets.send_asset)
+    app.add_template_global(assets.static_url, 'static_url')
+    app.add_template_global(assets.bundle_urls, 'bundle_urls')
+    # services.auth регистрирует загрузчик пользователя Flask-Login
+    app.add_template_global(auth.current_role, 'current_role')
 
     @app.route('/')
     def root():
@@ -82,10 +188,10 @@ def create_app() -> Flask:
 
     @app.before_request
     def restrict_portal_users():
-        if not current_user.is_authenticated:
+        # Статика открыта всем; без обращения к сессии ответ не получает Vary: Cookie
+        if request.endpoint in ('static', 'assets'):
             return
-        role_name = (current_user.role.name if current_user.role else current_user.role_name or '').lower()
-        if role_name != 'user':
+        if not auth.is_portal_user():
             return
         allowed_endpoints = {'auth.logout', 'auth.portal_info', 'auth.login', 'auth.register'}
         endpoint = request.endpoint or ''
@@ -93,139 +199,11 @@ def create_app() -> Flask:
             return
         return redirect(url_for('auth.portal_info'))
 
-    # Ensure DB schema exists and critical columns present
-    with app.app_context():
-        try:
-            # Create tables if they do not exist
-            db.create_all()
-            # Ensure uploads dir exists
-            uploads_root = os.path.join(BASE_DIR, 'static', 'uploads')
-            os.makedirs(os.path.join(uploads_root, 'employees'), exist_ok=True)
-            os.makedirs(os.path.join(uploads_root, 'products'), exist_ok=True)
-            os.makedirs(os.path.join(uploads_root, 'avatars'), exist_ok=True)
-            # Ensure users.password_hash column exists (for fresh or legacy DBs)
-            from sqlalchemy import inspect, text
-            insp = inspect(db.engine)
-            table_names = set(insp.get_table_names())
-            if 'users' in table_names:
-                user_cols = {c['name'] for c in insp.get_columns('users')}
-                if 'password_hash' not in user_cols:
-                    db.session.execute(text('ALTER TABLE users ADD COLUMN password_hash VARCHAR(255);'))
-                    db.session.commit()
-                if 'role_id' not in user_cols:
-                    db.session.execute(text('ALTER TABLE users ADD COLUMN role_id INTEGER;'))
-                    db.session.commit()
-                if 'role' not in user_cols:
-                    db.session.execute(text("ALTER TABLE users ADD COLUMN role VARCHAR(50) NOT NULL DEFAULT 'staff';"))
-                    db.session.commit()
-                else:
-                    # Установить default и заполнить null значением 'staff'
-                    try:
-                        db.session.execute(text("ALTER TABLE users ALTER COLUMN role SET DEFAULT 'staff';"))
-                        db.session.commit()
-                    except Exception:
-                        db.session.rollback()
-                    db.session.execute(text("UPDATE users SET role='staff' WHERE role IS NULL;"))
-                    db.session.commit()
-                if 'avatar_url' not in user_cols:
-                    db.session.execute(text('ALTER TABLE users ADD COLUMN avatar_url VARCHAR(255);'))
-                    db.session.commit()
-
-            # Автопочинка схемы склада
-            if 'stock_movements' in table_names:
-                sm_cols = {c['name'] for c in insp.get_columns('stock_movements')}
-                if 'doc_type' not in sm_cols:
-                    db.session.execute(text("ALTER TABLE stock_movements ADD COLUMN doc_type VARCHAR(30);"))
-                    db.session.commit()
-                if 'doc_id' not in sm_cols:
-                    db.session.execute(text("ALTER TABLE stock_movements ADD COLUMN doc_id INTEGER;"))
-                    db.session.commit()
-                if 'warehouse_id' not in sm_cols:
-                    db.session.execute(text("ALTER TABLE stock_movements ADD COLUMN warehouse_id INTEGER;"))
-                    db.session.commit()
-                if 'note' not in sm_cols:
-                    db.session.execute(text("ALTER TABLE stock_movements ADD COLUMN note VARCHAR(200);"))
-                    db.session.commit()
-
-            if 'stock_items' in table_names:
-                si_cols = {c['name'] for c in insp.get_columns('stock_items')}
-                if 'category' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN category VARCHAR(120);"))
-                    db.session.commit()
-                if 'item_type' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN item_type VARCHAR(50) DEFAULT 'raw';"))
-                    db.session.commit()
-                if 'sku' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN sku VARCHAR(100);"))
-                    db.session.commit()
-                if 'barcode' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN barcode VARCHAR(100);"))
-                    db.session.commit()
-                if 'purchase_price_plan' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN purchase_price_plan NUMERIC(12,3);"))
-                    db.session.commit()
-                if 'sale_price' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN sale_price NUMERIC(12,3);"))
-                    db.session.commit()
-                if 'is_alcohol' not in si_cols:
-                    db.session.execute(text("ALTER TABLE stock_items ADD COLUMN is_alcohol VARCHAR(5);"))
-                    db.session.commit()
-
-            if 'products' in table_names:
-                p_cols = {c['name'] for c in insp.get_columns('products')}
-                if 'image_url' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN image_url VARCHAR(255);"))
-                    db.session.commit()
-                if 'description' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN description TEXT;"))
-                    db.session.commit()
-                if 'portion_grams' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN portion_grams INTEGER;"))
-                    db.session.commit()
-                if 'protein_100g' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN protein_100g NUMERIC(7,2);"))
-                    db.session.commit()
-                if 'fat_100g' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN fat_100g NUMERIC(7,2);"))
-                    db.session.commit()
-                if 'carb_100g' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN carb_100g NUMERIC(7,2);"))
-                    db.session.commit()
-                if 'kcal_100g' not in p_cols:
-                    db.session.execute(text("ALTER TABLE products ADD COLUMN kcal_100g INTEGER;"))
-                    db.session.commit()
-
-            if 'job_applications' in table_names:
-                ja_cols = {c['name'] for c in insp.get_columns('job_applications')}
-                if 'comment' not in ja_cols:
-                    db.session.execute(text("ALTER TABLE job_applications ADD COLUMN comment VARCHAR(500);"))
-                    db.session.commit()
-
-            # Автопочинка orders: добавление полей POS
-            if 'orders' in table_names:
-                o_cols = {c['name'] for c in insp.get_columns('orders')}
-                if 'guest_count' not in o_cols:
-                    db.session.execute(text("ALTER TABLE orders ADD COLUMN guest_count INTEGER DEFAULT 1;"))
-                    db.session.commit()
-                if 'waiter' not in o_cols:
-                    db.session.execute(text("ALTER TABLE orders ADD COLUMN waiter VARCHAR(120);"))
-                    db.session.commit()
-                if 'comment' not in o_cols:
-                    db.session.execute(text("ALTER TABLE orders ADD COLUMN comment VARCHAR(255);"))
-                    db.session.commit()
-
-            # Автопочинка delivery_orders: курьер
-            if 'delivery_orders' in table_names:
-                d_cols = {c['name'] for c in insp.get_columns('delivery_orders')}
-                if 'courier_id' not in d_cols:
-                    db.session.execute(text("ALTER TABLE delivery_orders ADD COLUMN courier_id INTEGER;"))
-                    db.session.commit()
-                if 'user_id' not in d_cols:
-                    db.session.execute(text("ALTER TABLE delivery_orders ADD COLUMN user_id INTEGER;"))
-                    db.session.commit()
-        except Exception:
-            # Don't break app startup on migration helper errors
-            pass
+    # Ensure uploads dirs exist. Схема БД ведётся миграциями (manage.py migrate).
+    uploads_root = os.path.join(BASE_DIR, 'static', 'uploads')
+    os.makedirs(os.path.join(uploads_root, 'employees'), exist_ok=True)
+    os.makedirs(os.path.join(uploads_root, 'products'), exist_ok=True)
+    os.makedirs(os.path.join(uploads_root, 'avatars'), exist_ok=True)
 
     @app.route('/health')
     def health():
@@ -0,0 +1,9 @@
+import click
+
+
+@click.group('bench')
+def bench():
+    """Бенчмарки производительности (запускать на копии БД)."""
+
+
+from bench import startup, posting, queries, pages, checkout, pos, race, jobs, auth, perf, suite, load, replica  # noqa: E402,F401
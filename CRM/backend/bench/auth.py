@@ -0,0 +1,106 @@
+import re
+import sys
+from typing import List
+
+import click
+from flask import url_for
+from sqlalchemy import event
+
+from app import app, db
+from bench import bench
+
+
+# Экраны CRM, где само представление почти не ходит в БД: видно, сколько
+# стоит только аутентификация
+PAGES = ('auth.portal_info', 'catalog.new_product', 'employees.index')
+AUTH_SQL = re.compile(r'\b(?:FROM|JOIN)\s+(?:users|roles)\b', re.IGNORECASE)
+MARKER = 'bench-auth'
+
+
+def _statements(engine, client, url: str, method: str = 'GET', **kwargs) -> List[str]:
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client.open(url, method=method, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def _login(user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+@bench.command('auth')
+@click.option('--user-id', type=int, help='Администратор CRM, от имени которого идут запросы (по умолчанию первый admin).')
+def auth_bench(user_id):
+    """Запросы к users/roles на экран CRM: не больше одного без кэша, ноль из кэша.
+
+    Затем проверяет, что смена роли и профиля видна сразу, без ожидания TTL.
+    Завершается с кодом 1 при нарушении.
+    """
+    from models.user import Role, User
+    from services import auth
+
+    with app.app_context():
+        if user_id is None:
+            admin = (User.query.outerjoin(Role, User.role_id == Role.id)
+                     .filter((Role.name == 'admin') | (User.role_name == 'admin'))
+                     .order_by(User.id).first())
+            if admin is None:
+                raise click.ClickException('Нужен пользователь с ролью admin (или --user-id)')
+            user_id = admin.id
+        engine = db.engine
+    with app.test_request_context():
+        urls = {endpoint: url_for(endpoint) for endpoint in PAGES}
+
+    admin = _login(user_id)
+    failures = 0
+    for endpoint, url in urls.items():
+        auth.invalidate()
+        cold = _statements(engine, admin, url)
+        warm = _statements(engine, admin, url)
+        cold_auth = sum(bool(AUTH_SQL.search(s)) for s in cold)
+        warm_auth = sum(bool(AUTH_SQL.search(s)) for s in warm)
+        ok = cold_auth <= 1 and warm_auth == 0
+        failures += not ok
+        click.echo(f'{"OK" if ok else "FAIL":<5} {endpoint:<24} cold {len(cold)} queries ({cold_auth} auth), '
+                   f'cached {len(warm)} queries ({warm_auth} auth)')
+
+    with app.app_context():
+        staff = Role.query.filter_by(name='staff').first()
+        admin_role = Role.query.filter_by(name='admin').first()
+        user = User(email=f'{MARKER}@bench.local', full_name=MARKER, role=staff, role_name='staff')
+        user.set_password(MARKER)
+        db.session.add(user)
+        db.session.commit()
+        probe_id, admin_role_id = user.id, admin_role.id
+
+    try:
+        probe = _login(probe_id)
+        before = probe.get('/crm/users/').status_code
+        admin.post(f'/crm/users/{probe_id}/role', data={'role_id': admin_role_id, 'full_name': MARKER})
+        after = probe.get('/crm/users/').status_code
+        role_ok = before == 403 and after == 200
+        click.echo(f'{"OK" if role_ok else "FAIL":<5} role change: /crm/users/ {before} -> {after}')
+
+        probe.post('/profile/update-full-name', data={'full_name': f'{MARKER} renamed'})
+        renamed = f'{MARKER} renamed' in probe.get('/profile/').get_data(as_text=True)
+        click.echo(f'{"OK" if renamed else "FAIL":<5} profile change visible on the next request')
+        failures += (not role_ok) + (not renamed)
+    finally:
+        with app.app_context():
+            User.query.filter_by(id=probe_id).delete()
+            db.session.commit()
+
+    click.echo(f'Failures: {failures}')
+    if failures:
+        sys.exit(1)
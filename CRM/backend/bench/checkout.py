@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from sqlalchemy import func
+
+from app import app, db
+from bench import bench
+
+
+MARKER = 'bench-checkout'
+PHONE_PREFIX = '+7999000'
+
+
+def _checkout(product_id: int, phone: str) -> int:
+    client = app.test_client()
+    client.post('/basket/add', data={'product_id': str(product_id), 'qty': '2'})
+    response = client.post('/basket/checkout', data={
+        'customer_name': 'Bench',
+        'contact_phone': phone,
+        'street': 'Bench',
+        'comment': MARKER,
+    })
+    return response.status_code
+
+
+@bench.command('checkout')
+@click.option('--orders', default=300, show_default=True, help='Сколько оформлений корзины выполнить.')
+@click.option('--concurrency', default=32, show_default=True, help='Параллельных клиентов.')
+@click.option('--phones', default=10, show_default=True, help='Сколько разных телефонов (конкуренция за клиента).')
+def checkout(orders: int, concurrency: int, phones: int):
+    """Параллельные оформления заказа на сайте: ошибки, дубли клиентов, потерянные баллы.
+
+    Созданные заказы и клиенты удаляются в конце, daily_sales пересчитывается.
+    """
+    from models.catalog import Product
+    from models.crm import Customer
+    from models.orders import DailySales, DeliveryOrder, DeliveryOrderItem
+
+    with app.app_context():
+        product = Product.query.filter_by(active=True).order_by(Product.id).first()
+        if not product:
+            raise click.ClickException('Нет активных блюд для заказа')
+        product_id, price = product.id, int(product.price or 0)
+
+    numbers = [f'{PHONE_PREFIX}{i:04d}' for i in range(phones)]
+    lock = threading.Lock()
+    statuses = {}
+
+    def run(i: int):
+        status = _checkout(product_id, numbers[i % phones])
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(orders)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        placed = DeliveryOrder.query.filter_by(comment=MARKER).count()
+        customers = (db.session.query(func.count(Customer.id), func.coalesce(func.sum(Customer.points), 0))
+                     .filter(Customer.phone.in_(numbers)).one())
+        click.echo(f'{orders} checkouts x{concurrency}: {elapsed:.2f} s, {orders / elapsed:.0f} orders/s, '
+                   f'statuses {statuses}')
+        click.echo(f'orders placed {placed}/{orders}, customers {customers[0]}/{phones}, '
+                   f'points {customers[1]}/{placed * price * 2}')
+
+        order_ids = db.session.query(DeliveryOrder.id).filter_by(comment=MARKER)
+        DeliveryOrderItem.query.filter(DeliveryOrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+        DeliveryOrder.query.filter_by(comment=MARKER).delete(synchronize_session=False)
+        Customer.query.filter(Customer.phone.in_(numbers)).delete(synchronize_session=False)
+        DailySales.rebuild()
+        db.session.commit()
@@ -0,0 +1,110 @@
+import json
+from typing import Dict, List, Tuple
+
+import click
+from flask import url_for
+from sqlalchemy import event, text
+
+from app import app, db
+
+
+# logout сбросил бы сессию обходчика; SSE-потоки досок не заканчиваются, а
+# незакрытый ответ оставил бы подписчика в services/events.py навсегда
+SKIP_ENDPOINTS = {'auth.logout', 'delivery.events_stream', 'sales.kitchen_events'}
+
+
+def _crawl_targets() -> List[Tuple[str, str]]:
+    """GET-эндпоинты блюпринтов: без параметров как есть, с <int:...> — на id=1."""
+    targets = []
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or '.' not in rule.endpoint or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        with app.test_request_context():
+            url = url_for(rule.endpoint, **{arg: 1 for arg in rule.arguments})
+        targets.append((rule.endpoint, url))
+    return sorted(targets)
+
+
+def _capture(engines, client, url: str) -> List[Tuple[object, str, object]]:
+    """SELECT'ы страницы вместе с движком, на котором они выполнились (основная база или реплика)."""
+    captured: List[Tuple[object, str, object]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((conn.engine, statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client.get(url)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def _seq_scans(plan: Dict) -> List[Dict]:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan)
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def _explain(conn, statement: str, parameters) -> List[Dict]:
+    raw = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return _seq_scans(plan[0]['Plan'])
+
+
+@click.command('index-report')
+@click.option('--email', help='Пользователь CRM, от имени которого обходятся страницы (по умолчанию первый admin).')
+@click.option('--all-scans', is_flag=True, help='Показывать и полные чтения таблиц без фильтра.')
+def index_report(email: str | None, all_scans: bool):
+    """EXPLAIN запросов каждого экрана CRM: где нет подходящего индекса.
+
+    Запускать на засеянной БД. Планировщику запрещаются seq scan'ы, поэтому
+    оставшийся Seq Scan с фильтром означает, что индекса под фильтр нет.
+    """
+    from models.user import User, Role
+
+    with app.app_context():
+        if email:
+            user = User.query.filter_by(email=email).first()
+        else:
+            user = (User.query.outerjoin(Role, User.role_id == Role.id)
+                    .filter((Role.name == 'admin') | (User.role_name == 'admin'))
+                    .first())
+        if not user:
+            click.echo('Нет пользователя admin: будут проверены только публичные страницы.')
+        user_id = user.id if user else None
+        # С DATABASE_REPLICA_URL часть экранов читает с реплики
+        engines = list(db.engines.values())
+
+    client = app.test_client()
+    if user_id:
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+
+    flagged = 0
+    for endpoint, url in _crawl_targets():
+        statements = _capture(engines, client, url)
+        problems = []
+        for engine in engines:
+            with engine.connect() as conn:
+                conn.execute(text('SET enable_seqscan = off'))
+                for ran_on, statement, parameters in statements:
+                    if ran_on is engine:
+                        problems.extend(_explain(conn, statement, parameters))
+                conn.rollback()
+        click.echo(f'{endpoint:<32} {url:<40} queries={len(statements)}')
+        for node in problems:
+            if node.get('Filter'):
+                flagged += 1
+            elif not all_scans:
+                continue
+            click.echo(f'    SEQ SCAN {node["Relation Name"]}: {node.get("Filter", "(full read)")}')
+
+    click.echo(f'Flagged sequential scans: {flagged}')
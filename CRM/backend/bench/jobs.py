@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import Counter
+
+import click
+
+from app import app, db, mail
+from bench import bench
+from bench.smtp_sink import SmtpSink
+
+
+MARKER = 'bench-jobs'
+
+
+@bench.command('jobs')
+@click.option('--mails', default=200, show_default=True, help='Сколько писем поставить в очередь.')
+@click.option('--concurrency', default=8, show_default=True, help='Потоков воркера.')
+@click.option('--timeout', default=60.0, show_default=True, help='Сколько ждать разбора очереди, с.')
+def jobs_bench(mails: int, concurrency: int, timeout: float):
+    """Очередь задач против локального SMTP: доставка, повторы, лимит параллельности.
+
+    Часть адресатов отвечает временной ошибкой (должны дойти с повтора), один —
+    отказом всегда (задача должна стать failed). Задачи бенчмарка удаляются.
+    """
+    from models.jobs import Job
+    from services import jobs, mailer
+
+    flaky = {f'flaky{i}@bench.local' for i in range(5)}
+    sink = SmtpSink(flaky=flaky, fail_times=2, reject={'reject@bench.local'}).start()
+    app.config.update(MAIL_SERVER=sink.host, MAIL_PORT=sink.port, MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_DEFAULT_SENDER='bench@bench.local')
+    mail.init_app(app)
+    jobs.BACKOFF_BASE_SECONDS = 0.2
+
+    recipients = [f'user{i}@bench.local' for i in range(mails - len(flaky))] + sorted(flaky)
+    with app.app_context():
+        started = time.perf_counter()
+        for i, to in enumerate(recipients):
+            mailer.send_mail(to, f'{MARKER} #{i}', 'Проверка очереди')
+        jobs.enqueue(mailer.MAIL_JOB, {'to': 'reject@bench.local', 'subject': f'{MARKER} reject', 'body': '-'},
+                     max_attempts=3)
+        db.session.commit()
+        enqueue_ms = (time.perf_counter() - started) * 1000 / (len(recipients) + 1)
+
+    worker = jobs.Worker(app, concurrency=concurrency, poll_seconds=0.05)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+
+    pending = Job.payload['subject'].astext.like(f'{MARKER}%')
+    try:
+        with app.app_context():
+            while time.perf_counter() - started < timeout:
+                left = Job.query.filter(pending, Job.status != 'failed').count()
+                db.session.rollback()
+                if not left:
+                    break
+                time.sleep(0.1)
+            elapsed = time.perf_counter() - started
+            failed = Job.query.filter(pending, Job.status == 'failed').count()
+            Job.query.filter(pending).delete(synchronize_session=False)
+            db.session.commit()
+    finally:
+        worker.stop()
+        thread.join(timeout=5)
+        sink.stop()
+
+    subjects = Counter(line.split(': ', 1)[1].strip()
+                       for message in sink.messages for line in message.data.splitlines()
+                       if line.startswith('Subject:'))
+    duplicates = sum(n - 1 for n in subjects.values() if n > 1)
+    delivered = len(subjects)
+    click.echo(f'enqueue {enqueue_ms:.2f} ms/job (inside the request transaction, no SMTP wait)')
+    click.echo(f'{delivered}/{len(recipients)} delivered in {elapsed:.2f} s x{concurrency} threads, '
+               f'{len(sink.messages) / elapsed:.0f} mails/s, duplicates {duplicates}')
+    click.echo(f'temporary refusals retried {sink.refused}, failed jobs {failed}/1, '
+               f'max parallel SMTP sessions {sink.max_sessions} (limit 2)')
+    if delivered != len(recipients) or duplicates or failed != 1 or sink.max_sessions > 2:
+        raise SystemExit(1)
@@ -0,0 +1,108 @@
+import http.client
+import statistics
+import sys
+import threading
+import time
+from typing import List
+from urllib.parse import urlsplit
+
+import click
+from flask import url_for
+
+from app import app
+from bench import bench
+from bench.suite import HttpClient, Request, _percentile, _session_cookie
+
+
+# Нагрузка на внешний сервер (gunicorn) из нескольких потоков: пропускная
+# способность и задержка на экранах только для чтения при разном числе
+# одновременных клиентов. Для подбора workers/threads/DB_POOL_SIZE
+# (gunicorn.conf.py). --sse держит открытыми доски доставки, как в зале.
+
+PAGES = ('site.menu', 'dashboard.index', 'delivery.home')
+
+
+def _hold_sse(base_url: str, cookie, stop: threading.Event) -> None:
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    try:
+        with app.test_request_context():
+            path = url_for('delivery.events_stream')
+        connection.request('GET', path, headers={'Cookie': f'{cookie[0]}={cookie[1]}'})
+        response = connection.getresponse()
+        while not stop.is_set() and response.fp.readline():
+            pass
+    except OSError:
+        pass
+    finally:
+        connection.close()
+
+
+def _client(base_url: str, cookie, paths: List[str], deadline: float, timings: List[float], errors: List[int]):
+    client = HttpClient(base_url)
+    client.set_cookie(*cookie)
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status = client.open(Request('GET', paths[i % len(paths)]))
+        except OSError:
+            errors.append(0)  # сервер недоступен — клиент выбывает
+            return
+        timings.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+        i += 1
+
+
+@bench.command('load')
+@click.option('--url', required=True, help='Сервер на засеянной БД, например http://127.0.0.1:8000.')
+@click.option('--concurrency', 'levels', type=int, multiple=True, help='Одновременных клиентов (по умолчанию 1, 4, 8, 16).')
+@click.option('--duration', default=10.0, show_default=True, help='Секунд на каждый уровень.')
+@click.option('--sse', default=0, show_default=True, help='Сколько досок доставки держать открытыми.')
+@click.option('--user-id', type=int, help='Сотрудник CRM (по умолчанию первый admin).')
+def load(url: str, levels, duration: float, sse: int, user_id: int):
+    """Запросов в секунду и p50/p95 под параллельной нагрузкой на внешнем сервере."""
+    from models.user import Role, User
+
+    if user_id is None:
+        with app.app_context():
+            admin = (User.query.join(Role, User.role_id == Role.id).filter(Role.name == 'admin')
+                     .order_by(User.id).first())
+            if admin is None:
+                raise click.ClickException('Нужен пользователь с ролью admin (или --user-id)')
+            user_id = admin.id
+    with app.test_request_context():
+        paths = [url_for(endpoint) for endpoint in PAGES]
+    cookie = _session_cookie(user_id)
+
+    stop = threading.Event()
+    holders = [threading.Thread(target=_hold_sse, args=(url, cookie, stop), daemon=True) for _ in range(sse)]
+    for holder in holders:
+        holder.start()
+    time.sleep(0.5 if sse else 0)
+
+    failed = 0
+    try:
+        for level in levels or (1, 4, 8, 16):
+            timings: List[float] = []
+            errors: List[int] = []
+            deadline = time.perf_counter() + duration
+            clients = [threading.Thread(target=_client, args=(url, cookie, paths, deadline, timings, errors))
+                       for _ in range(level)]
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+            if not timings:
+                raise click.ClickException(f'{url}: нет ответов')
+            failed += len(errors)
+            click.echo(f'concurrency {level:>3}{f" + {sse} SSE" if sse else ""}: {len(timings) / elapsed:7.1f} req/s, '
+                       f'p50 {statistics.median(timings) * 1000:7.1f} ms, p95 {_percentile(timings, 0.95) * 1000:7.1f} ms'
+                       + (f', {len(errors)} errors' if errors else ''))
+    finally:
+        stop.set()
+    if failed:
+        sys.exit(1)
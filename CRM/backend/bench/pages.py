@@ -0,0 +1,45 @@
+import time
+
+import click
+
+from app import app
+from bench import bench
+
+
+def _rate(client, path: str, seconds: float, headers=None) -> float:
+    client.get(path, headers=headers)  # прогрев кэшей
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        client.get(path, headers=headers)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+@bench.command('pages')
+@click.option('--path', default='/menu/', show_default=True, help='Публичная страница сайта.')
+@click.option('--seconds', default=5.0, show_default=True, help='Длительность каждого замера.')
+def pages(path: str, seconds: float):
+    """Запросов в секунду для анонимной страницы: рендер каждый раз, кэш страниц, 304.
+
+    Замер в одном процессе через тестовый клиент — показывает стоимость
+    обработки запроса в приложении без сети и WSGI-сервера.
+    """
+    from services import page_cache
+
+    client = app.test_client()
+    size = app.config.get('PAGE_CACHE_SIZE') or 256
+    try:
+        app.config['PAGE_CACHE_SIZE'] = 0
+        render = _rate(client, path, seconds)
+
+        app.config['PAGE_CACHE_SIZE'] = size
+        page_cache.clear()
+        cached = _rate(client, path, seconds)
+        etag = client.get(path).headers.get('ETag')
+        revalidated = _rate(client, path, seconds, headers={'If-None-Match': etag})
+    finally:
+        app.config['PAGE_CACHE_SIZE'] = size
+
+    click.echo(f'{path}: render {render:.0f} req/s, page cache {cached:.0f} req/s '
+               f'(x{cached / render:.1f}), If-None-Match 304 {revalidated:.0f} req/s')
@@ -0,0 +1,80 @@
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import click
+
+from app import create_app
+from bench import bench
+
+
+@contextmanager
+def _env(**values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _latency(client, path: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - started) / requests
+
+
+@bench.command('perf')
+@click.option('--path', default='/menu/', show_default=True, help='Страница, на которой меряется накладной расход.')
+@click.option('--rounds', default=200, show_default=True, help='Пар замеров без профилирования и с ним.')
+@click.option('--requests', 'per_round', default=25, show_default=True, help='Запросов в одном замере.')
+@click.option('--sample-rate', default=None, type=float, help='Доля запросов в выборке (по умолчанию PROFILING_SAMPLE_RATE).')
+@click.option('--max-overhead', default=1.0, show_default=True, help='Допустимый расход при этой доле, %.')
+def perf(path: str, rounds: int, per_round: int, sample_rate, max_overhead: float):
+    """Накладной расход профилирования на странице сайта.
+
+    Два экземпляра приложения в одном процессе: без профилирования и с
+    профилированием каждого запроса. Замеры чередуются короткими парами, расход —
+    медиана разниц в парах. Расход при доле выборки меньше 1 тонет в шуме
+    замера (около 1%), поэтому он оценивается как доля × расход на один
+    профилируемый запрос. Завершается с кодом 1, если оценка больше --max-overhead.
+    """
+    from services import profiling
+
+    with _env(PROFILING='true', PROFILING_SAMPLE_RATE='1'):
+        profiled = create_app()
+    with _env(PROFILING='false'):
+        plain = create_app()
+    rate = plain.config['PROFILING_SAMPLE_RATE'] if sample_rate is None else sample_rate
+
+    clients = {'off': plain.test_client(), 'on': profiled.test_client()}
+    for client in clients.values():
+        for _ in range(20):  # прогрев кэшей и пулов соединений
+            client.get(path)
+    profiling.reset()
+
+    timings = {'off': [], 'on': []}
+    for i in range(rounds):
+        # Порядок меняется каждый круг: второй замер в круге систематически медленнее
+        for name in ('off', 'on') if i % 2 else ('on', 'off'):
+            timings[name].append(_latency(clients[name], path, per_round))
+
+    off = statistics.median(timings['off'])
+    on = statistics.median(timings['on'])
+    # Медиана разниц соседних замеров устойчивее к дрейфу машины, чем разница медиан
+    full = statistics.median((b - a) / a for a, b in zip(timings['off'], timings['on'])) * 100
+    estimate = full * rate
+    ok = estimate < max_overhead
+    click.echo(f'{path}: off {off * 1000:.3f} ms, every request profiled {on * 1000:.3f} ms '
+               f'({profiling.profiled_requests()} samples), overhead {full:+.2f}%')
+    click.echo(f'{"OK" if ok else "OVER":<5} sample rate {rate}: estimated overhead {estimate:+.2f}% '
+               f'(limit {max_overhead}%)')
+    if not ok:
+        sys.exit(1)
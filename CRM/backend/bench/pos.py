@@ -0,0 +1,101 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import click
+
+from app import app, db
+from bench import bench
+
+
+MARKER = 'bench-pos'
+
+
+def _client(user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _form_taps(user_id: int, order_id: int, product_ids: List[int], taps: int) -> List[float]:
+    """Старая касса: POST формы и перезагрузка всей страницы заказа."""
+    client = _client(user_id)
+    timings = []
+    for i in range(taps):
+        started = time.perf_counter()
+        response = client.post(f'/crm/sales/order/{order_id}/add',
+                               data={'product_id': str(product_ids[i % len(product_ids)]), 'qty': '1'},
+                               follow_redirects=True)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    return timings
+
+
+def _api_taps(user_id: int, order_id: int, product_ids: List[int], taps: int) -> List[float]:
+    client = _client(user_id)
+    timings = []
+    for i in range(taps):
+        started = time.perf_counter()
+        response = client.post(f'/crm/sales/api/order/{order_id}/lines/',
+                               json={'product_id': product_ids[i % len(product_ids)], 'qty': 1})
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 201, response.status_code
+    return timings
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+@bench.command('pos')
+@click.option('--waiters', default=8, show_default=True, help='Параллельных официантов (у каждого свой заказ).')
+@click.option('--taps', default=50, show_default=True, help='Нажатий «добавить блюдо» на официанта.')
+@click.option('--mode', type=click.Choice(['form', 'api', 'both']), default='both', show_default=True)
+def pos(waiters: int, taps: int, mode: str):
+    """Задержка одного нажатия в кассе: форма с перезагрузкой против JSON API.
+
+    Созданные заказы удаляются в конце, daily_sales пересчитывается.
+    """
+    from models.catalog import Product
+    from models.orders import DailySales, Order, OrderItem
+    from models.user import Role, User
+
+    with app.app_context():
+        user = (User.query.join(Role, User.role_id == Role.id).filter(Role.name == 'admin')
+                .order_by(User.id).first())
+        if user is None:
+            raise click.ClickException('Нужен пользователь с ролью admin')
+        product_ids = [p.id for p in Product.query.filter_by(active=True).order_by(Product.id).limit(10)]
+        if not product_ids:
+            raise click.ClickException('Нет активных блюд')
+        user_id = user.id
+
+    modes = {'form': _form_taps, 'api': _api_taps}
+    try:
+        for name in (['form', 'api'] if mode == 'both' else [mode]):
+            with app.app_context():
+                orders = [Order(status='open', total=0, waiter=MARKER) for _ in range(waiters)]
+                db.session.add_all(orders)
+                db.session.commit()
+                order_ids = [o.id for o in orders]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=waiters) as pool:
+                runs = list(pool.map(lambda oid: modes[name](user_id, oid, product_ids, taps), order_ids))
+            elapsed = time.perf_counter() - started
+            timings = [t for run in runs for t in run]
+            click.echo(f'{name:4}  {len(timings)} taps x{waiters}: {len(timings) / elapsed:.0f} taps/s, '
+                       f'p50 {statistics.median(timings) * 1000:.1f} ms, '
+                       f'p95 {_percentile(timings, 0.95) * 1000:.1f} ms, '
+                       f'p99 {_percentile(timings, 0.99) * 1000:.1f} ms')
+    finally:
+        with app.app_context():
+            order_ids = db.session.query(Order.id).filter_by(waiter=MARKER)
+            OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+            Order.query.filter_by(waiter=MARKER).delete(synchronize_session=False)
+            DailySales.rebuild()
+            db.session.commit()
@@ -0,0 +1,79 @@
+import time
+from decimal import Decimal
+
+import click
+from sqlalchemy import event
+
+from app import app, db
+from bench import bench
+
+
+def _legacy_apply_movement(warehouse_id, item_id, delta, doc_type, doc_id, note=None):
+    # Прежняя построчная реализация views.inventory._apply_movement (эталон для сравнения)
+    from models.inventory import StockBalance, StockMovement
+    bal = StockBalance.query.filter_by(warehouse_id=warehouse_id, item_id=item_id).first()
+    if not bal:
+        bal = StockBalance(warehouse_id=warehouse_id, item_id=item_id, quantity=Decimal('0'))
+        db.session.add(bal)
+        db.session.flush()
+    bal.quantity = (bal.quantity or 0) + Decimal(delta)
+    db.session.add(StockMovement(warehouse_id=warehouse_id, item_id=item_id, delta=delta,
+                                 doc_type=doc_type, doc_id=doc_id, note=note))
+
+
+def _legacy_post(lines):
+    for warehouse_id, item_id, delta in lines:
+        _legacy_apply_movement(warehouse_id, item_id, delta, 'purchase', 0, 'bench')
+    db.session.flush()
+
+
+def _bulk_post(lines):
+    from models.inventory import post_movements
+    post_movements(lines, 'purchase', 0, 'bench')
+
+
+def _measure(fn, lines):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    savepoint = db.session.begin_nested()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    try:
+        fn(lines)
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(db.engine, 'before_cursor_execute', count)
+        savepoint.rollback()
+    return elapsed * 1000, len(statements)
+
+
+@bench.command('posting')
+@click.option('--sizes', default='10,100,1000', show_default=True, help='Размеры документов (строк).')
+@click.option('--repeat', default=3, show_default=True)
+def posting(sizes: str, repeat: int):
+    """Проведение документа: построчно (старое) против пакетного upsert'а.
+
+    Все записи делаются во вложенной транзакции и откатываются.
+    """
+    from models.inventory import StockItem, Warehouse
+
+    with app.app_context():
+        warehouse = Warehouse(name=f'bench-{time.time_ns()}')
+        db.session.add(warehouse)
+        max_size = max(int(s) for s in sizes.split(','))
+        items = [StockItem(name=f'bench item {i}') for i in range(max_size)]
+        db.session.add_all(items)
+        db.session.flush()
+        try:
+            click.echo(f'{"lines":>6} {"legacy ms":>10} {"legacy sql":>10} {"bulk ms":>8} {"bulk sql":>8}')
+            for size in (int(s) for s in sizes.split(',')):
+                # половина строк — новые остатки, половина — уже существующие
+                lines = [(warehouse.id, items[i % max(1, size // 2)].id, Decimal('1.5')) for i in range(size)]
+                legacy = min(_measure(_legacy_post, lines) for _ in range(repeat))
+                bulk = min(_measure(_bulk_post, lines) for _ in range(repeat))
+                click.echo(f'{size:>6} {legacy[0]:>10.1f} {legacy[1]:>10} {bulk[0]:>8.1f} {bulk[1]:>8}')
+        finally:
+            db.session.rollback()
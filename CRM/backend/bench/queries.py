@@ -0,0 +1,86 @@
+import sys
+from typing import Dict, Tuple
+
+import click
+from sqlalchemy import event
+
+from app import app, db
+from bench import bench
+from bench.index_report import _crawl_targets
+
+
+# Бюджет SQL-запросов на один GET-запрос. Не зависит от числа строк в БД:
+# N+1 в шаблоне на засеянной базе сразу выходит за предел.
+DEFAULT_BUDGET = 10
+BUDGETS: Dict[str, int] = {
+    # справочники для форм документов + сам документ и его строки
+    'inventory.purchase_edit': 12,
+    'inventory.transfer_edit': 12,
+    'inventory.writeoff_edit': 12,
+    'inventory.inv_edit': 12,
+}
+# Вошедшего сотрудника эти страницы по замыслу отправляют в CRM
+REDIRECTS = {'auth.login', 'auth.portal_info'}
+
+
+def _count(engines, client, url: str) -> Tuple[int, int]:
+    """Число SQL-запросов на всех базах (основной и реплике) и код ответа."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        status = client.get(url).status_code
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), status
+
+
+@bench.command('queries')
+@click.option('--user-id', type=int, help='Пользователь CRM, от имени которого обходятся страницы (по умолчанию первый admin).')
+def queries(user_id):
+    """Число SQL-запросов на каждый экран против фиксированного бюджета.
+
+    Запускать на засеянной БД; завершается с кодом 1, если хоть один экран
+    превысил бюджет или не открылся (403, редирект на вход): такой экран
+    бюджет «проходит», не выполнив представление.
+    """
+    from models.user import Role, User
+
+    with app.app_context():
+        if user_id is None:
+            admin = (User.query.outerjoin(Role, User.role_id == Role.id)
+                     .filter((Role.name == 'admin') | (User.role_name == 'admin'))
+                     .order_by(User.id).first())
+            if admin is None:
+                raise click.ClickException('Нужен пользователь с ролью admin (или --user-id)')
+            user_id = admin.id
+        engines = list(db.engines.values())
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+    over = denied = 0
+    for endpoint, url in _crawl_targets():
+        budget = BUDGETS.get(endpoint, DEFAULT_BUDGET)
+        count, status = _count(engines, client, url)
+        if status == 302 and endpoint in REDIRECTS:
+            mark = 'SKIP'
+        elif status in (302, 403):
+            mark = 'DENY'
+            denied += 1
+        else:
+            mark = 'OK' if count <= budget else 'OVER'
+            over += count > budget
+        click.echo(f'{mark:<5} {endpoint:<32} {url:<40} {count:>3}/{budget} {status}')
+
+    click.echo(f'Endpoints over budget: {over}')
+    click.echo(f'Endpoints not rendered (403/302): {denied}')
+    if over or denied:
+        sys.exit(1)
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from sqlalchemy import func
+
+from app import app, db
+from bench import bench
+
+
+MARKER = 'bench-race'
+
+
+def _client(user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _waiter(user_id: int, order_id: int, delivery_id: int, product_id: int, taps: int):
+    """Один официант: по кругу все пути, меняющие сумму чека и доставки."""
+    client = _client(user_id)
+    statuses = []
+    line_id = None
+    for i in range(taps):
+        step = i % 5
+        if step == 0:
+            response = client.post(f'/crm/sales/api/order/{order_id}/lines/', json={'product_id': product_id})
+            if response.status_code == 201:
+                line_id = response.json['line']['id']
+        elif step == 1:
+            response = client.post(f'/crm/sales/order/{order_id}/add', data={'product_id': str(product_id)})
+        elif step == 2:
+            response = client.post(f'/crm/orders/{order_id}/add', data={'product_id': str(product_id)})
+        elif step == 3 and line_id:
+            response = client.patch(f'/crm/sales/api/order/{order_id}/lines/{line_id}/', json={'delta': 1})
+        else:
+            response = client.post(f'/crm/delivery/{delivery_id}/add', data={'product_id': str(product_id)})
+        statuses.append(response.status_code)
+    return statuses
+
+
+@bench.command('race')
+@click.option('--threads', default=16, show_default=True, help='Официантов, правящих один чек одновременно.')
+@click.option('--taps', default=50, show_default=True, help='Правок на официанта.')
+def race(threads: int, taps: int):
+    """Параллельные правки одного чека и одной доставки: сходится ли сумма с позициями.
+
+    Созданные заказы удаляются в конце, daily_sales пересчитывается.
+    """
+    from models.catalog import Product
+    from models.orders import DailySales, DeliveryOrder, DeliveryOrderItem, Order, OrderItem
+    from models.user import Role, User
+
+    with app.app_context():
+        user = (User.query.join(Role, User.role_id == Role.id).filter(Role.name == 'admin')
+                .order_by(User.id).first())
+        product = Product.query.filter_by(active=True).order_by(Product.id).first()
+        if user is None or product is None:
+            raise click.ClickException('Нужны пользователь с ролью admin и активное блюдо')
+        order = Order(status='open', total=0, waiter=MARKER)
+        delivery = DeliveryOrder(status='new', total=0, comment=MARKER)
+        db.session.add_all([order, delivery])
+        db.session.commit()
+        user_id, product_id, order_id, delivery_id = user.id, product.id, order.id, delivery.id
+
+    lock = threading.Lock()
+    counts = {}
+
+    def run(_):
+        for status in _waiter(user_id, order_id, delivery_id, product_id, taps):
+            with lock:
+                counts[status] = counts.get(status, 0) + 1
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run, range(threads)))
+        elapsed = time.perf_counter() - started
+        click.echo(f'{threads * taps} edits x{threads}: {elapsed:.2f} s, statuses {counts}')
+
+        with app.app_context():
+            drift = 0
+            for label, model, item_model, oid in (('order', Order, OrderItem, order_id),
+                                                  ('delivery', DeliveryOrder, DeliveryOrderItem, delivery_id)):
+                total = db.session.get(model, oid).total
+                items_total = (db.session.query(func.coalesce(func.sum(item_model.sum), 0))
+                               .filter(item_model.order_id == oid).scalar())
+                drift += total != items_total
+                click.echo(f'{label} #{oid}: total {total}, items {items_total}'
+                           f'{"" if total == items_total else f", lost {items_total - total}"}')
+    finally:
+        with app.app_context():
+            OrderItem.query.filter_by(order_id=order_id).delete(synchronize_session=False)
+            Order.query.filter_by(id=order_id).delete(synchronize_session=False)
+            DeliveryOrderItem.query.filter_by(order_id=delivery_id).delete(synchronize_session=False)
+            DeliveryOrder.query.filter_by(id=delivery_id).delete(synchronize_session=False)
+            DailySales.rebuild()
+            db.session.commit()
+    if drift:
+        raise SystemExit(1)
@@ -0,0 +1,108 @@
+import sys
+import time
+from collections import Counter
+
+import click
+from flask import url_for
+from sqlalchemy import event
+
+from app import app, db
+from bench import bench
+
+
+# Проверка маршрутизации чтения на реплику. Реплику изображает копия базы без
+# репликации (CREATE DATABASE crm_replica TEMPLATE crm): отзыв, записанный на
+# основную базу, на ней не появится никогда — так видно, откуда читал запрос.
+
+MARKER = 'bench-replica'
+
+
+def _counting(engines):
+    counts = Counter()
+    listeners = []
+    for name, engine in engines.items():
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany, name=name):
+            counts[name] += 1
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        listeners.append((engine, before_cursor_execute))
+    return counts, listeners
+
+
+def _login(client, user_id: int) -> None:
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+
+@bench.command('replica')
+@click.option('--user-id', type=int, help='Сотрудник CRM (по умолчанию первый admin).')
+def replica_bench(user_id):
+    """Экраны для чтения идут на реплику, записи и чтение после своей записи — на основную базу.
+
+    Нужен DATABASE_REPLICA_URL. Завершается с кодом 1 при нарушении.
+    """
+    from models.reviews import Review
+    from models.user import Role, User
+    from services import replica
+
+    if not app.config.get('DATABASE_REPLICA_URL'):
+        raise click.ClickException('Задайте DATABASE_REPLICA_URL (например копия базы: CREATE DATABASE ... TEMPLATE ...)')
+    with app.app_context():
+        engines = {'primary': db.engines[None], 'replica': db.engines[replica.REPLICA]}
+        if user_id is None:
+            admin = (User.query.join(Role, User.role_id == Role.id).filter(Role.name == 'admin')
+                     .order_by(User.id).first())
+            if admin is None:
+                raise click.ClickException('Нужен пользователь с ролью admin (или --user-id)')
+            user_id = admin.id
+    with app.test_request_context():
+        urls = {endpoint: url_for(endpoint) for endpoint in sorted(replica.REPLICA_ENDPOINTS)}
+        reviews_url = url_for('site.reviews')
+
+    counts, listeners = _counting(engines)
+    failures = 0
+    staff = app.test_client()
+    _login(staff, user_id)
+    try:
+        for endpoint, url in urls.items():
+            counts.clear()
+            status = staff.get(url).status_code
+            ok = status == 200 and counts['replica'] > 0
+            failures += not ok
+            click.echo(f'{"OK" if ok else "FAIL":<5} {endpoint:<26} {status}, '
+                       f'{counts["replica"]} queries on replica, {counts["primary"]} on primary')
+
+        guest = app.test_client()
+        counts.clear()
+        guest.post(reviews_url, data={'service_rating': '9', 'product_rating': '9', 'ambience_rating': '9',
+                                      'recommend_rating': '9', 'comment': MARKER})
+        ok = counts['replica'] == 0 and counts['primary'] > 0
+        failures += not ok
+        click.echo(f'{"OK" if ok else "FAIL":<5} POST review              '
+                   f'{counts["replica"]} queries on replica, {counts["primary"]} on primary')
+
+        counts.clear()
+        own = MARKER in guest.get(reviews_url).get_data(as_text=True)
+        ok = own and counts['replica'] == 0
+        failures += not ok
+        click.echo(f'{"OK" if ok else "FAIL":<5} own review right after the write: '
+                   f'{"visible" if own else "missing"}, {counts["replica"]} queries on replica')
+
+        with guest.session_transaction() as sess:
+            sess[replica.WRITE_KEY] = time.time() - app.config['REPLICA_STICKY_SECONDS'] - 1
+        counts.clear()
+        later = MARKER in guest.get(reviews_url).get_data(as_text=True)
+        ok = counts['replica'] > 0
+        failures += not ok
+        click.echo(f'{"OK" if ok else "FAIL":<5} after {app.config["REPLICA_STICKY_SECONDS"]:g} s back on replica: '
+                   f'{counts["replica"]} queries, review {"visible" if later else "not replicated yet"}')
+    finally:
+        for engine, listener in listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+        with app.app_context():
+            Review.query.filter_by(comment=MARKER).delete()
+            db.session.commit()
+
+    click.echo(f'Failures: {failures}')
+    if failures:
+        sys.exit(1)
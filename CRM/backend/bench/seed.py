@@ -0,0 +1,406 @@
+import random
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from werkzeug.security import generate_password_hash
+
+from app import db
+
+
+# Синтетические данные для бенчмарков: объёмы одной точки за полгода на
+# единицу --scale. Справочники каталога пишутся через ORM (поднимают версии
+# кэшей), объёмные таблицы — многострочными INSERT. Один и тот же --seed на
+# пустой базе даёт те же данные; даты отсчитываются от дня запуска.
+
+DAYS = 180
+CHUNK = 1000
+EMAIL_DOMAIN = 'seed.local'
+
+CATEGORIES = {
+    'Хот-доги': ['Классический', 'Датский', 'Чили', 'Французский', 'Баварский', 'С беконом', 'Сырный', 'Вегетарианский'],
+    'Бургеры': ['Чизбургер', 'Двойной', 'Куриный', 'Острый', 'Грибной', 'BBQ'],
+    'Закуски': ['Картофель фри', 'Наггетсы', 'Луковые кольца', 'Сырные палочки', 'Крылья'],
+    'Напитки': ['Кола', 'Морс', 'Лимонад', 'Кофе', 'Чай', 'Молочный коктейль'],
+    'Десерты': ['Чизкейк', 'Брауни', 'Пончик', 'Мороженое'],
+    'Соусы': ['Кетчуп', 'Горчица', 'Сырный', 'Чесночный', 'Барбекю'],
+}
+SIZES = ('', ' XL', ' мини', ' острый', ' комбо')
+MODIFIERS = [('Двойная сосиска', '90'), ('Халапеньо', '30'), ('Сыр', '40'), ('Бекон', '60'),
+             ('Без лука', '0'), ('Соус на выбор', '25'), ('Большая порция', '70'), ('Без глютена', '50')]
+INGREDIENT_GROUPS = {
+    'Мясо': ('Сосиска', 'Котлета', 'Бекон', 'Курица', 'Фарш'),
+    'Хлеб': ('Булка', 'Булка бриошь', 'Тортилья', 'Лаваш'),
+    'Овощи': ('Лук', 'Огурец маринованный', 'Томат', 'Салат', 'Халапеньо', 'Картофель'),
+    'Соусы': ('Кетчуп', 'Горчица', 'Майонез', 'Соус сырный', 'Соус BBQ'),
+    'Напитки': ('Сироп', 'Кофе зерно', 'Чай листовой', 'Молоко', 'Вода'),
+    'Упаковка': ('Коробка', 'Стакан', 'Крышка', 'Пакет', 'Салфетки'),
+}
+UNITS = ('kg', 'pcs', 'l')
+FIRST_NAMES = ('Иван', 'Мария', 'Алексей', 'Анна', 'Дмитрий', 'Ольга', 'Сергей', 'Елена', 'Павел', 'Наталья',
+               'Андрей', 'Татьяна', 'Никита', 'Юлия', 'Максим', 'Ирина')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков', 'Морозов',
+              'Петров', 'Волков', 'Соловьёв')
+STREETS = ('Большая Садовая', 'Пушкинская', 'Ворошиловский пр.', 'Красноармейская', 'Соборный пер.',
+           'Нагибина', 'Стачки', 'Малиновского', 'Зорге', 'Текучёва')
+POSITIONS = ('Повар', 'Кассир', 'Курьер', 'Администратор', 'Официант')
+COMMENTS = ('Всё вкусно', 'Быстро привезли', 'Хот-дог остыл', 'Отличный соус', 'Приду ещё',
+            'Долго ждали', 'Вежливый персонал', None, None)
+# Часы заказов с весами: обед и вечер — пики
+HOURS = (10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22)
+HOUR_WEIGHTS = (2, 4, 9, 10, 7, 4, 4, 6, 9, 10, 8, 5, 2)
+ORDER_STATUSES = (('paid', 90), ('open', 3), ('cancelled', 7))
+DELIVERY_STATUSES = (('done', 85), ('in_progress', 3), ('new', 4), ('cancelled', 8))
+DELIVERY_SOURCES = (('site', 45), ('phone', 35), ('aggregator', 20))
+
+
+def _weighted(rng: random.Random, pairs: Sequence[Tuple[str, int]]) -> str:
+    return rng.choices([value for value, _ in pairs], weights=[weight for _, weight in pairs])[0]
+
+
+def _moment(rng: random.Random, day: date) -> datetime:
+    hour = rng.choices(HOURS, weights=HOUR_WEIGHTS)[0]
+    return datetime.combine(day, time(hour, rng.randrange(60), rng.randrange(60)))
+
+
+def _name(rng: random.Random) -> str:
+    return f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}'
+
+
+def _phone(rng: random.Random) -> str:
+    return f'+79{rng.randrange(10 ** 9):09d}'
+
+
+def _money(value) -> Decimal:
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def _insert(model, rows: List[dict], returning: bool = False) -> List[int]:
+    """Многострочный INSERT пачками; returning — id строк в порядке rows."""
+    ids: List[int] = []
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start:start + CHUNK]
+        if returning:
+            stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+            ids += db.session.execute(stmt, chunk).scalars().all()
+        else:
+            db.session.execute(insert(model), chunk)
+    return ids
+
+
+def _insert_ignore(model, rows: List[dict], key: str) -> None:
+    """INSERT ... ON CONFLICT DO NOTHING: повторный запуск не падает на уникальных полях."""
+    for start in range(0, len(rows), CHUNK):
+        stmt = pg_insert(model).values(rows[start:start + CHUNK]).on_conflict_do_nothing(index_elements=[key])
+        db.session.execute(stmt)
+
+
+def _get_or_create(model, **fields):
+    obj = model.query.filter_by(**fields).first()
+    if obj is None:
+        obj = model(**fields)
+        db.session.add(obj)
+    return obj
+
+
+def _catalog(rng: random.Random, scale: int):
+    from models.catalog import Category, Modifier, Product, ProductModifier
+
+    modifiers = [_get_or_create(Modifier, name=name) for name, _ in MODIFIERS]
+    for modifier, (_, delta) in zip(modifiers, MODIFIERS):
+        modifier.price_delta = Decimal(delta)
+    products = []
+    for group, bases in CATEGORIES.items():
+        parent = _get_or_create(Category, name=group, parent_id=None)
+        db.session.flush()
+        children = [_get_or_create(Category, name=f'{group}: {kind}', parent_id=parent.id)
+                    for kind in ('классика', 'сезонное')]
+        for i in range(scale * 40 * len(bases) // sum(map(len, CATEGORIES.values()))):
+            base = bases[i % len(bases)]
+            grams = rng.randrange(80, 450, 10)
+            protein, fat, carb = rng.uniform(4, 20), rng.uniform(3, 25), rng.uniform(10, 45)
+            product = Product(
+                name=f'{base}{SIZES[(i // len(bases)) % len(SIZES)]} №{i + 1}',
+                price=_money(rng.randrange(90, 690, 10)),
+                description=f'{base}: {rng.choice(("хит продаж", "новинка", "по рецепту шефа", "на гриле"))}',
+                portion_grams=grams,
+                protein_100g=_money(protein), fat_100g=_money(fat), carb_100g=_money(carb),
+                kcal_100g=int(protein * 4 + fat * 9 + carb * 4),
+                active=rng.random() > 0.05,
+                category=rng.choice(children) if rng.random() < 0.3 else parent,
+            )
+            product.modifiers = [ProductModifier(modifier=m) for m in rng.sample(modifiers, rng.randrange(0, 4))]
+            products.append(product)
+    db.session.add_all(products)
+    db.session.flush()
+    return products
+
+
+def _stock(rng: random.Random, scale: int, products) -> Tuple[List, List[int], Dict[int, List[Tuple[int, Decimal]]]]:
+    from models.inventory import Recipe, RecipeItem, StockItem, Warehouse
+
+    warehouses = [_get_or_create(Warehouse, name=name) for name in ('Основной склад', 'Кухня')]
+    items = []
+    for i in range(scale * 80):
+        group = rng.choice(list(INGREDIENT_GROUPS))
+        items.append(StockItem(
+            name=f'{rng.choice(INGREDIENT_GROUPS[group])} {i + 1}',
+            unit=rng.choice(UNITS), category=group, item_type='raw',
+            sku=f'SEED-{rng.randrange(10 ** 8):08d}',
+            purchase_price_plan=Decimal(rng.randrange(20, 900)), is_alcohol='no',
+        ))
+    db.session.add_all(items)
+    db.session.flush()
+    item_ids = [item.id for item in items]
+
+    recipes: Dict[int, List[Tuple[int, Decimal]]] = {}
+    for product in products:
+        lines = [(item_id, Decimal(rng.randrange(10, 300)) / 1000) for item_id in rng.sample(item_ids, rng.randrange(2, 6))]
+        recipe = Recipe(product_id=product.id, name=f'Техкарта: {product.name}')
+        recipe.items = [RecipeItem(item_id=item_id, qty=qty) for item_id, qty in lines]
+        db.session.add(recipe)
+        recipes[product.id] = lines
+    db.session.flush()
+    return warehouses, item_ids, recipes
+
+
+def _documents(rng: random.Random, scale: int, days: List[date], warehouse_ids: List[int], item_ids: List[int],
+               movements: List[dict]) -> Counter:
+    from models.inventory import (InventoryDoc, InventoryLine, Purchase, PurchaseItem, Supplier, Transfer,
+                                  TransferItem, WriteOff, WriteOffItem)
+
+    counts = Counter()
+    suppliers = [Supplier(name=f'ООО «{rng.choice(LAST_NAMES)} и партнёры» {i + 1}', contact=_phone(rng))
+                 for i in range(scale * 5)]
+    db.session.add_all(suppliers)
+
+    def move(day, doc_type, doc_id, warehouse_id, item_id, delta, note):
+        movements.append({'created_at': _moment(rng, day), 'doc_type': doc_type, 'doc_id': doc_id,
+                          'item_id': item_id, 'warehouse_id': warehouse_id, 'delta': delta, 'note': note})
+
+    # Закупки раз в несколько дней: с них начинаются остатки
+    for day in days[::max(1, 6 // scale)]:
+        doc = Purchase(supplier=rng.choice(suppliers), warehouse_id=warehouse_ids[0], date=day, status='posted')
+        doc.items = [PurchaseItem(item_id=item_id, qty=Decimal(rng.randrange(20, 200)),
+                                  price=Decimal(rng.randrange(20, 900)))
+                     for item_id in rng.sample(item_ids, min(len(item_ids), rng.randrange(5, 20)))]
+        db.session.add(doc)
+        db.session.flush()
+        for line in doc.items:
+            move(day, 'purchase', doc.id, doc.warehouse_id, line.item_id, line.qty, 'Поступление')
+        counts['purchases'] += 1
+
+    for day in rng.sample(days, min(len(days), scale * 20)):
+        doc = Transfer(from_warehouse_id=warehouse_ids[0], to_warehouse_id=warehouse_ids[1], date=day, status='posted')
+        doc.items = [TransferItem(item_id=item_id, qty=Decimal(rng.randrange(1, 10)))
+                     for item_id in rng.sample(item_ids, min(len(item_ids), rng.randrange(2, 8)))]
+        db.session.add(doc)
+        db.session.flush()
+        for line in doc.items:
+            move(day, 'transfer', doc.id, doc.from_warehouse_id, line.item_id, -line.qty, 'Перемещение')
+            move(day, 'transfer', doc.id, doc.to_warehouse_id, line.item_id, line.qty, 'Перемещение')
+        counts['transfers'] += 1
+
+    for day in rng.sample(days, min(len(days), scale * 15)):
+        doc = WriteOff(warehouse_id=rng.choice(warehouse_ids), date=day, status='posted',
+                       reason=rng.choice(('Просрочка', 'Брак', 'Порча при хранении')))
+        doc.items = [WriteOffItem(item_id=item_id, qty=Decimal(rng.randrange(1, 5)))
+                     for item_id in rng.sample(item_ids, min(len(item_ids), rng.randrange(1, 4)))]
+        db.session.add(doc)
+        db.session.flush()
+        for line in doc.items:
+            move(day, 'writeoff', doc.id, doc.warehouse_id, line.item_id, -line.qty, 'Списание')
+        counts['writeoffs'] += 1
+
+    # Инвентаризации — черновики: проведение меняло бы остатки задним числом
+    for day in days[-scale * 2:]:
+        doc = InventoryDoc(warehouse_id=warehouse_ids[0], date=day, status='draft')
+        doc.lines = [InventoryLine(item_id=item_id, counted_qty=Decimal(rng.randrange(0, 100)))
+                     for item_id in rng.sample(item_ids, min(len(item_ids), 20))]
+        db.session.add(doc)
+        counts['inventory_docs'] += 1
+    db.session.flush()
+    return counts
+
+
+def _sales(rng: random.Random, scale: int, days: List[date], products, recipes, warehouse_id: int,
+           movements: List[dict]) -> Counter:
+    from models.orders import DeliveryOrder, DeliveryOrderItem, Order, OrderItem, Payment, Table
+
+    counts = Counter()
+    _insert_ignore(Table, [{'name': str(i)} for i in range(1, 13)], 'name')
+    table_ids = [t.id for t in Table.query.order_by(Table.id)]
+    menu = [(p.id, p.name, p.price) for p in products if p.active]
+    waiters = [_name(rng) for _ in range(6)]
+
+    def basket() -> List[Tuple[int, str, Decimal, int]]:
+        return [(*rng.choice(menu), rng.choices((1, 2, 3), weights=(80, 15, 5))[0])
+                for _ in range(rng.choices((1, 2, 3, 4, 5), weights=(25, 35, 20, 12, 8))[0])]
+
+    orders, baskets = [], []
+    for _ in range(scale * 3000):
+        day = rng.choice(days)
+        status = _weighted(rng, ORDER_STATUSES) if day == days[-1] else rng.choice(('paid',) * 13 + ('cancelled',))
+        lines = basket()
+        baskets.append(lines)
+        orders.append({'table_id': rng.choice(table_ids), 'status': status, 'created_at': _moment(rng, day),
+                       'total': sum(price * qty for _, _, price, qty in lines),
+                       'guest_count': rng.randrange(1, 5), 'waiter': rng.choice(waiters)})
+    # id растут со временем, как в живой базе
+    orders, baskets = map(list, zip(*sorted(zip(orders, baskets), key=lambda pair: pair[0]['created_at'])))
+    order_ids = _insert(Order, orders, returning=True)
+
+    items, payments = [], []
+    for order_id, order, lines in zip(order_ids, orders, baskets):
+        for product_id, name, price, qty in lines:
+            items.append({'order_id': order_id, 'product_id': product_id, 'product_name': name,
+                          'qty': qty, 'unit_price': price, 'sum': price * qty})
+        if order['status'] != 'paid':
+            continue
+        payments.append({'order_id': order_id, 'amount': order['total'], 'created_at': order['created_at'],
+                         'method': _weighted(rng, (('card', 60), ('cash', 30), ('online', 10)))})
+        # Списание ингредиентов по техкартам, как при оплате в кассе
+        usage: Dict[int, Decimal] = {}
+        for product_id, _, _, qty in lines:
+            for item_id, item_qty in recipes.get(product_id, ()):
+                usage[item_id] = usage.get(item_id, Decimal('0')) + item_qty * qty
+        for item_id, qty in usage.items():
+            movements.append({'created_at': order['created_at'], 'doc_type': 'sale', 'doc_id': order_id,
+                              'item_id': item_id, 'warehouse_id': warehouse_id, 'delta': -qty,
+                              'note': f'Продажа, чек #{order_id}'})
+    _insert(OrderItem, items)
+    _insert(Payment, payments)
+    counts.update(orders=len(orders), order_items=len(items), payments=len(payments))
+
+    deliveries, baskets = [], []
+    for _ in range(scale * 1500):
+        day = rng.choice(days)
+        lines = basket()
+        baskets.append(lines)
+        deliveries.append({
+            'status': _weighted(rng, DELIVERY_STATUSES) if day >= days[-2] else rng.choice(('done',) * 10 + ('cancelled',)),
+            'source': _weighted(rng, DELIVERY_SOURCES), 'phone': _phone(rng), 'customer_name': rng.choice(FIRST_NAMES),
+            'street': rng.choice(STREETS), 'house': str(rng.randrange(1, 200)), 'flat': str(rng.randrange(1, 300)),
+            'receive_method': _weighted(rng, (('delivery', 75), ('pickup', 20), ('dinein', 5))),
+            'payment_type': rng.choice(('cash', 'card')), 'created_at': _moment(rng, day),
+            'total': sum(price * qty for _, _, price, qty in lines),
+        })
+    deliveries, baskets = map(list, zip(*sorted(zip(deliveries, baskets), key=lambda pair: pair[0]['created_at'])))
+    delivery_ids = _insert(DeliveryOrder, deliveries, returning=True)
+    items = [{'order_id': order_id, 'product_id': product_id, 'product_name': name,
+              'qty': qty, 'unit_price': price, 'sum': price * qty}
+             for order_id, lines in zip(delivery_ids, baskets) for product_id, name, price, qty in lines]
+    _insert(DeliveryOrderItem, items)
+    counts.update(delivery_orders=len(deliveries), delivery_order_items=len(items))
+    return counts
+
+
+def _people(rng: random.Random, scale: int, days: List[date], run: str) -> Counter:
+    from models.crm import Customer, JobApplication, LoyaltyTier, Promotion
+    from models.employees import Employee, Shift
+    from models.reviews import Review
+    from models.user import Role, User
+
+    counts = Counter()
+    for name, discount in (('Базовый', 0), ('Серебряный', 5), ('Золотой', 10)):
+        _insert_ignore(LoyaltyTier, [{'name': name, 'discount_percent': discount}], 'name')
+    tier_ids = [t.id for t in LoyaltyTier.query.order_by(LoyaltyTier.id)]
+    _insert_ignore(Promotion, [{'code': f'SEED{i}', 'name': f'Скидка {5 * i}%', 'discount_percent': 5 * i}
+                               for i in range(1, 6)], 'code')
+    customers = [{'phone': _phone(rng), 'name': _name(rng), 'points': rng.randrange(0, 5000),
+                  'tier_id': rng.choice(tier_ids)} for _ in range(scale * 1000)]
+    _insert_ignore(Customer, customers, 'phone')
+    counts['customers'] = len(customers)
+
+    roles = {name: _get_or_create(Role, name=name) for name in ('admin', 'staff', 'user')}
+    db.session.flush()
+    password = generate_password_hash('seed')  # хэш дорогой: один на всех
+    users = [{'email': f'{role}{i}-{run}@{EMAIL_DOMAIN}', 'full_name': _name(rng), 'password_hash': password,
+              'is_active': True, 'role_name': role, 'role_id': roles[role].id}
+             for role, count in (('staff', scale * 5), ('user', scale * 100)) for i in range(count)]
+    user_ids = _insert(User, users, returning=True)
+    # Вход в CRM на засеянной базе: admin@seed.local / seed
+    _insert_ignore(User, [{'email': f'admin@{EMAIL_DOMAIN}', 'full_name': 'Администратор', 'password_hash': password,
+                           'is_active': True, 'role_name': 'admin', 'role_id': roles['admin'].id}], 'email')
+    counts['users'] = len(users)
+
+    employees = [Employee(full_name=_name(rng), position=rng.choice(POSITIONS), phone=_phone(rng),
+                          birth_date=date(rng.randrange(1970, 2005), rng.randrange(1, 13), rng.randrange(1, 29)))
+                 for _ in range(scale * 15)]
+    db.session.add_all(employees)
+    db.session.flush()
+    shifts = []
+    for day in days[-60:]:
+        for employee in employees:
+            if rng.random() < 4 / 7:  # четыре смены в неделю
+                start = rng.choice((8, 10, 14))
+                shifts.append({'employee_id': employee.id, 'day': day, 'start_time': time(start),
+                               'end_time': time(start + 8)})
+    _insert(Shift, shifts)
+    counts.update(employees=len(employees), shifts=len(shifts))
+
+    reviews = []
+    for _ in range(scale * 400):
+        base = rng.choices((10, 8, 6, 3), weights=(40, 35, 15, 10))[0]
+        scores = [max(0, min(10, base + rng.randrange(-2, 2))) for _ in range(4)]
+        reviews.append({'user_id': rng.choice(user_ids) if rng.random() < 0.3 else None,
+                        'author_name': rng.choice(FIRST_NAMES), 'service_rating': scores[0],
+                        'product_rating': scores[1], 'ambience_rating': scores[2], 'recommend_rating': scores[3],
+                        'comment': rng.choice(COMMENTS), 'location': rng.choice(STREETS),
+                        'created_at': _moment(rng, rng.choice(days))})
+    _insert(Review, reviews)
+    applications = [{'name': _name(rng), 'desired_position': rng.choice(POSITIONS), 'city': 'Ростов-на-Дону',
+                     'phone': _phone(rng), 'email': f'job{i}-{run}@{EMAIL_DOMAIN}'} for i in range(scale * 30)]
+    _insert(JobApplication, applications)
+    counts.update(reviews=len(reviews), job_applications=len(applications))
+    return counts
+
+
+def seed(scale: int, rng_seed: int = 0) -> Counter:
+    """Заполнить базу на --scale точек; возвращает число созданных строк по таблицам.
+
+    Всё в одной транзакции: при ошибке база не меняется.
+    """
+    from models.cache import CacheVersion
+    from models.inventory import StockBalance, StockMovement, StockSnapshot
+    from models.orders import DailySales
+    from services.page_cache import REVIEWS
+
+    rng = random.Random(rng_seed)
+    today = datetime.utcnow().date()
+    days = [today - timedelta(days=n) for n in range(DAYS - 1, -1, -1)]
+    run = f'{rng_seed}-{datetime.utcnow():%Y%m%d%H%M%S}'
+    movements: List[dict] = []
+
+    products = _catalog(rng, scale)
+    warehouses, item_ids, recipes = _stock(rng, scale, products)
+    warehouse_ids = [w.id for w in warehouses]
+    counts = Counter(products=len(products), stock_items=len(item_ids), recipes=len(recipes))
+    counts += _documents(rng, scale, days, warehouse_ids, item_ids, movements)
+    counts += _sales(rng, scale, days, products, recipes, warehouse_ids[0], movements)
+    counts += _people(rng, scale, days, run)
+
+    movements.sort(key=lambda row: row['created_at'])
+    _insert(StockMovement, movements)
+    counts['stock_movements'] = len(movements)
+    # Остатки и витрины — из того, что записано выше
+    balances: Dict[Tuple[int, int], Decimal] = {}
+    for row in movements:
+        key = (row['warehouse_id'], row['item_id'])
+        balances[key] = balances.get(key, Decimal('0')) + row['delta']
+    rows = [{'warehouse_id': w, 'item_id': i, 'quantity': q} for (w, i), q in sorted(balances.items())]
+    for start in range(0, len(rows), CHUNK):
+        stmt = pg_insert(StockBalance).values(rows[start:start + CHUNK])
+        db.session.execute(stmt.on_conflict_do_update(
+            constraint='uq_stock_balances_warehouse_item',
+            set_={'quantity': func.coalesce(StockBalance.quantity, 0) + stmt.excluded.quantity},
+        ))
+    for day in [d for (d,) in db.session.query(StockSnapshot.day).distinct().order_by(StockSnapshot.day)]:
+        StockSnapshot.take(day)
+    DailySales.rebuild()
+    CacheVersion.bump(REVIEWS, db.session.connection())
+    db.session.commit()
+    return counts
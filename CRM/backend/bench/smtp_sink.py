@@ -0,0 +1,106 @@
+import socketserver
+import threading
+from collections import Counter
+from typing import List, NamedTuple, Set
+
+
+class Received(NamedTuple):
+    sender: str
+    recipients: List[str]
+    data: str
+
+
+class _Session(socketserver.StreamRequestHandler):
+    """Минимальный SMTP: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink: 'SmtpSink' = self.server.sink
+        sink._enter()
+        try:
+            self._reply('220 smtp-sink ready')
+            sender, recipients = '', []
+            while True:
+                raw = self.rfile.readline()
+                if not raw:
+                    return
+                command = raw.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    self._reply('250 smtp-sink')
+                elif verb == 'MAIL':
+                    sender, recipients = command.split(':', 1)[1].strip(' <>'), []
+                    self._reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command.split(':', 1)[1].strip(' <>'))
+                    self._reply('250 OK')
+                elif verb == 'DATA':
+                    self._reply('354 End data with <CR><LF>.<CR><LF>')
+                    lines = []
+                    while True:
+                        line = self.rfile.readline().decode('utf-8', 'replace')
+                        if line in ('.\r\n', '.\n', ''):
+                            break
+                        lines.append(line[1:] if line.startswith('..') else line)
+                    self._reply(sink._accept(Received(sender, recipients, ''.join(lines))))
+                elif verb in ('RSET', 'NOOP'):
+                    self._reply('250 OK')
+                elif verb == 'QUIT':
+                    self._reply('221 Bye')
+                    return
+                else:
+                    self._reply('502 Command not implemented')
+        finally:
+            sink._leave()
+
+
+class SmtpSink:
+    """Локальная замена SMTP-сервера для бенчмарков и ручной проверки почты.
+
+    Письма копятся в messages. Адресаты из flaky получают временный отказ (451)
+    на первые fail_times попыток, адресаты из reject — всегда.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, flaky: Set[str] = frozenset(),
+                 fail_times: int = 2, reject: Set[str] = frozenset()):
+        self.messages: List[Received] = []
+        self.flaky, self.fail_times, self.reject = set(flaky), fail_times, set(reject)
+        self.refused = 0
+        self.max_sessions = 0
+        self._sessions = 0
+        self._attempts: Counter = Counter()
+        self._lock = threading.Lock()
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _Session)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._sessions += 1
+            self.max_sessions = max(self.max_sessions, self._sessions)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._sessions -= 1
+
+    def _accept(self, message: Received) -> str:
+        with self._lock:
+            for recipient in message.recipients:
+                self._attempts[recipient] += 1
+                if recipient in self.reject or (recipient in self.flaky and self._attempts[recipient] <= self.fail_times):
+                    self.refused += 1
+                    return '451 Try again later'
+            self.messages.append(message)
+            return '250 Queued'
+
+    def start(self) -> 'SmtpSink':
+        threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
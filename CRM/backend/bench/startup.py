@@ -0,0 +1,70 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+from bench import bench
+
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Холодный старт одного воркера: импорт app (внутри create_app) + счётчик SQL,
+# выполненных до первого запроса. Библиотеки импортируются заранее, чтобы
+# замер показывал именно работу create_app().
+_PROBE = r'''
+import json, time
+import flask, flask_sqlalchemy, flask_migrate, flask_login, flask_mail, psycopg2  # noqa: F401
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+statements = []
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+started = time.perf_counter()
+import app  # noqa: F401
+elapsed = time.perf_counter() - started
+print(json.dumps({'ms': elapsed * 1000, 'sql': len(statements)}))
+'''
+
+
+def _spawn():
+    return subprocess.Popen(
+        [sys.executable, '-c', _PROBE],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+
+def _collect(proc) -> dict:
+    out, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise click.ClickException('Процесс старта завершился с ошибкой')
+    return json.loads(out.strip().splitlines()[-1])
+
+
+@bench.command('startup')
+@click.option('--runs', default=5, show_default=True, help='Число последовательных холодных стартов.')
+@click.option('--workers', default=8, show_default=True, help='Сколько воркеров стартует одновременно.')
+def startup(runs: int, workers: int):
+    """Время холодного старта create_app() и число SQL-запросов при старте."""
+    sequential = [_collect(_spawn()) for _ in range(runs)]
+    times = [r['ms'] for r in sequential]
+    click.echo(f'sequential: median {statistics.median(times):.1f} ms, '
+               f'min {min(times):.1f} ms, max {max(times):.1f} ms, '
+               f'sql at startup {sequential[-1]["sql"]}')
+
+    started = time.perf_counter()
+    procs = [_spawn() for _ in range(workers)]
+    fleet = [_collect(p) for p in procs]
+    wall = (time.perf_counter() - started) * 1000
+    click.echo(f'{workers} workers in parallel: wall {wall:.1f} ms, '
+               f'slowest worker {max(r["ms"] for r in fleet):.1f} ms, '
+               f'sql total {sum(r["sql"] for r in fleet)}')
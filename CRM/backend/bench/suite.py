@@ -0,0 +1,432 @@
+import http.client
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import click
+from flask import url_for
+from sqlalchemy import event, func, text
+
+from app import app, db
+from bench import bench
+
+
+# Набор сценариев по ключевым экранам: тестовый клиент Flask (без сети),
+# настоящий WSGI-сервер в этом процессе (werkzeug) или внешний сервер (--url,
+# например gunicorn на той же БД). Результаты пишутся в JSON; --baseline
+# сравнивает с прошлым прогоном. Всё, что создали сценарии, удаляется в конце.
+
+MARKER = 'bench-suite'
+PHONE_PREFIX = '+7999100'
+ORDER_LINES = 10  # чек кассы закрывается и начинается новый каждые столько нажатий
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    data: Optional[dict] = None
+
+
+class Scenario(NamedTuple):
+    endpoint: str
+    expected_status: int
+    staff: bool  # под сотрудником CRM, иначе анонимный посетитель сайта
+    prepare: Callable[['Run', object, int], Request]  # вне замера: создать данные для i-го запроса
+
+
+class TestClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def open(self, request: Request) -> int:
+        return self.client.open(request.path, method=request.method, data=request.data).status_code
+
+    def set_cookie(self, name: str, value: str) -> None:
+        self.client.set_cookie(name, value)
+
+    def cookie(self, name: str) -> Optional[str]:
+        cookie = self.client.get_cookie(name)
+        return cookie.value if cookie else None
+
+
+class HttpClient:
+    """Клиент по HTTP с cookie; редиректы не выполняются — меряется сам экран."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookies = SimpleCookie()
+
+    def open(self, request: Request) -> int:
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        body = None
+        if request.data is not None:
+            body = urlencode(request.data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            connection.request(request.method, request.path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        return response.status
+
+    def set_cookie(self, name: str, value: str) -> None:
+        self.cookies[name] = value
+
+    def cookie(self, name: str) -> Optional[str]:
+        morsel = self.cookies.get(name)
+        return morsel.value if morsel else None
+
+
+class Run:
+    """Данные прогона: сотрудник, блюда, созданные чеки и документы (для уборки)."""
+
+    def __init__(self, user_id: int, product_ids: List[int], item_ids: List[int], warehouse_id: int):
+        self.user_id = user_id
+        self.product_ids = product_ids
+        self.item_ids = item_ids
+        self.warehouse_id = warehouse_id
+        self.supplier_id: Optional[int] = None
+        self.order_id: Optional[int] = None
+        self.cart_ids: List[str] = []
+
+    def product(self, i: int) -> int:
+        return self.product_ids[i % len(self.product_ids)]
+
+
+def _menu(run: Run, client, i: int) -> Request:
+    return Request('GET', url_for('site.menu'))
+
+
+def _basket_checkout(run: Run, client, i: int) -> Request:
+    client.open(Request('POST', url_for('site.basket_add'), {'product_id': str(run.product(i)), 'qty': '2'}))
+    return Request('POST', url_for('site.basket_checkout'), {
+        'customer_name': 'Bench', 'contact_phone': f'{PHONE_PREFIX}{i % 10000:04d}',
+        'street': 'Bench', 'comment': MARKER,
+    })
+
+
+def _order_add(run: Run, client, i: int) -> Request:
+    from models.orders import Order
+
+    if run.order_id is None or i % ORDER_LINES == 0:
+        order = Order(status='open', total=0, waiter=MARKER)
+        db.session.add(order)
+        db.session.commit()
+        run.order_id = order.id
+    return Request('POST', url_for('sales.order_add', order_id=run.order_id),
+                   {'product_id': str(run.product(i)), 'qty': '1'})
+
+
+def _order_pay(run: Run, client, i: int) -> Request:
+    from models.catalog import Product
+    from models.orders import Order, OrderItem
+
+    products = Product.query.filter(Product.id.in_([run.product(i + k) for k in range(3)])).all()
+    order = Order(status='open', waiter=MARKER, total=sum(p.price for p in products))
+    order.items = [OrderItem(product_id=p.id, product_name=p.name, qty=1, unit_price=p.price, sum=p.price)
+                   for p in products]
+    db.session.add(order)
+    db.session.commit()
+    return Request('POST', url_for('sales.order_pay', order_id=order.id), {'method': 'card'})
+
+
+def _dashboard(run: Run, client, i: int) -> Request:
+    return Request('GET', url_for('dashboard.index'))
+
+
+def _delivery_home(run: Run, client, i: int) -> Request:
+    return Request('GET', url_for('delivery.home'))
+
+
+def _purchase_post(run: Run, client, i: int) -> Request:
+    from models.inventory import Purchase, PurchaseItem, Supplier
+
+    if run.supplier_id is None:
+        supplier = Supplier(name=MARKER)
+        db.session.add(supplier)
+        db.session.flush()
+        run.supplier_id = supplier.id
+    doc = Purchase(supplier_id=run.supplier_id, warehouse_id=run.warehouse_id, status='draft')
+    doc.items = [PurchaseItem(item_id=run.item_ids[(i * 5 + k) % len(run.item_ids)], qty=Decimal('10'),
+                              price=Decimal('100')) for k in range(5)]
+    db.session.add(doc)
+    db.session.commit()
+    return Request('POST', url_for('inventory.purchase_post', purchase_id=doc.id))
+
+
+SCENARIOS = (
+    Scenario('site.menu', 200, False, _menu),
+    Scenario('site.basket_checkout', 302, False, _basket_checkout),
+    Scenario('sales.order_add', 302, True, _order_add),
+    Scenario('sales.order_pay', 302, True, _order_pay),
+    Scenario('dashboard.index', 200, True, _dashboard),
+    Scenario('delivery.home', 200, True, _delivery_home),
+    Scenario('inventory.purchase_post', 302, True, _purchase_post),
+)
+
+
+def _percentile(values: List[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def _session_cookie(user_id: int) -> Tuple[str, str]:
+    """Cookie сессии вошедшего сотрудника — без формы входа и пароля."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return app.config['SESSION_COOKIE_NAME'], serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+def _measure(scenario: Scenario, run: Run, client, requests: int, warmup: int, engines) -> dict:
+    statements = Counter()
+    counting = threading.Event()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if counting.is_set():
+            statements['n'] += 1
+
+    for engine in engines or ():
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    timings: List[float] = []
+    queries: List[int] = []
+    statuses = Counter()
+    try:
+        for i in range(warmup + requests):
+            with app.test_request_context():
+                request = scenario.prepare(run, client, i)
+            statements.clear()
+            counting.set()
+            started = time.perf_counter()
+            status = client.open(request)
+            elapsed = time.perf_counter() - started
+            counting.clear()
+            if i < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(statements['n'])
+            statuses[status] += 1
+    finally:
+        for engine in engines or ():
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    cart_id = client.cookie('cart_id')
+    if cart_id:
+        run.cart_ids.append(cart_id)
+    return {
+        'requests': len(timings),
+        'errors': sum(n for status, n in statuses.items() if status != scenario.expected_status),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'p50_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'queries': statistics.median(queries) if engines else None,
+        'queries_max': max(queries) if engines else None,
+    }
+
+
+def _line(result: dict) -> str:
+    line = (f'{result["endpoint"]:<26} {result["transport"]:<8} p50 {result["p50_ms"]:7.1f} ms, '
+            f'p95 {result["p95_ms"]:7.1f} ms, p99 {result["p99_ms"]:7.1f} ms')
+    if result['queries'] is not None:
+        line += f', {result["queries"]:g} queries (max {result["queries_max"]})'
+    if result['errors']:
+        line += f', {result["errors"]} unexpected statuses {result["statuses"]}'
+    return line
+
+
+def _start_server():
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def _reverse_movements(doc_type: str, ids: List[int]) -> None:
+    if not ids:
+        return
+    db.session.execute(text("""
+        UPDATE stock_balances AS b SET quantity = b.quantity - m.delta
+        FROM (SELECT warehouse_id, item_id, SUM(delta) AS delta FROM stock_movements
+              WHERE doc_type = :doc_type AND doc_id = ANY(:ids) GROUP BY warehouse_id, item_id) AS m
+        WHERE b.warehouse_id = m.warehouse_id AND b.item_id = m.item_id
+    """), {'doc_type': doc_type, 'ids': ids})
+    db.session.execute(text('DELETE FROM stock_movements WHERE doc_type = :doc_type AND doc_id = ANY(:ids)'),
+                       {'doc_type': doc_type, 'ids': ids})
+
+
+def _cleanup(run: Run) -> None:
+    from models.cart import Cart
+    from models.crm import Customer
+    from models.inventory import Purchase, PurchaseItem, Supplier
+    from models.jobs import Job
+    from models.orders import DailySales, DeliveryOrder, DeliveryOrderItem, Order, OrderItem, Payment
+    from services.backflush import BACKFLUSH_JOB
+
+    with app.app_context():
+        delivery_ids = db.session.query(DeliveryOrder.id).filter_by(comment=MARKER)
+        DeliveryOrderItem.query.filter(DeliveryOrderItem.order_id.in_(delivery_ids)).delete(synchronize_session=False)
+        DeliveryOrder.query.filter_by(comment=MARKER).delete(synchronize_session=False)
+        Customer.query.filter(Customer.phone.like(f'{PHONE_PREFIX}%')).delete(synchronize_session=False)
+        Cart.query.filter(Cart.id.in_(run.cart_ids)).delete(synchronize_session=False)
+
+        order_ids = [order_id for (order_id,) in db.session.query(Order.id).filter_by(waiter=MARKER)]
+        _reverse_movements('sale', order_ids)
+        # При BACKFLUSH_ASYNC списание ещё может ждать в очереди
+        Job.query.filter(Job.kind == BACKFLUSH_JOB, Job.payload['doc_type'].astext == 'sale',
+                         Job.payload['doc_id'].astext.in_([str(i) for i in order_ids])).delete(synchronize_session=False)
+        Payment.query.filter(Payment.order_id.in_(order_ids)).delete(synchronize_session=False)
+        OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+
+        supplier_ids = db.session.query(Supplier.id).filter_by(name=MARKER)
+        purchase_ids = [doc_id for (doc_id,) in db.session.query(Purchase.id).filter(Purchase.supplier_id.in_(supplier_ids))]
+        _reverse_movements('purchase', purchase_ids)
+        PurchaseItem.query.filter(PurchaseItem.purchase_id.in_(purchase_ids)).delete(synchronize_session=False)
+        Purchase.query.filter(Purchase.id.in_(purchase_ids)).delete(synchronize_session=False)
+        Supplier.query.filter_by(name=MARKER).delete(synchronize_session=False)
+        DailySales.rebuild()
+        db.session.commit()
+
+
+def _environment() -> dict:
+    from models.catalog import Product
+    from models.inventory import StockMovement
+    from models.orders import DeliveryOrder, Order
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    with app.app_context():
+        data = {name: db.session.query(func.count(model.id)).scalar()
+                for name, model in (('products', Product), ('orders', Order),
+                                    ('delivery_orders', DeliveryOrder), ('stock_movements', StockMovement))}
+    return {'started_at': datetime.utcnow().isoformat(timespec='seconds'), 'git_commit': commit,
+            'python': platform.python_version(), 'data': data}
+
+
+def _compare(results: List[dict], baseline_path: str, threshold: float, min_delta_ms: float) -> int:
+    with open(baseline_path, encoding='utf-8') as fh:
+        baseline = {(r['endpoint'], r['transport']): r for r in json.load(fh)['results']}
+    regressions = 0
+    click.echo(f'Compared with {baseline_path} (p95 threshold +{threshold:.0f}%):')
+    for result in results:
+        before = baseline.get((result['endpoint'], result['transport']))
+        if before is None:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        # На экранах в доли миллисекунды проценты — это шум
+        slower = change > threshold and result['p95_ms'] - before['p95_ms'] > min_delta_ms
+        more_queries = (result['queries'] is not None and before.get('queries') is not None
+                        and result['queries'] > before['queries'])
+        regressions += slower or more_queries
+        mark = 'REGR' if slower or more_queries else 'OK'
+        queries = (f', queries {before["queries"]:g} -> {result["queries"]:g}'
+                   if result['queries'] is not None and before.get('queries') is not None else '')
+        click.echo(f'{mark:<5} {result["endpoint"]:<26} {result["transport"]:<7} '
+                   f'p95 {before["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms ({change:+.0f}%){queries}')
+    return regressions
+
+
+@bench.command('suite')
+@click.option('--requests', default=200, show_default=True, help='Замеряемых запросов на сценарий.')
+@click.option('--warmup', default=10, show_default=True, help='Запросов прогрева на сценарий (не в отчёте).')
+@click.option('--transport', 'transports', type=click.Choice(['client', 'server']), multiple=True,
+              help='client — тестовый клиент Flask, server — WSGI-сервер в этом процессе (по умолчанию оба).')
+@click.option('--url', help='Внешний сервер на той же БД (например gunicorn) вместо встроенного.')
+@click.option('--only', multiple=True, help='Только эти endpoint (можно несколько раз).')
+@click.option('--user-id', type=int, help='Сотрудник CRM (по умолчанию первый admin).')
+@click.option('--output', type=click.Path(dir_okay=False), help='Файл результатов (по умолчанию instance/bench/).')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Прошлый прогон для сравнения.')
+@click.option('--threshold', default=20.0, show_default=True, help='Рост p95, %, который считается регрессией.')
+@click.option('--min-delta-ms', default=1.0, show_default=True, help='...и при этом не меньше стольких мс.')
+def suite(requests: int, warmup: int, transports, url, only, user_id, output, baseline, threshold: float,
+          min_delta_ms: float):
+    """Задержка p50/p95/p99 и SQL-запросы на ключевых экранах; результаты в JSON.
+
+    Запускать на засеянной копии БД (manage.py seed). Завершается с кодом 1 при
+    неожиданных кодах ответа или регрессии относительно --baseline. Число
+    SQL-запросов видно только для встроенных транспортов.
+    """
+    from models.catalog import Product
+    from models.inventory import StockItem, Warehouse
+    from models.user import Role, User
+
+    scenarios = [s for s in SCENARIOS if not only or s.endpoint in only]
+    if not scenarios:
+        raise click.ClickException('Нет сценариев: ' + ', '.join(s.endpoint for s in SCENARIOS))
+    with app.app_context():
+        if user_id is None:
+            admin = (User.query.join(Role, User.role_id == Role.id).filter(Role.name == 'admin')
+                     .order_by(User.id).first())
+            if admin is None:
+                raise click.ClickException('Нужен пользователь с ролью admin (или --user-id)')
+            user_id = admin.id
+        product_ids = [p.id for p in Product.query.filter_by(active=True).order_by(Product.id).limit(20)]
+        item_ids = [i.id for i in StockItem.query.order_by(StockItem.id).limit(50)]
+        warehouse = Warehouse.query.order_by(Warehouse.id).first()
+        if not product_ids or not item_ids or warehouse is None:
+            raise click.ClickException('Пустая база: сначала manage.py seed')
+        run = Run(user_id, product_ids, item_ids, warehouse.id)
+        # Основная база и реплика (DATABASE_REPLICA_URL): считаются запросы на обеих
+        engines = list(db.engines.values())
+
+    meta = _environment()
+    targets = [('external', url)] if url else [(name, None) for name in (transports or ('client', 'server'))]
+    results = []
+    try:
+        for transport, base_url in targets:
+            server = None
+            if transport == 'server':
+                server, base_url = _start_server()
+            try:
+                for scenario in scenarios:
+                    client = TestClient() if transport == 'client' else HttpClient(base_url)
+                    if scenario.staff:
+                        client.set_cookie(*_session_cookie(run.user_id))
+                    try:
+                        result = _measure(scenario, run, client, requests, warmup,
+                                          None if transport == 'external' else engines)
+                    except OSError as exc:
+                        raise click.ClickException(f'{base_url}: {exc}')
+                    results.append({'endpoint': scenario.endpoint, 'transport': transport, **result})
+                    click.echo(_line(results[-1]))
+            finally:
+                if server is not None:
+                    server.shutdown()
+    finally:
+        _cleanup(run)
+
+    if not output:
+        output = os.path.join(app.instance_path, 'bench', f'suite-{datetime.utcnow():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump({**meta, 'requests': requests, 'results': results}, fh, ensure_ascii=False, indent=2)
+    click.echo(f'Results: {output}')
+
+    failed = sum(r['errors'] for r in results)
+    if baseline:
+        failed += _compare(results, baseline, threshold, min_delta_ms)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,59 @@
+import logging
+import multiprocessing
+import os
+
+
+# Боевой профиль: gunicorn -c gunicorn.conf.py wsgi:application
+#
+# gthread: процессы по числу ядер, в каждом пул потоков. Потоки нужны из-за
+# SSE-досок (services/events.py): открытая доска держит поток всё время, пока
+# она открыта. Приложение упирается в БД, а не в CPU, поэтому потоков больше,
+# чем ядер, а пул соединений в каждом процессе равен числу потоков — лишние
+# соединения Postgres не нужны, а нехватка превращается в ожидание pool_timeout.
+#
+# Соединений к Postgres на весь сервер:
+#   workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) + workers (LISTEN досок)
+# и это число должно быть меньше max_connections с запасом на миграции и cron.
+
+cores = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', str(max(2, cores))))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# Перезапуск воркеров против медленных утечек памяти; jitter — чтобы не все разом
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+# Heartbeat воркеров в памяти, а не на диске (в контейнере /tmp бывает overlayfs)
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-')
+
+# Приложение грузится один раз в мастере, воркеры получают его через fork
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+
+
+def when_ready(server):
+    pool = int(os.environ['DB_POOL_SIZE']) + int(os.environ['DB_MAX_OVERFLOW'])
+    if os.getenv('DB_PGBOUNCER', 'False').lower() == 'true':
+        server.log.info('workers=%s threads=%s, PgBouncer mode: no local pool', workers, threads)
+        return
+    server.log.info('workers=%s threads=%s: up to %s Postgres connections (%s pool + 1 LISTEN per worker)',
+                    workers, threads, workers * (pool + 1), pool)
+
+
+def post_fork(server, worker):
+    # Соединения, открытые мастером при preload (миграции, прогрев кэшей),
+    # не должны достаться нескольким процессам: сокет libpq общий после fork.
+    # close=False — не закрывать их из воркера, мастер закроет свои сам.
+    from app import app, db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    logging.getLogger(__name__).debug('worker %s: engine pools reset after fork', worker.pid)
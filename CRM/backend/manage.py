@@ -1,6 +1,9 @@
 import click
+from flask_migrate import upgrade
 from app import app, db
 from models import *  # noqa
+from bench import bench
+from bench.index_report import index_report
 
 
 @click.group()
@@ -8,11 +11,19 @@ def cli():
     pass
 
 
+@cli.command('migrate')
+def migrate_db():
+    """Применить миграции схемы (однократно, перед запуском воркеров)."""
+    with app.app_context():
+        upgrade()
+    click.echo('Migrations applied')
+
+
 @cli.command('init-db')
 def init_db():
     """Создать таблицы и базовые данные (роль admin, столы)."""
     with app.app_context():
-        db.create_all()
+        upgrade()
         from models.user import Role
         if not Role.query.filter_by(name='admin').first():
             db.session.add(Role(name='admin'))
@@ -27,15 +38,9 @@ def init_db():
 
 @cli.command('fix-db')
 def fix_db():
-    """Починить схему: добавить недостающие колонки, если их нет."""
-    from sqlalchemy import inspect, text
-    with app.app_context():
-        insp = inspect(db.engine)
-        cols = {c['name'] for c in insp.get_columns('users')}
-        # Добавить users.password_hash, если отсутствует
-        if 'password_hash' not in cols:
-            db.session.execute(text('ALTER TABLE users ADD COLUMN password_hash VARCHAR(255);'))
-            db.session.commit()
+    """Починить схему: применить недостающие миграции."""
+    with app.app_context():
+        upgrade()
         # Убедиться, что есть роль admin
         from models.user import Role
         if not Role.query.filter_by(name='admin').first():
@@ -44,6 +49,174 @@ def fix_db():
     click.echo('DB fixed')
 
 
+@cli.command('rebuild-daily-sales')
+def rebuild_daily_sales():
+    """Пересчитать витрину daily_sales из заказов (при расхождениях)."""
+    with app.app_context():
+        from models.orders import DailySales
+        DailySales.rebuild()
+        db.session.commit()
+    click.echo('daily_sales rebuilt')
+
+
+@cli.command('reconcile-totals')
+@click.option('--fix', is_flag=True, help='Пересчитать суммы неоплаченных чеков и заказов доставки.')
+def reconcile_totals(fix: bool):
+    """Сверить суммы заказов с суммами их позиций (запускать по расписанию).
+
+    Код выхода 1, если остались расхождения, которые не исправлены.
+    """
+    from models.orders import DeliveryOrder, Order
+    unresolved = 0
+    with app.app_context():
+        for label, model, fixable in (('orders', Order, lambda row: row.status != 'paid'),
+                                      ('delivery_orders', DeliveryOrder, lambda row: True)):
+            drift = model.reconcile_totals(fix=fix)
+            for row in drift:
+                fixed = fix and fixable(row)
+                unresolved += not fixed
+                click.echo(f'{label} #{row.id} ({row.status}): total {row.total} != items {row.items_total}'
+                           f'{" -> fixed" if fixed else ""}')
+            click.echo(f'{label}: {len(drift)} with drift')
+        db.session.commit()
+    if unresolved:
+        raise SystemExit(1)
+
+
+@cli.command('seed')
+@click.option('--scale', default=1, show_default=True, type=click.IntRange(1, 100),
+              help='Объём: 1 — одна точка за полгода (≈3000 чеков, 1500 доставок).')
+@click.option('--seed', 'rng_seed', default=0, show_default=True, help='Зерно генератора: те же данные при повторе.')
+def seed_db(scale: int, rng_seed: int):
+    """Заполнить базу синтетическими данными для бенчмарков (только не в рабочей БД)."""
+    from bench.seed import seed
+    with app.app_context():
+        counts = seed(scale, rng_seed)
+    click.echo('Seeded: ' + ', '.join(f'{table} {n}' for table, n in sorted(counts.items())))
+
+
+@cli.command('worker')
+@click.option('--concurrency', default=4, show_default=True, help='Потоков, выполняющих задачи одновременно.')
+@click.option('--poll', default=1.0, show_default=True, help='Пауза между опросами пустой очереди, с.')
+@click.option('--once', is_flag=True, help='Выполнить готовые задачи и выйти.')
+def worker(concurrency: int, poll: float, once: bool):
+    """Выполнять фоновые задачи из таблицы jobs (почта, списание по техкартам)."""
+    from services.jobs import Worker
+    runner = Worker(app, concurrency=concurrency, poll_seconds=poll)
+    click.echo(f'Worker {runner.name}: {concurrency} threads')
+    runner.run(once=once)
+    click.echo(f'Processed {runner.processed} jobs, failed {runner.failed}')
+
+
+@cli.command('purge-carts')
+@click.option('--days', default=30, show_default=True, help='Удалить корзины, не менявшиеся столько дней.')
+def purge_carts(days: int):
+    """Удалить брошенные корзины сайта из хранилища CART_STORE."""
+    from datetime import timedelta
+    from services.cart_store import get_store
+    with app.app_context():
+        removed = get_store().purge(timedelta(days=days))
+    click.echo(f'Removed {removed} carts')
+
+
+@cli.command('purge-idempotency-keys')
+@click.option('--hours', default=24, show_default=True, help='Удалить ключи старше стольких часов.')
+def purge_idempotency_keys(hours: int):
+    """Удалить устаревшие ключи идемпотентности и сохранённые ответы."""
+    from datetime import timedelta
+    from services.idempotency import purge
+    with app.app_context():
+        removed = purge(timedelta(hours=hours))
+    click.echo(f'Removed {removed} idempotency keys')
+
+
+@cli.group('stock-snapshots')
+def stock_snapshots():
+    """Снимки остатков на конец дня (для отчётов «на дату»)."""
+
+
+@stock_snapshots.command('take')
+@click.option('--day', type=click.DateTime(formats=['%Y-%m-%d']), help='День (по умолчанию вчера).')
+def snapshots_take(day):
+    """Снять остатки всех складов на конец дня (запускать по cron ночью)."""
+    from datetime import datetime, timedelta
+    from models.inventory import StockSnapshot
+    day = day.date() if day else datetime.utcnow().date() - timedelta(days=1)
+    with app.app_context():
+        rows = StockSnapshot.take(day)
+        db.session.commit()
+    click.echo(f'Snapshot {day}: {rows} rows')
+
+
+@stock_snapshots.command('rebuild')
+def snapshots_rebuild():
+    """Пересчитать все существующие снимки по журналу движений."""
+    from models.inventory import StockSnapshot
+    with app.app_context():
+        days = [d for (d,) in db.session.query(StockSnapshot.day).distinct().order_by(StockSnapshot.day)]
+        for day in days:
+            StockSnapshot.take(day)
+        db.session.commit()
+    click.echo(f'Rebuilt {len(days)} snapshots')
+
+
+@stock_snapshots.command('verify')
+def snapshots_verify():
+    """Сверить снимки с журналом движений."""
+    from models.inventory import StockSnapshot
+    with app.app_context():
+        mismatches = StockSnapshot.verify()
+    for warehouse_id, item_id, day, snapshot_qty, ledger_qty in mismatches:
+        click.echo(f'{day} warehouse={warehouse_id} item={item_id}: snapshot {snapshot_qty} != ledger {ledger_qty}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Snapshots match the movement ledger')
+
+
+@cli.command('assets')
+@click.option('--clean', is_flag=True, help='Удалить файлы прошлых сборок, которых нет в новом манифесте.')
+def build_assets(clean: bool):
+    """Собрать статику сайта в static/dist: минификация, бандлы, хэши имён, .gz/.br."""
+    from services.assets import build
+    result = build(app.static_folder, clean=clean)
+    click.echo(f'Built {result.files} assets: {result.source_bytes / 1024:.0f} KB -> '
+               f'{result.output_bytes / 1024:.0f} KB, precompressed gzip {result.gzip_bytes / 1024:.0f} KB, '
+               f'brotli {result.brotli_bytes / 1024:.0f} KB')
+    if clean:
+        click.echo(f'Removed {result.removed} stale files')
+
+
+@cli.group('images')
+def images_group():
+    """Загруженные картинки: WebP/AVIF-варианты и очистка входящих."""
+
+
+@images_group.command('backfill')
+@click.option('--inline', is_flag=True, help='Обработать сразу, без очереди и manage.py worker.')
+def images_backfill(inline: bool):
+    """Пропустить через конвейер загрузки, сохранённые без обработки."""
+    from services.images import backfill
+    with app.app_context():
+        counts = backfill(inline=inline)
+    action = 'Processed' if inline else 'Queued'
+    click.echo(f'{action} {sum(counts.values())} uploads: '
+               + (', '.join(f'{kind} {n}' for kind, n in sorted(counts.items())) or 'nothing to do'))
+
+
+@images_group.command('purge-incoming')
+@click.option('--hours', default=24, show_default=True, help='Удалить входящие старше стольких часов.')
+def images_purge_incoming(hours: int):
+    """Удалить входящие загрузки, для которых нет задачи (запрос откатился)."""
+    from services.images import purge_incoming
+    with app.app_context():
+        removed = purge_incoming(hours * 3600)
+    click.echo(f'Removed {removed} incoming uploads')
+
+
+cli.add_command(bench)
+cli.add_command(index_report)
+
+
 if __name__ == '__main__':
     cli()
 
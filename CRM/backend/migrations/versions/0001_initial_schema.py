@@ -0,0 +1,402 @@
+"""initial schema
+
+Revision ID: 0001_initial
+Revises: 
+Create Date: 2026-10-18 09:34:57.852823
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Базы, созданные раньше через db.create_all(), уже содержат часть таблиц:
+    # создаём только недостающие, а колонки досоздаёт следующая ревизия.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    def create_table(name, *columns):
+        if name not in existing:
+            op.create_table(name, *columns)
+
+    create_table('categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('parent_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['parent_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('customers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('name', sa.String(length=120), nullable=True),
+    sa.Column('points', sa.Integer(), nullable=True),
+    sa.Column('tier_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('phone')
+    )
+    create_table('employees',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('full_name', sa.String(length=200), nullable=False),
+    sa.Column('position', sa.String(length=120), nullable=False),
+    sa.Column('birth_date', sa.Date(), nullable=True),
+    sa.Column('phone', sa.String(length=30), nullable=True),
+    sa.Column('address', sa.String(length=255), nullable=True),
+    sa.Column('photo_url', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('job_applications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('desired_position', sa.String(length=120), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('phone', sa.String(length=50), nullable=True),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('comment', sa.String(length=500), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('loyalty_tiers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('discount_percent', sa.Numeric(precision=5, scale=2), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    create_table('modifiers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('price_delta', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('promotions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.String(length=50), nullable=True),
+    sa.Column('name', sa.String(length=200), nullable=True),
+    sa.Column('discount_percent', sa.Numeric(precision=5, scale=2), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('code')
+    )
+    create_table('roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    create_table('stock_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('unit', sa.String(length=20), nullable=True),
+    sa.Column('category', sa.String(length=120), nullable=True),
+    sa.Column('item_type', sa.String(length=50), nullable=True),
+    sa.Column('sku', sa.String(length=100), nullable=True),
+    sa.Column('barcode', sa.String(length=100), nullable=True),
+    sa.Column('purchase_price_plan', sa.Numeric(precision=12, scale=3), nullable=True),
+    sa.Column('sale_price', sa.Numeric(precision=12, scale=3), nullable=True),
+    sa.Column('is_alcohol', sa.String(length=5), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('suppliers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('contact', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('tables',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    create_table('warehouses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    create_table('inventory_docs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('orders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('total', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('guest_count', sa.Integer(), nullable=True),
+    sa.Column('waiter', sa.String(length=120), nullable=True),
+    sa.Column('comment', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['table_id'], ['tables.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('products',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('image_url', sa.String(length=255), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('portion_grams', sa.Integer(), nullable=True),
+    sa.Column('protein_100g', sa.Numeric(precision=7, scale=2), nullable=True),
+    sa.Column('fat_100g', sa.Numeric(precision=7, scale=2), nullable=True),
+    sa.Column('carb_100g', sa.Numeric(precision=7, scale=2), nullable=True),
+    sa.Column('kcal_100g', sa.Integer(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('purchases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('supplier_id', sa.Integer(), nullable=True),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['supplier_id'], ['suppliers.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('shifts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('stock_balances',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=12, scale=3), nullable=True),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('stock_movements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('doc_type', sa.String(length=30), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.Column('note', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('transfers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('from_warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('to_warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['from_warehouse_id'], ['warehouses.id'], ),
+    sa.ForeignKeyConstraint(['to_warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('full_name', sa.String(length=255), nullable=True),
+    sa.Column('avatar_url', sa.String(length=255), nullable=True),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('role', sa.String(length=50), server_default='staff', nullable=False),
+    sa.Column('role_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    if 'users' not in existing:
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    create_table('writeoffs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('reason', sa.String(length=200), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('delivery_orders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('source', sa.String(length=30), nullable=True),
+    sa.Column('phone', sa.String(length=30), nullable=True),
+    sa.Column('customer_name', sa.String(length=120), nullable=True),
+    sa.Column('street', sa.String(length=200), nullable=True),
+    sa.Column('house', sa.String(length=50), nullable=True),
+    sa.Column('flat', sa.String(length=50), nullable=True),
+    sa.Column('entrance', sa.String(length=50), nullable=True),
+    sa.Column('floor', sa.String(length=50), nullable=True),
+    sa.Column('comment', sa.String(length=255), nullable=True),
+    sa.Column('planned_at', sa.DateTime(), nullable=True),
+    sa.Column('receive_method', sa.String(length=20), nullable=True),
+    sa.Column('payment_type', sa.String(length=20), nullable=True),
+    sa.Column('total', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('courier_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('inventory_lines',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('counted_qty', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['doc_id'], ['inventory_docs.id'], ),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('order_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('product_name', sa.String(length=200), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=True),
+    sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('sum', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('payments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('method', sa.String(length=30), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('product_modifiers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('modifier_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['modifier_id'], ['modifiers.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('purchase_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('purchase_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('qty', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.Column('price', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['purchase_id'], ['purchases.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('recipes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('reviews',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('author_name', sa.String(length=120), nullable=True),
+    sa.Column('service_rating', sa.Integer(), nullable=False),
+    sa.Column('product_rating', sa.Integer(), nullable=False),
+    sa.Column('ambience_rating', sa.Integer(), nullable=False),
+    sa.Column('recommend_rating', sa.Integer(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('location', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('transfer_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('transfer_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('qty', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['transfer_id'], ['transfers.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('writeoff_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('writeoff_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('qty', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['writeoff_id'], ['writeoffs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('delivery_order_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('product_name', sa.String(length=200), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=True),
+    sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('sum', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['delivery_orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    create_table('recipe_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('qty', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('recipe_items')
+    op.drop_table('delivery_order_items')
+    op.drop_table('writeoff_items')
+    op.drop_table('transfer_items')
+    op.drop_table('reviews')
+    op.drop_table('recipes')
+    op.drop_table('purchase_items')
+    op.drop_table('product_modifiers')
+    op.drop_table('payments')
+    op.drop_table('order_items')
+    op.drop_table('inventory_lines')
+    op.drop_table('delivery_orders')
+    op.drop_table('writeoffs')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
+    op.drop_table('transfers')
+    op.drop_table('stock_movements')
+    op.drop_table('stock_balances')
+    op.drop_table('shifts')
+    op.drop_table('purchases')
+    op.drop_table('products')
+    op.drop_table('orders')
+    op.drop_table('inventory_docs')
+    op.drop_table('warehouses')
+    op.drop_table('tables')
+    op.drop_table('suppliers')
+    op.drop_table('stock_items')
+    op.drop_table('roles')
+    op.drop_table('promotions')
+    op.drop_table('modifiers')
+    op.drop_table('loyalty_tiers')
+    op.drop_table('job_applications')
+    op.drop_table('employees')
+    op.drop_table('customers')
+    op.drop_table('categories')
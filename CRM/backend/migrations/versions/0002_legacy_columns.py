@@ -0,0 +1,77 @@
+"""legacy columns (бывшая автопочинка схемы в create_app)
+
+Revision ID: 0002_legacy_columns
+Revises: 0001_initial
+Create Date: 2026-10-18 09:40:12.114027
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_legacy_columns'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+# Колонки, которые create_app() раньше досоздавал на каждом старте.
+LEGACY_COLUMNS = {
+    'users': [
+        ('password_hash', 'VARCHAR(255)'),
+        ('role_id', 'INTEGER'),
+        ('role', "VARCHAR(50) NOT NULL DEFAULT 'staff'"),
+        ('avatar_url', 'VARCHAR(255)'),
+    ],
+    'stock_movements': [
+        ('doc_type', 'VARCHAR(30)'),
+        ('doc_id', 'INTEGER'),
+        ('warehouse_id', 'INTEGER'),
+        ('note', 'VARCHAR(200)'),
+    ],
+    'stock_items': [
+        ('category', 'VARCHAR(120)'),
+        ('item_type', "VARCHAR(50) DEFAULT 'raw'"),
+        ('sku', 'VARCHAR(100)'),
+        ('barcode', 'VARCHAR(100)'),
+        ('purchase_price_plan', 'NUMERIC(12,3)'),
+        ('sale_price', 'NUMERIC(12,3)'),
+        ('is_alcohol', 'VARCHAR(5)'),
+    ],
+    'products': [
+        ('image_url', 'VARCHAR(255)'),
+        ('description', 'TEXT'),
+        ('portion_grams', 'INTEGER'),
+        ('protein_100g', 'NUMERIC(7,2)'),
+        ('fat_100g', 'NUMERIC(7,2)'),
+        ('carb_100g', 'NUMERIC(7,2)'),
+        ('kcal_100g', 'INTEGER'),
+    ],
+    'job_applications': [
+        ('comment', 'VARCHAR(500)'),
+    ],
+    'orders': [
+        ('guest_count', 'INTEGER DEFAULT 1'),
+        ('waiter', 'VARCHAR(120)'),
+        ('comment', 'VARCHAR(255)'),
+    ],
+    'delivery_orders': [
+        ('courier_id', 'INTEGER'),
+        ('user_id', 'INTEGER'),
+    ],
+}
+
+
+def upgrade():
+    for table, columns in LEGACY_COLUMNS.items():
+        for name, ddl in columns:
+            op.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {ddl}')
+
+    # Установить default и заполнить null значением 'staff' (один раз, а не на каждом старте)
+    op.execute("ALTER TABLE users ALTER COLUMN role SET DEFAULT 'staff'")
+    op.execute("UPDATE users SET role = 'staff' WHERE role IS NULL")
+
+
+def downgrade():
+    # Колонки входят в актуальные модели, откатывать нечего.
+    pass
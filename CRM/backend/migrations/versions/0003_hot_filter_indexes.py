@@ -0,0 +1,49 @@
+"""hot filter indexes
+
+Revision ID: 0003_hot_filter_indexes
+Revises: 0002_legacy_columns
+Create Date: 2026-10-18 09:37:33.501869
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_filter_indexes'
+down_revision = '0002_legacy_columns'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_orders_created_at', 'orders', ['created_at']),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_payments_order_id', 'payments', ['order_id']),
+    ('ix_delivery_orders_created_at', 'delivery_orders', ['created_at']),
+    ('ix_delivery_orders_status_created_at', 'delivery_orders', ['status', 'created_at']),
+    ('ix_delivery_orders_user_id', 'delivery_orders', ['user_id']),
+    ('ix_delivery_order_items_order_id', 'delivery_order_items', ['order_id']),
+    ('ix_stock_balances_warehouse_item', 'stock_balances', ['warehouse_id', 'item_id']),
+    ('ix_stock_movements_item_warehouse_created', 'stock_movements', ['item_id', 'warehouse_id', 'created_at']),
+    ('ix_purchase_items_purchase_id', 'purchase_items', ['purchase_id']),
+    ('ix_inventory_lines_doc_id', 'inventory_lines', ['doc_id']),
+    ('ix_shifts_day', 'shifts', ['day']),
+    ('ix_reviews_created_at', 'reviews', ['created_at']),
+]
+
+
+def upgrade():
+    # order_items / stock_movements растут без ограничений: строим индексы
+    # CONCURRENTLY, чтобы не блокировать запись на время миграции.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,53 @@
+"""daily sales rollup
+
+Revision ID: 0004_daily_sales
+Revises: 0003_hot_filter_indexes
+Create Date: 2026-10-18 09:39:28.250690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_daily_sales'
+down_revision = '0003_hot_filter_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('channel', sa.String(length=30), nullable=False),
+    sa.Column('orders_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('deliveries_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'channel', name='uq_daily_sales_day_channel')
+    )
+    # Заполнить витрину по накопленной истории (дальше она ведётся инкрементально)
+    op.execute("""
+        INSERT INTO daily_sales (day, channel, orders_count, revenue, deliveries_count)
+        SELECT day, channel, SUM(orders_count), SUM(revenue), SUM(deliveries_count)
+        FROM (
+            SELECT created_at::date AS day, 'pos' AS channel,
+                   COUNT(*) AS orders_count,
+                   COALESCE(SUM(total) FILTER (WHERE status = 'paid'), 0) AS revenue,
+                   0 AS deliveries_count
+            FROM orders
+            WHERE created_at IS NOT NULL
+            GROUP BY created_at::date
+            UNION ALL
+            SELECT created_at::date, COALESCE(source, 'phone'), 0, 0, COUNT(*)
+            FROM delivery_orders
+            WHERE created_at IS NOT NULL
+            GROUP BY created_at::date, COALESCE(source, 'phone')
+        ) AS totals
+        GROUP BY day, channel
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_sales')
@@ -0,0 +1,44 @@
+"""unique stock balance per warehouse and item
+
+Revision ID: 0005_stock_balances_unique
+Revises: 0004_daily_sales
+Create Date: 2026-10-18 09:42:51.307718
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_stock_balances_unique'
+down_revision = '0004_daily_sales'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Дубликаты (склад, товар) от старого read-modify-write сливаем в строку с меньшим id
+    op.execute("""
+        UPDATE stock_balances AS b
+        SET quantity = d.total
+        FROM (
+            SELECT MIN(id) AS keep_id, SUM(COALESCE(quantity, 0)) AS total
+            FROM stock_balances
+            GROUP BY warehouse_id, item_id
+            HAVING COUNT(*) > 1
+        ) AS d
+        WHERE b.id = d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM stock_balances AS b
+        USING stock_balances AS k
+        WHERE b.warehouse_id = k.warehouse_id
+          AND b.item_id = k.item_id
+          AND b.id > k.id
+    """)
+    op.drop_index('ix_stock_balances_warehouse_item', table_name='stock_balances', if_exists=True)
+    op.create_unique_constraint('uq_stock_balances_warehouse_item', 'stock_balances', ['warehouse_id', 'item_id'])
+
+
+def downgrade():
+    op.drop_constraint('uq_stock_balances_warehouse_item', 'stock_balances', type_='unique')
+    op.create_index('ix_stock_balances_warehouse_item', 'stock_balances', ['warehouse_id', 'item_id'], unique=False)
@@ -0,0 +1,40 @@
+"""stock snapshots
+
+Revision ID: 0006_stock_snapshots
+Revises: 0005_stock_balances_unique
+Create Date: 2026-10-18 09:43:44.242159
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_stock_snapshots'
+down_revision = '0005_stock_balances_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['stock_items.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('warehouse_id', 'day', 'item_id', name='uq_stock_snapshots_warehouse_day_item')
+    )
+    with op.get_context().autocommit_block():
+        op.create_index('ix_stock_movements_warehouse_created', 'stock_movements', ['warehouse_id', 'created_at'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_stock_movements_warehouse_created', table_name='stock_movements',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table('stock_snapshots')
@@ -0,0 +1,29 @@
+"""cache versions
+
+Revision ID: 0007_cache_versions
+Revises: 0006_stock_snapshots
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_cache_versions'
+down_revision = '0006_stock_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('menu', 1)")
+
+
+def downgrade():
+    op.drop_table('cache_versions')
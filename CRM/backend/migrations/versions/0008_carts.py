@@ -0,0 +1,32 @@
+"""carts
+
+Revision ID: 0008_carts
+Revises: 0007_cache_versions
+Create Date: 2026-10-18 09:53:05.090126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_carts'
+down_revision = '0007_cache_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('carts',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('items', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_carts_updated_at', 'carts', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_carts_updated_at', table_name='carts')
+    op.drop_table('carts')
@@ -0,0 +1,40 @@
+"""jobs
+
+Revision ID: 0010_jobs
+Revises: 0009_idempotency_keys
+Create Date: 2026-10-18 10:06:33.770080
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_jobs'
+down_revision = '0009_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_queued_run_at', 'jobs', ['run_at'], unique=False, postgresql_where=sa.text("status = 'queued'"))
+
+
+def downgrade():
+    op.drop_index('ix_jobs_queued_run_at', table_name='jobs', postgresql_where=sa.text("status = 'queued'"))
+    op.drop_table('jobs')
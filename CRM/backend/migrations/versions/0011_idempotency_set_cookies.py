@@ -0,0 +1,24 @@
+"""idempotency set-cookie
+
+Revision ID: 0011_idempotency_set_cookies
+Revises: 0010_jobs
+Create Date: 2026-10-18 11:02:14.512331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_idempotency_set_cookies'
+down_revision = '0010_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('idempotency_keys', sa.Column('set_cookies', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('idempotency_keys', 'set_cookies')
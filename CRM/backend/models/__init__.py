@@ -1,9 +1,11 @@
 from .user import User, Role  # noqa: F401
 from .catalog import Category, Product, Modifier, ProductModifier  # noqa: F401
-from .orders import Table, Order, OrderItem, Payment  # noqa: F401
+from .orders import Table, Order, OrderItem, Payment, DailySales  # noqa: F401
 from .crm import Customer, LoyaltyTier, Promotion, JobApplication  # noqa: F401
-from .inventory import StockItem, StockMovement  # noqa: F401
+from .inventory import StockItem, StockMovement, StockSnapshot  # noqa: F401
 from .employees import Employee, Shift  # noqa: F401
 from .reviews import Review  # noqa: F401
-
-
+from .cache import CacheVersion  # noqa: F401
+from .cart import Cart  # noqa: F401
+from .idempotency import IdempotencyKey  # noqa: F401
+from .jobs import Job  # noqa: F401
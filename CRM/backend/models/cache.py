@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, String, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+
+
+class CacheVersion(db.Model):
+    """Счётчик версии кэшируемых данных, общий для всех воркеров."""
+    __tablename__ = 'cache_versions'
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        return db.session.execute(select(cls.version).where(cls.name == name)).scalar() or 0
+
+    @classmethod
+    def bump(cls, name: str, connection=None) -> None:
+        """Увеличить версию в текущей транзакции: видна другим воркерам после commit."""
+        stmt = pg_insert(cls.__table__).values(name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.__table__.c.name],
+            set_={'version': cls.__table__.c.version + 1},
+        )
+        (connection or db.session).execute(stmt)
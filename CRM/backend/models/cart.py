@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app import db
+
+
+class Cart(db.Model):
+    """Корзина сайта (хранилище CART_STORE=db): id — 'guest-<cookie>' или 'user-<id>'."""
+    __tablename__ = 'carts'
+    id = Column(String(64), primary_key=True)
+    items = Column(JSONB, nullable=False, default=dict)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -9,7 +9,7 @@ class Category(db.Model):
     id = Column(Integer, primary_key=True)
     name = Column(String(120), nullable=False)
     parent_id = Column(Integer, ForeignKey('categories.id'))
-    children = relationship('Category', backref='parent', remote_side=[id])
+    parent = relationship('Category', remote_side=[id], backref='children')
 
 
 class Product(db.Model):
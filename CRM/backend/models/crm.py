@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Numeric
+from sqlalchemy import Column, Integer, String, Numeric, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app import db
 
 
@@ -10,6 +11,20 @@ class Customer(db.Model):
     points = Column(Integer, default=0)
     tier_id = Column(Integer)
 
+    @classmethod
+    def add_points(cls, phone: str, name: str | None, points: int) -> None:
+        """Начислить баллы по телефону, создав клиента при первом заказе (один upsert).
+
+        Прибавление на стороне БД: параллельные заказы с одного номера не теряют
+        баллы и не создают дублей клиента.
+        """
+        stmt = pg_insert(cls).values(phone=phone, name=name, points=points)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.phone],
+            set_={'points': func.coalesce(cls.points, 0) + stmt.excluded.points},
+        )
+        db.session.execute(stmt)
+
 
 class LoyaltyTier(db.Model):
     __tablename__ = 'loyalty_tiers'
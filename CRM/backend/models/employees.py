@@ -23,7 +23,7 @@ class Shift(db.Model):
     __tablename__ = 'shifts'
     id = Column(Integer, primary_key=True)
     employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False)
-    day = Column(Date, nullable=False)
+    day = Column(Date, nullable=False, index=True)
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
 
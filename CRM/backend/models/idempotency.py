@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, SmallInteger, String, Text
+
+from app import db
+
+
+class IdempotencyKey(db.Model):
+    """Ключ идемпотентности запроса на запись и сохранённый ответ на него.
+
+    status_code пуст, пока первый запрос с этим ключом ещё выполняется.
+    """
+    __tablename__ = 'idempotency_keys'
+    key = Column(String(64), primary_key=True)
+    endpoint = Column(String(100), nullable=False)
+    user_id = Column(Integer)
+    status_code = Column(SmallInteger)
+    location = Column(String(500))
+    mimetype = Column(String(100))
+    body = Column(LargeBinary)
+    set_cookies = Column(Text)  # заголовки Set-Cookie ответа, по одному в строке
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
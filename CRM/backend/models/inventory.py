@@ -1,5 +1,8 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Date, ForeignKey
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Date, ForeignKey, Index, UniqueConstraint, func, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import relationship
 from app import db
 
@@ -27,6 +30,9 @@ class StockItem(db.Model):
 
 class StockBalance(db.Model):
     __tablename__ = 'stock_balances'
+    __table_args__ = (
+        UniqueConstraint('warehouse_id', 'item_id', name='uq_stock_balances_warehouse_item'),
+    )
     id = Column(Integer, primary_key=True)
     item_id = Column(Integer, ForeignKey('stock_items.id'), nullable=False)
     warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=False)
@@ -38,9 +44,13 @@ class StockBalance(db.Model):
 
 class StockMovement(db.Model):
     __tablename__ = 'stock_movements'
+    __table_args__ = (
+        Index('ix_stock_movements_item_warehouse_created', 'item_id', 'warehouse_id', 'created_at'),
+        Index('ix_stock_movements_warehouse_created', 'warehouse_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    doc_type = Column(String(30), nullable=False)  # purchase, transfer, writeoff, inventory
+    doc_type = Column(String(30), nullable=False)  # purchase, transfer, writeoff, inventory, sale, delivery
     doc_id = Column(Integer, nullable=False)
     item_id = Column(Integer, ForeignKey('stock_items.id'), nullable=False)
     warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=False)
@@ -51,6 +61,140 @@ class StockMovement(db.Model):
     warehouse = relationship('Warehouse')
 
 
+class StockSnapshot(db.Model):
+    """Остаток на конец дня: опорная точка для отчётов «на дату»."""
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        UniqueConstraint('warehouse_id', 'day', 'item_id', name='uq_stock_snapshots_warehouse_day_item'),
+    )
+    id = Column(Integer, primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('stock_items.id'), nullable=False)
+    day = Column(Date, nullable=False)
+    quantity = Column(Numeric(12, 3), nullable=False, default=0)
+
+    @classmethod
+    def as_of(cls, warehouse_id: int, day: date) -> Dict[int, Decimal]:
+        """Остатки склада на конец дня: ближайший снимок + движения после него."""
+        rows = db.session.execute(text(STOCK_AS_OF_SQL), {'warehouse_id': warehouse_id, 'day': day})
+        return {item_id: quantity for item_id, quantity in rows}
+
+    @classmethod
+    def take(cls, day: date) -> int:
+        """Снять (или переснять) остатки всех складов на конец дня."""
+        db.session.execute(text('DELETE FROM stock_snapshots WHERE day = :day'), {'day': day})
+        return db.session.execute(text(TAKE_SNAPSHOT_SQL), {'day': day}).rowcount
+
+    @classmethod
+    def verify(cls) -> List[Tuple[int, int, date, Decimal, Decimal]]:
+        """Расхождения снимков с полным журналом движений."""
+        return db.session.execute(text(VERIFY_SNAPSHOTS_SQL)).all()
+
+
+# Снимок — на конец дня, поэтому движения считаются до начала следующих суток
+STOCK_AS_OF_SQL = """
+WITH base AS (
+    SELECT MAX(day) AS day FROM stock_snapshots
+    WHERE warehouse_id = :warehouse_id AND day <= :day
+)
+SELECT item_id, SUM(quantity) AS quantity
+FROM (
+    SELECT s.item_id, s.quantity
+    FROM stock_snapshots s, base
+    WHERE s.warehouse_id = :warehouse_id AND s.day = base.day
+    UNION ALL
+    SELECT m.item_id, m.delta
+    FROM stock_movements m, base
+    WHERE m.warehouse_id = :warehouse_id
+      AND m.created_at >= COALESCE(base.day + 1, '-infinity'::date)
+      AND m.created_at < CAST(:day AS date) + 1
+) AS ledger
+GROUP BY item_id
+"""
+
+TAKE_SNAPSHOT_SQL = """
+WITH base AS (
+    SELECT warehouse_id, MAX(day) AS day FROM stock_snapshots
+    WHERE day < :day
+    GROUP BY warehouse_id
+)
+INSERT INTO stock_snapshots (warehouse_id, item_id, day, quantity)
+SELECT warehouse_id, item_id, :day, SUM(quantity)
+FROM (
+    SELECT s.warehouse_id, s.item_id, s.quantity
+    FROM stock_snapshots s
+    JOIN base ON base.warehouse_id = s.warehouse_id AND base.day = s.day
+    UNION ALL
+    SELECT m.warehouse_id, m.item_id, m.delta
+    FROM stock_movements m
+    LEFT JOIN base ON base.warehouse_id = m.warehouse_id
+    WHERE m.created_at >= COALESCE(base.day + 1, '-infinity'::date)
+      AND m.created_at < CAST(:day AS date) + 1
+) AS ledger
+GROUP BY warehouse_id, item_id
+"""
+
+VERIFY_SNAPSHOTS_SQL = """
+WITH days AS (
+    SELECT DISTINCT warehouse_id, day FROM stock_snapshots
+), ledger AS (
+    SELECT d.warehouse_id, m.item_id, d.day, SUM(m.delta) AS quantity
+    FROM days d
+    JOIN stock_movements m ON m.warehouse_id = d.warehouse_id AND m.created_at < d.day + 1
+    GROUP BY d.warehouse_id, m.item_id, d.day
+)
+SELECT COALESCE(s.warehouse_id, l.warehouse_id), COALESCE(s.item_id, l.item_id), COALESCE(s.day, l.day),
+       COALESCE(s.quantity, 0), COALESCE(l.quantity, 0)
+FROM stock_snapshots s
+FULL JOIN ledger l ON l.warehouse_id = s.warehouse_id AND l.item_id = s.item_id AND l.day = s.day
+WHERE COALESCE(s.quantity, 0) <> COALESCE(l.quantity, 0)
+ORDER BY 3, 1, 2
+"""
+
+
+def post_movements(lines: Iterable[Tuple[int, int, Decimal]], doc_type: str, doc_id: int, note: str | None = None) -> int:
+    """Провести строки документа (warehouse_id, item_id, delta) двумя SQL-запросами.
+
+    Остатки обновляются одним upsert'ом (quantity = quantity + delta на стороне БД,
+    без потерянных обновлений при параллельном проведении), движения вставляются
+    одним многострочным INSERT. Возвращает число записанных движений.
+    """
+    now = datetime.utcnow()
+    movements = []
+    deltas: Dict[Tuple[int, int], Decimal] = {}
+    for warehouse_id, item_id, delta in lines:
+        delta = Decimal(delta)
+        if delta == 0:
+            continue
+        movements.append({
+            'created_at': now,
+            'doc_type': doc_type,
+            'doc_id': doc_id,
+            'item_id': item_id,
+            'warehouse_id': warehouse_id,
+            'delta': delta,
+            'note': note,
+        })
+        key = (warehouse_id, item_id)
+        deltas[key] = deltas.get(key, Decimal('0')) + delta
+    if not movements:
+        return 0
+
+    # Одна строка на (склад, товар): ON CONFLICT не может менять строку дважды.
+    # Сортировка задаёт общий порядок блокировок для конкурентных проведений.
+    stmt = pg_insert(StockBalance).values([
+        {'warehouse_id': warehouse_id, 'item_id': item_id, 'quantity': delta}
+        for (warehouse_id, item_id), delta in sorted(deltas.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint='uq_stock_balances_warehouse_item',
+        set_={'quantity': func.coalesce(StockBalance.quantity, 0) + stmt.excluded.quantity},
+    )
+    db.session.execute(stmt)
+    db.session.execute(insert(StockMovement).values(movements))
+    return len(movements)
+
+
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
     id = Column(Integer, primary_key=True)
@@ -73,7 +217,7 @@ class Purchase(db.Model):
 class PurchaseItem(db.Model):
     __tablename__ = 'purchase_items'
     id = Column(Integer, primary_key=True)
-    purchase_id = Column(Integer, ForeignKey('purchases.id'))
+    purchase_id = Column(Integer, ForeignKey('purchases.id'), index=True)
     item_id = Column(Integer, ForeignKey('stock_items.id'))
     qty = Column(Numeric(12, 3), nullable=False)
     price = Column(Numeric(12, 3), nullable=False)
@@ -137,7 +281,7 @@ class InventoryDoc(db.Model):
 class InventoryLine(db.Model):
     __tablename__ = 'inventory_lines'
     id = Column(Integer, primary_key=True)
-    doc_id = Column(Integer, ForeignKey('inventory_docs.id'))
+    doc_id = Column(Integer, ForeignKey('inventory_docs.id'), index=True)
     item_id = Column(Integer, ForeignKey('stock_items.id'))
     counted_qty = Column(Numeric(12, 3), nullable=False)
     doc = relationship('InventoryDoc', back_populates='lines')
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app import db
+
+
+class Job(db.Model):
+    """Фоновая задача (services.jobs): выполняется процессом manage.py worker.
+
+    Успешно выполненные задачи удаляются; в таблице остаются ожидающие,
+    выполняемые и окончательно упавшие (status='failed').
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Выборка воркера: только ожидающие, по времени запуска
+        Index('ix_jobs_queued_run_at', 'run_at', postgresql_where=text("status = 'queued'")),
+    )
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
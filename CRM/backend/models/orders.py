@@ -1,5 +1,8 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, DateTime
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, DateTime, Date, Index, UniqueConstraint, func, insert, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import relationship
 
 from app import db
@@ -13,22 +16,43 @@ class Table(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_status_created_at', 'status', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
     table_id = Column(Integer, ForeignKey('tables.id'))
     status = Column(String(20), default='open')  # open, paid, cancelled
     total = Column(Numeric(10, 2), default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     guest_count = Column(Integer, default=1)
     waiter = Column(String(120))
     comment = Column(String(255))
     table = relationship('Table')
     items = relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
 
+    @classmethod
+    def add_to_total(cls, order_id: int, delta) -> Optional[Decimal]:
+        """Прибавить delta к сумме неоплаченного чека; None — чека нет или он уже оплачен.
+
+        Один UPDATE total = total + delta вместо чтения и записи из Python:
+        строка заказа блокируется до конца транзакции, параллельные правки
+        одного чека не теряются, а оплата ждёт их и видит итоговую сумму.
+        """
+        return _add_to_total(cls, order_id, delta, cls.__table__.c.status.is_distinct_from('paid'))
+
+    @classmethod
+    def reconcile_totals(cls, fix: bool = False) -> List:
+        """Чеки, чья сумма расходится с суммой позиций; fix — исправить неоплаченные.
+
+        Оплаченные только сообщаются: их сумма уже ушла в платёж и витрину.
+        """
+        return _reconcile_totals(cls, OrderItem, "status IS DISTINCT FROM 'paid'" if fix else None)
+
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
     product_id = Column(Integer, ForeignKey('products.id'))
     product_name = Column(String(200), nullable=False)
     qty = Column(Integer, default=1)
@@ -40,7 +64,7 @@ class OrderItem(db.Model):
 class Payment(db.Model):
     __tablename__ = 'payments'
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
     amount = Column(Numeric(10, 2), nullable=False)
     method = Column(String(30), default='cash')  # cash, card, online
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -48,6 +72,9 @@ class Payment(db.Model):
 
 class DeliveryOrder(db.Model):
     __tablename__ = 'delivery_orders'
+    __table_args__ = (
+        Index('ix_delivery_orders_status_created_at', 'status', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
     status = Column(String(20), default='new')  # new, in_progress, done, cancelled
     source = Column(String(30), default='phone')  # phone, site, aggregator
@@ -63,17 +90,40 @@ class DeliveryOrder(db.Model):
     receive_method = Column(String(20), default='delivery')  # delivery, pickup, dinein
     payment_type = Column(String(20), default='cash')
     total = Column(Numeric(10, 2), default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     courier_id = Column(Integer)  # Employee.id (courier)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     items = relationship('DeliveryOrderItem', back_populates='order', cascade='all, delete-orphan')
     user = relationship('User', backref='delivery_orders')
 
+    @classmethod
+    def place(cls, items: Iterable[Dict[str, object]], **fields) -> int:
+        """Создать заказ с позициями двумя запросами в текущей транзакции.
+
+        Заказ — INSERT ... RETURNING id (без отдельного flush), позиции — один
+        многострочный INSERT. Возвращает id заказа.
+        """
+        order_id = db.session.execute(insert(cls).values(**fields).returning(cls.id)).scalar_one()
+        rows = [dict(item, order_id=order_id) for item in items]
+        if rows:
+            db.session.execute(insert(DeliveryOrderItem).values(rows))
+        return order_id
+
+    @classmethod
+    def add_to_total(cls, order_id: int, delta) -> Optional[Decimal]:
+        """Прибавить delta к сумме заказа одним UPDATE; None — заказа нет."""
+        return _add_to_total(cls, order_id, delta)
+
+    @classmethod
+    def reconcile_totals(cls, fix: bool = False) -> List:
+        """Заказы, чья сумма расходится с суммой позиций; fix — пересчитать их."""
+        return _reconcile_totals(cls, DeliveryOrderItem, 'TRUE' if fix else None)
+
 
 class DeliveryOrderItem(db.Model):
     __tablename__ = 'delivery_order_items'
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('delivery_orders.id'))
+    order_id = Column(Integer, ForeignKey('delivery_orders.id'), index=True)
     product_id = Column(Integer, ForeignKey('products.id'))
     product_name = Column(String(200), nullable=False)
     qty = Column(Integer, default=1)
@@ -82,3 +132,98 @@ class DeliveryOrderItem(db.Model):
     order = relationship('DeliveryOrder', back_populates='items')
 
 
+def _add_to_total(model, order_id: int, delta, *criteria) -> Optional[Decimal]:
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == order_id, *criteria)
+        .values(total=func.coalesce(table.c.total, 0) + delta)
+        .returning(table.c.total)
+    )
+    return db.session.execute(stmt).scalar()
+
+
+TOTALS_DRIFT_SQL = """
+SELECT o.id, o.status, COALESCE(o.total, 0) AS total, COALESCE(s.items_total, 0) AS items_total
+FROM {orders} AS o
+LEFT JOIN (SELECT order_id, SUM(sum) AS items_total FROM {items} GROUP BY order_id) AS s ON s.order_id = o.id
+WHERE COALESCE(o.total, 0) <> COALESCE(s.items_total, 0)
+ORDER BY o.id
+"""
+
+FIX_TOTALS_SQL = """
+UPDATE {orders} AS o
+SET total = COALESCE((SELECT SUM(i.sum) FROM {items} AS i WHERE i.order_id = o.id), 0)
+WHERE o.id = ANY(:ids) AND {fixable}
+"""
+
+
+def _reconcile_totals(model, item_model, fixable: Optional[str]) -> List:
+    """Сверка сумм заказов с позициями одним запросом по всей таблице."""
+    names = {'orders': model.__tablename__, 'items': item_model.__tablename__}
+    drift = db.session.execute(text(TOTALS_DRIFT_SQL.format(**names))).all()
+    if fixable and drift:
+        db.session.execute(text(FIX_TOTALS_SQL.format(fixable=fixable, **names)), {'ids': [row.id for row in drift]})
+    return drift
+
+
+REBUILD_DAILY_SALES_SQL = """
+INSERT INTO daily_sales (day, channel, orders_count, revenue, deliveries_count)
+SELECT day, channel, SUM(orders_count), SUM(revenue), SUM(deliveries_count)
+FROM (
+    SELECT created_at::date AS day, 'pos' AS channel,
+           COUNT(*) AS orders_count,
+           COALESCE(SUM(total) FILTER (WHERE status = 'paid'), 0) AS revenue,
+           0 AS deliveries_count
+    FROM orders
+    WHERE created_at IS NOT NULL
+    GROUP BY created_at::date
+    UNION ALL
+    SELECT created_at::date, COALESCE(source, 'phone'), 0, 0, COUNT(*)
+    FROM delivery_orders
+    WHERE created_at IS NOT NULL
+    GROUP BY created_at::date, COALESCE(source, 'phone')
+) AS totals
+GROUP BY day, channel
+"""
+
+
+class DailySales(db.Model):
+    """Дневные итоги по каналам продаж, обновляются вместе с заказами."""
+    __tablename__ = 'daily_sales'
+    __table_args__ = (
+        UniqueConstraint('day', 'channel', name='uq_daily_sales_day_channel'),
+    )
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    channel = Column(String(30), nullable=False)  # pos, phone, site, aggregator
+    orders_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)  # оплаченные чеки POS
+    deliveries_count = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def record(cls, day: date, channel: str, orders: int = 0, revenue: Decimal = Decimal('0'), deliveries: int = 0):
+        """Прибавить к итогам дня; выполняется в текущей транзакции заказа."""
+        stmt = pg_insert(cls).values(
+            day=day,
+            channel=channel,
+            orders_count=orders,
+            revenue=revenue,
+            deliveries_count=deliveries,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_daily_sales_day_channel',
+            set_={
+                'orders_count': cls.orders_count + stmt.excluded.orders_count,
+                'revenue': cls.revenue + stmt.excluded.revenue,
+                'deliveries_count': cls.deliveries_count + stmt.excluded.deliveries_count,
+            },
+        )
+        db.session.execute(stmt)
+
+    @classmethod
+    def rebuild(cls):
+        """Пересчитать витрину целиком из orders и delivery_orders."""
+        db.session.execute(text('DELETE FROM daily_sales'))
+        db.session.execute(text(REBUILD_DAILY_SALES_SQL))
+
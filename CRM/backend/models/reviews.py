@@ -18,7 +18,7 @@ class Review(db.Model):
     recommend_rating = Column(Integer, nullable=False, default=0)
     comment = Column(Text)
     location = Column(String(255))
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     user = relationship('User', backref='reviews')
 
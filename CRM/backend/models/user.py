@@ -3,7 +3,7 @@ from flask_login import UserMixin
 from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 
-from app import db, login_manager
+from app import db
 
 
 class Role(db.Model):
@@ -33,8 +33,3 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 
-@login_manager.user_loader
-def load_user(user_id: str):
-    return User.query.get(int(user_id))
-
-
@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import brotli
+import rcssmin
+import rjsmin
+from flask import current_app, request, send_from_directory, url_for
+
+
+# Статика сайта собирается командой manage.py assets в static/dist: CSS/JS
+# минифицируются, общие стили склеиваются в бандл, имена получают хэш
+# содержимого, рядом кладутся .gz/.br. Шаблоны берут адреса через static_url()
+# по манифесту, который читается один раз на процесс. Собранные файлы не
+# меняются, поэтому отдаются с Cache-Control: immutable. Без сборки (манифеста
+# нет) static_url() отдаёт исходные файлы как раньше.
+
+SOURCE_DIRS = ('site_src', 'site', 'image')
+EXTENSIONS = {'.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico', '.woff2'}
+COMPRESSIBLE = {'.css', '.js', '.svg'}
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+# Сжатые варианты меньше этого не пишутся: выигрыш меньше накладных расходов
+MIN_COMPRESS_BYTES = 512
+MAX_AGE_SECONDS = 365 * 24 * 3600
+
+# Стили, которые layout сайта подключает на каждой странице, — одним файлом
+BUNDLES: Dict[str, List[str]] = {
+    'site_src/site.bundle.css': ['site_src/common.css', 'site_src/index.css'],
+}
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^)\'"]+)\1\s*\)')
+
+_lock = threading.Lock()
+_manifest: Dict[str, object] = {'loaded': False, 'files': {}, 'compressed': set()}
+
+
+class BuildResult(NamedTuple):
+    files: int
+    source_bytes: int
+    output_bytes: int
+    gzip_bytes: int
+    brotli_bytes: int
+    removed: int
+
+
+def _hashed_name(logical: str, content: bytes) -> str:
+    stem, ext = posixpath.splitext(logical)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _rewrite_css(css: str, source: str, target: str, files: Dict[str, str]) -> str:
+    """Перевести url() из CSS-файла source на собранные имена относительно target."""
+    source_dir, target_dir = posixpath.dirname(source), posixpath.dirname(target)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, rest = re.match(r'([^?#]*)(.*)$', ref).groups()
+        logical = posixpath.normpath(posixpath.join(source_dir, path))
+        hashed = files.get(logical)
+        if hashed is None:
+            return match.group(0)
+        return f'url({posixpath.relpath(hashed, target_dir)}{rest})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def _write(dist: str, name: str, content: bytes, compressed: Set[str], totals: Dict[str, int]) -> None:
+    path = os.path.join(dist, name.replace('/', os.sep))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(content)
+    totals['output'] += len(content)
+    if posixpath.splitext(name)[1] not in COMPRESSIBLE or len(content) < MIN_COMPRESS_BYTES:
+        return
+    # mtime=0 — одинаковый .gz при одинаковом содержимом
+    variants = (('.gz', 'gzip', gzip.compress(content, compresslevel=9, mtime=0)),
+                ('.br', 'brotli', brotli.compress(content, quality=11)))
+    for suffix, key, packed in variants:
+        if len(packed) < len(content):
+            with open(path + suffix, 'wb') as fh:
+                fh.write(packed)
+            compressed.add(name + suffix)
+            totals[key] += len(packed)
+
+
+def build(static_folder: str, clean: bool = False) -> BuildResult:
+    """Собрать static/dist и записать манифест.
+
+    Файлы прошлых сборок остаются (их ещё могут запросить страницы, открытые до
+    выкладки), clean — удалить всё, чего нет в новом манифесте.
+    """
+    dist = os.path.join(static_folder, DIST)
+    sources: List[str] = []
+    for top in SOURCE_DIRS:
+        for root, _, names in os.walk(os.path.join(static_folder, top)):
+            for name in names:
+                if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                    sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    sources.sort()
+
+    files: Dict[str, str] = {}
+    compressed: Set[str] = set()
+    totals = {'source': 0, 'output': 0, 'gzip': 0, 'brotli': 0}
+
+    def read(logical: str) -> bytes:
+        with open(os.path.join(static_folder, logical.replace('/', os.sep)), 'rb') as fh:
+            content = fh.read()
+        totals['source'] += len(content)
+        return content
+
+    # Сначала всё, кроме CSS: стилям нужны уже известные имена картинок
+    for logical in (s for s in sources if not s.endswith('.css')):
+        content = read(logical)
+        if logical.endswith('.js'):
+            content = rjsmin.jsmin(content.decode('utf-8')).encode('utf-8')
+        files[logical] = _hashed_name(logical, content)
+        _write(dist, files[logical], content, compressed, totals)
+
+    styles: Dict[str, str] = {}
+    for logical in (s for s in sources if s.endswith('.css')):
+        styles[logical] = read(logical).decode('utf-8')
+    outputs = {logical: [logical] for logical in styles}
+    outputs.update(BUNDLES)
+    for target, members in outputs.items():
+        # url() — относительно каталога результата: у бандла он может отличаться от каталога части
+        css = '\n'.join(rcssmin.cssmin(_rewrite_css(styles[m], m, target, files)) for m in members)
+        content = css.encode('utf-8')
+        files[target] = _hashed_name(target, content)
+        _write(dist, files[target], content, compressed, totals)
+
+    manifest = {'files': files, 'compressed': sorted(compressed)}
+    tmp = os.path.join(dist, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(dist, MANIFEST))
+
+    removed = 0
+    if clean:
+        keep = set(files.values()) | compressed | {MANIFEST}
+        for root, _, names in os.walk(dist):
+            for name in names:
+                relative = os.path.relpath(os.path.join(root, name), dist).replace(os.sep, '/')
+                if relative not in keep:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+    return BuildResult(len(files), totals['source'], totals['output'], totals['gzip'], totals['brotli'], removed)
+
+
+def _load() -> None:
+    path = os.path.join(current_app.static_folder, DIST, MANIFEST)
+    files, compressed = {}, set()
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        files, compressed = data['files'], set(data['compressed'])
+    _manifest.update(loaded=True, files=files, compressed=compressed)
+
+
+def _ensure_loaded() -> None:
+    if not _manifest['loaded']:
+        with _lock:
+            if not _manifest['loaded']:
+                _load()
+
+
+def _lookup(logical: str) -> Optional[str]:
+    _ensure_loaded()
+    return _manifest['files'].get(logical)
+
+
+def reload() -> None:
+    """Перечитать манифест на следующем обращении (после сборки в том же процессе)."""
+    with _lock:
+        _manifest['loaded'] = False
+
+
+def static_url(logical: str) -> str:
+    """Адрес статического файла: собранный, если он есть в манифесте, иначе исходный."""
+    hashed = _lookup(logical)
+    if hashed is None:
+        return url_for('static', filename=logical)
+    return url_for('assets', filename=hashed)
+
+
+def bundle_urls(name: str) -> List[str]:
+    """Адреса для подключения бандла: один собранный файл или, без сборки, его части."""
+    if _lookup(name) is not None:
+        return [static_url(name)]
+    return [static_url(member) for member in BUNDLES[name]]
+
+
+def send_asset(filename: str):
+    """Отдать собранный файл: .br/.gz по Accept-Encoding, кэш навсегда."""
+    _ensure_loaded()
+    compressed = _manifest['compressed']
+    suffix, encoding = '', None
+    for candidate, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if f'{filename}{candidate}' in compressed and name in request.accept_encodings:
+            suffix, encoding = candidate, name
+            break
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(os.path.join(current_app.static_folder, DIST), filename + suffix,
+                                   mimetype=mimetype, max_age=MAX_AGE_SECONDS)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(tuple(COMPRESSIBLE)):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={MAX_AGE_SECONDS}, immutable'
+    return response
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import abort, current_app
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.util import identity_key
+
+from app import db, login_manager
+from models.user import Role, User
+from services import replica
+
+
+# Текущий пользователь и его роль. Flask-Login вызывает загрузчик на каждом
+# запросе: пользователь берётся из кэша процесса (вместе с ролью) и
+# присоединяется к сессии запроса через merge(load=False) — без запросов к БД,
+# изменения current_user сохраняются обычным commit. Запись User/Role сбрасывает
+# кэш этого процесса после commit; другие воркеры увидят изменение не позже
+# чем через AUTH_CACHE_SECONDS.
+
+ADMIN = 'admin'
+PORTAL = 'user'  # пользователи внешнего портала, без доступа к CRM
+
+_lock = threading.Lock()
+_identities: 'OrderedDict[int, Tuple[float, User]]' = OrderedDict()
+_state = {'generation': 0}
+
+
+def role_of(user) -> str:
+    """Имя роли в нижнем регистре ('' — без роли или аноним)."""
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return ''
+    return ((user.role.name if user.role else user.role_name) or '').lower()
+
+
+def current_role() -> str:
+    return role_of(current_user)
+
+
+def is_admin(user=None) -> bool:
+    return role_of(current_user if user is None else user) == ADMIN
+
+
+def is_portal_user(user=None) -> bool:
+    return role_of(current_user if user is None else user) == PORTAL
+
+
+def ensure_admin() -> None:
+    if not is_admin():
+        abort(403)
+
+
+def admin_required(view):
+    """После @login_required: 403 всем, кроме администраторов."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        ensure_admin()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _cached(user_id: int) -> Optional[User]:
+    ttl = current_app.config.get('AUTH_CACHE_SECONDS', 30)
+    with _lock:
+        entry = _identities.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > ttl:
+            del _identities[user_id]
+            return None
+        _identities.move_to_end(user_id)
+        return entry[1]
+
+
+def _remember(user_id: int, user: User, generation: int) -> None:
+    limit = current_app.config.get('AUTH_CACHE_SIZE', 1024)
+    with _lock:
+        # Пока грузили, пользователя могли изменить — такой снимок не кэшируем
+        if generation != _state['generation']:
+            return
+        _identities[user_id] = (time.monotonic(), user)
+        _identities.move_to_end(user_id)
+        while len(_identities) > limit:
+            _identities.popitem(last=False)
+
+
+def invalidate(user_id: Optional[int] = None) -> None:
+    """Забыть пользователя (None — всех) в кэше этого процесса."""
+    with _lock:
+        _state['generation'] += 1
+        if user_id is None:
+            _identities.clear()
+        else:
+            _identities.pop(user_id, None)
+
+
+@login_manager.user_loader
+def load_user(user_id: str) -> Optional[User]:
+    try:
+        key = int(user_id)
+    except ValueError:
+        return None
+    # Запрос уже загрузил этого пользователя сам — merge затёр бы его изменения
+    present = db.session.identity_map.get(identity_key(User, key))
+    if present is not None:
+        return present
+    cached = _cached(key)
+    if cached is None:
+        generation = _state['generation']
+        # Роль — с основной базы: снимок с отстающей реплики вернул бы снятые права
+        with replica.primary():
+            user = db.session.get(User, key, options=[joinedload(User.role)])
+        if user is None:
+            return None
+        # Снимок для кэша — отдельные от сессии запроса объекты
+        db.session.expunge(user)
+        if user.role is not None:
+            db.session.expunge(user.role)
+        _remember(key, user, generation)
+        cached = user
+    return db.session.merge(cached, load=False)
+
+
+def _touched(session: Session) -> Tuple[set, bool]:
+    users, everyone = set(), False
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            users.add(obj.id)
+        elif isinstance(obj, Role):
+            everyone = True
+    return users, everyone
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_writes(session, flush_context):
+    users, everyone = _touched(session)
+    if users:
+        session.info.setdefault('auth_touched', set()).update(users)
+    if everyone:
+        session.info['auth_touched_all'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    users = session.info.pop('auth_touched', ())
+    if session.info.pop('auth_touched_all', False):
+        invalidate()
+        return
+    for user_id in users:
+        invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    session.info.pop('auth_touched', None)
+    session.info.pop('auth_touched_all', None)
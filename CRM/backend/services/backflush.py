@@ -0,0 +1,85 @@
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from models.inventory import Recipe, RecipeItem, Warehouse, post_movements
+from services import jobs, versions
+
+
+RECIPES = 'recipes'
+# Техкарты перечитываются при смене версии RECIPES; TTL — для склада продаж
+RECIPE_TTL_SECONDS = 300
+BACKFLUSH_JOB = 'backflush.post'
+
+versions.watch(RECIPES, Recipe, RecipeItem)
+
+_lock = threading.Lock()
+_book: Dict[str, object] = {'loaded_at': 0.0, 'version': None, 'recipes': {}, 'warehouse_id': None}
+
+
+def _load_book(version: int) -> None:
+    recipes: Dict[int, List[Tuple[int, Decimal]]] = {}
+    first_recipe: Dict[int, int] = {}
+    rows = (
+        db.session.query(Recipe.product_id, Recipe.id, RecipeItem.item_id, RecipeItem.qty)
+        .join(RecipeItem, RecipeItem.recipe_id == Recipe.id)
+        .order_by(Recipe.product_id, Recipe.id)
+        .all()
+    )
+    for product_id, recipe_id, item_id, qty in rows:
+        # у блюда используется первая техкарта
+        if first_recipe.setdefault(product_id, recipe_id) != recipe_id:
+            continue
+        recipes.setdefault(product_id, []).append((item_id, Decimal(qty)))
+    warehouse_id = current_app.config.get('SALES_WAREHOUSE_ID') or db.session.query(func.min(Warehouse.id)).scalar()
+    _book.update(loaded_at=time.monotonic(), version=version, recipes=recipes, warehouse_id=warehouse_id)
+
+
+def _recipe_book() -> Tuple[Dict[int, List[Tuple[int, Decimal]]], int | None]:
+    version = versions.current(RECIPES)
+    with _lock:
+        if _book['version'] != version or time.monotonic() - _book['loaded_at'] > RECIPE_TTL_SECONDS:
+            _load_book(version)
+        return _book['recipes'], _book['warehouse_id']
+
+
+def expand(sold: Iterable[Tuple[int, int]]) -> Tuple[int | None, Dict[int, Decimal]]:
+    """(product_id, qty) проданных позиций -> склад и суммарный расход ингредиентов."""
+    recipes, warehouse_id = _recipe_book()
+    usage: Dict[int, Decimal] = {}
+    for product_id, qty in sold:
+        for item_id, item_qty in recipes.get(product_id, ()):
+            usage[item_id] = usage.get(item_id, Decimal('0')) + item_qty * qty
+    return warehouse_id, usage
+
+
+def backflush(sold: Iterable[Tuple[int, int]], doc_type: str, doc_id: int, note: str, sign: int = -1) -> None:
+    """Списать ингредиенты проданных позиций одним пакетом движений.
+
+    Вызывать до commit: синхронно движения пишутся в текущую транзакцию,
+    при BACKFLUSH_ASYNC — в той же транзакции ставится задача для manage.py worker.
+    """
+    warehouse_id, usage = expand(sold)
+    if not warehouse_id or not usage:
+        return
+    lines = [(warehouse_id, item_id, qty * sign) for item_id, qty in usage.items()]
+    if current_app.config.get('BACKFLUSH_ASYNC'):
+        jobs.enqueue(BACKFLUSH_JOB, {
+            'lines': [[w, i, str(q)] for w, i, q in lines],
+            'doc_type': doc_type,
+            'doc_id': doc_id,
+            'note': note,
+        })
+    else:
+        post_movements(lines, doc_type, doc_id, note)
+
+
+@jobs.task(BACKFLUSH_JOB)
+def _post(payload: dict) -> None:
+    lines = [(w, i, Decimal(q)) for w, i, q in payload['lines']]
+    post_movements(lines, payload['doc_type'], payload['doc_id'], payload['note'])
@@ -0,0 +1,223 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+from flask import after_this_request, current_app, g, request
+from flask_login import current_user, user_logged_in, user_logged_out
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from models.cart import Cart
+
+
+# Корзина сайта хранится на сервере; в браузере — только cookie с её id.
+# Хранилище выбирается CART_STORE: db (по умолчанию, общее для всех воркеров),
+# filesystem (один сервер, несколько воркеров) или memory (один процесс, с TTL).
+# Хранилище db не коммитит само: запись корзины уходит в транзакцию запроса и
+# фиксируется вместе с остальными его изменениями (заказ и очистка корзины —
+# одной транзакцией). Сам коммитит только purge (manage.py purge-carts).
+
+CART_ID_COOKIE = 'cart_id'
+# Число позиций для бейджа в шапке: читается скриптом layout.html,
+# чтобы сами страницы не зависели от корзины и кэшировались целиком.
+CART_COUNT_COOKIE = 'cart_count'
+
+CartItems = Dict[str, int]
+
+
+class DbCartStore:
+    def load(self, key: str) -> CartItems:
+        cart = db.session.get(Cart, key)
+        return dict(cart.items) if cart else {}
+
+    def save(self, key: str, items: CartItems) -> None:
+        stmt = pg_insert(Cart.__table__).values(id=key, items=items, updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Cart.__table__.c.id],
+            set_={'items': stmt.excluded['items'], 'updated_at': stmt.excluded.updated_at},
+        )
+        db.session.execute(stmt)
+
+    def delete(self, key: str) -> None:
+        Cart.query.filter_by(id=key).delete()
+
+    def purge(self, older_than: timedelta) -> int:
+        removed = Cart.query.filter(Cart.updated_at < datetime.utcnow() - older_than).delete()
+        db.session.commit()
+        return removed
+
+
+class FileCartStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def load(self, key: str) -> CartItems:
+        try:
+            with open(self._path(key), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self, key: str, items: CartItems) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(items, fh)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, older_than: timedelta) -> int:
+        deadline = time.time() - older_than.total_seconds()
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.json') and os.path.getmtime(path) < deadline:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+class MemoryCartStore:
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._carts: 'OrderedDict[str, Tuple[float, CartItems]]' = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        # Порядок вставки = порядок последнего изменения: просроченные — в начале
+        while self._carts:
+            key, (touched, _) = next(iter(self._carts.items()))
+            if now - touched < self.ttl:
+                break
+            del self._carts[key]
+
+    def load(self, key: str) -> CartItems:
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._carts.get(key)
+            return dict(entry[1]) if entry else {}
+
+    def save(self, key: str, items: CartItems) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._carts.pop(key, None)
+            self._carts[key] = (now, dict(items))
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._carts.pop(key, None)
+
+    def purge(self, older_than: timedelta) -> int:
+        with self._lock:
+            before = len(self._carts)
+            self._evict(time.monotonic())
+            return before - len(self._carts)
+
+
+def get_store():
+    app = current_app._get_current_object()
+    store = app.extensions.get('cart_store')
+    if store is None:
+        kind = app.config.get('CART_STORE', 'db')
+        if kind == 'filesystem':
+            store = FileCartStore(os.path.join(app.instance_path, 'carts'))
+        elif kind == 'memory':
+            store = MemoryCartStore(app.config.get('CART_TTL_SECONDS', 30 * 24 * 3600))
+        else:
+            store = DbCartStore()
+        app.extensions['cart_store'] = store
+    return store
+
+
+def _guest_key() -> Optional[str]:
+    cart_id = request.cookies.get(CART_ID_COOKIE) or ''
+    return f'guest-{cart_id}' if len(cart_id) == 32 and cart_id.isalnum() else None
+
+
+def _cart_key(create: bool = False) -> Optional[str]:
+    if current_user.is_authenticated:
+        return f'user-{current_user.id}'
+    key = _guest_key()
+    if key is None and create:
+        cart_id = uuid4().hex
+        key = f'guest-{cart_id}'
+
+        @after_this_request
+        def _set_cart_id(response):
+            response.set_cookie(CART_ID_COOKIE, cart_id, max_age=current_app.config.get('CART_TTL_SECONDS', 30 * 24 * 3600),
+                                httponly=True, samesite='Lax')
+            return response
+    return key
+
+
+def _set_count_cookie(items: CartItems) -> None:
+    quantity = sum(items.values())
+
+    @after_this_request
+    def _set_cart_count(response):
+        if quantity:
+            response.set_cookie(CART_COUNT_COOKIE, str(quantity), samesite='Lax')
+        else:
+            response.delete_cookie(CART_COUNT_COOKIE)
+        return response
+
+
+def load_cart() -> CartItems:
+    """Корзина текущего посетителя; читается из хранилища один раз за запрос."""
+    if 'cart' not in g:
+        key = _cart_key()
+        g.cart = get_store().load(key) if key else {}
+    return dict(g.cart)
+
+
+def save_cart(items: CartItems) -> None:
+    items = {str(k): int(v) for k, v in items.items() if int(v) > 0}
+    key = _cart_key(create=bool(items))
+    if key and items:
+        get_store().save(key, items)
+    elif key:
+        get_store().delete(key)
+    g.cart = items
+    _set_count_cookie(items)
+
+
+@user_logged_in.connect
+def _merge_guest_cart(sender, user, **extra):
+    """Гостевая корзина при входе переносится в корзину пользователя."""
+    guest_key = _guest_key()
+    if not guest_key:
+        return
+    store = get_store()
+    guest = store.load(guest_key)
+    if not guest:
+        return
+    user_key = f'user-{user.id}'
+    merged = store.load(user_key)
+    for product_id, qty in guest.items():
+        merged[product_id] = merged.get(product_id, 0) + int(qty)
+    store.save(user_key, merged)
+    store.delete(guest_key)
+    g.pop('cart', None)
+    _set_count_cookie(merged)
+
+
+@user_logged_out.connect
+def _reset_count_after_logout(sender, user, **extra):
+    g.pop('cart', None)
+    guest_key = _guest_key()
+    _set_count_cookie(get_store().load(guest_key) if guest_key else {})
@@ -0,0 +1,146 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Response, current_app
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app import db
+
+
+logger = logging.getLogger(__name__)
+
+# События досок (доставка, кухня) идут через LISTEN/NOTIFY Postgres: NOTIFY
+# отправляется в транзакции изменения и доходит до всех воркеров только после
+# commit. В каждом воркере один поток держит LISTEN и раздаёт события открытым
+# SSE-соединениям. Каждое SSE-соединение занимает поток воркера (gthread/gevent).
+
+CHANNEL = 'crm_events'
+DELIVERY = 'delivery'  # доска доставки: id, status
+KITCHEN = 'kitchen'  # кухонный экран чеков POS: id, status
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 100
+RECONNECT_SECONDS = 1.0
+
+# Подписчику, пропустившему события (переполнение, обрыв LISTEN), — полная перезагрузка доски
+RESET = {'type': 'reset'}
+
+_lock = threading.Lock()
+_subscribers: Dict[queue.Queue, str] = {}
+_listener: Optional[threading.Thread] = None
+
+
+def publish(topic: str, **data) -> None:
+    """Отправить событие в текущей транзакции; при rollback оно не уйдёт."""
+    payload = json.dumps(dict(data, topic=topic), separators=(',', ':'), default=str)
+    db.session.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': payload})
+
+
+def _put(subscriber: queue.Queue, event: dict) -> None:
+    try:
+        subscriber.put_nowait(event)
+    except queue.Full:
+        # Медленный клиент: вместо хвоста событий — одна команда перечитать доску
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(RESET)
+
+
+def _dispatch(payload: str) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning('Bad event payload: %r', payload)
+        return
+    with _lock:
+        for subscriber, topic in _subscribers.items():
+            if event.get('topic') == topic:
+                _put(subscriber, event)
+
+
+def _reset_all() -> None:
+    with _lock:
+        for subscriber in _subscribers:
+            _put(subscriber, RESET)
+
+
+def _listen(engine) -> None:
+    while True:
+        connection = None
+        try:
+            # Отдельное соединение вне пула: LISTEN живёт, пока жив воркер
+            connection = engine.raw_connection()
+            connection.detach()
+            raw = connection.dbapi_connection
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                select.select([raw], [], [], KEEPALIVE_SECONDS)
+                raw.poll()
+                while raw.notifies:
+                    _dispatch(raw.notifies.pop(0).payload)
+        except Exception:
+            logger.exception('Event listener failed, reconnecting')
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            # Пока LISTEN не было, события могли потеряться
+            _reset_all()
+            time.sleep(RECONNECT_SECONDS)
+
+
+def _listen_engine():
+    url = current_app.config.get('EVENTS_DATABASE_URL')
+    return create_engine(url, poolclass=NullPool) if url else db.engine
+
+
+def _subscribe(topic: str) -> queue.Queue:
+    global _listener
+    subscriber: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    with _lock:
+        _subscribers[subscriber] = topic
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, args=(_listen_engine(),), name='crm-events', daemon=True)
+            _listener.start()
+    return subscriber
+
+
+def _unsubscribe(subscriber: queue.Queue) -> None:
+    with _lock:
+        _subscribers.pop(subscriber, None)
+
+
+def event_stream(topic: str) -> Response:
+    """SSE-ответ с событиями topic (text/event-stream)."""
+    subscriber = _subscribe(topic)
+    # Соединение с БД потоку не нужно — вернуть его в пул до начала стрима
+    db.session.close()
+
+    def generate():
+        try:
+            yield f'retry: {int(RECONNECT_SECONDS * 3000)}\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {json.dumps(event, separators=(",", ":"))}\n\n'
+        finally:
+            _unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
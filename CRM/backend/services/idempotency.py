@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Optional
+from uuid import uuid4
+
+from flask import abort, after_this_request, current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import db
+from models.idempotency import IdempotencyKey
+
+
+# Повтор запроса на запись (двойной клик, ретрай клиента после таймаута) с тем же
+# ключом получает сохранённый ответ первого, а не второй чек/оплату/заказ.
+# Ключ передаётся заголовком Idempotency-Key или полем формы idempotency_key.
+# Сохраняются код, Location, тело и Set-Cookie обработчика (например, сброс
+# корзины после оформления заказа); cookie сессии Flask ставится позже и не
+# сохраняется — повтор получает её от своего запроса.
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+
+# session.info: закоммитил ли обработчик свои записи
+_COMMITTED = 'idempotency_committed'
+
+
+def new_key() -> str:
+    """Ключ для скрытого поля формы: новый при каждом показе страницы."""
+    return uuid4().hex
+
+
+def _request_key() -> Optional[str]:
+    key = (request.headers.get(HEADER) or request.form.get(FORM_FIELD) or '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        abort(400, description=f'{HEADER} длиннее {MAX_KEY_LENGTH} символов')
+    return key or None
+
+
+def _claim(key: str, user_id: Optional[int]) -> bool:
+    """Занять ключ в текущей транзакции; False — ключ уже встречался.
+
+    Конкурентный запрос с тем же ключом ждёт на уникальном индексе, пока первый не закоммитит.
+    """
+    stmt = pg_insert(IdempotencyKey.__table__).values(
+        key=key, endpoint=request.endpoint, user_id=user_id, created_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=[IdempotencyKey.__table__.c.key])
+    return db.session.execute(stmt.returning(IdempotencyKey.__table__.c.key)).first() is not None
+
+
+def _replay(key: str, user_id: Optional[int]):
+    row = db.session.execute(select(
+        IdempotencyKey.endpoint, IdempotencyKey.user_id, IdempotencyKey.status_code,
+        IdempotencyKey.location, IdempotencyKey.mimetype, IdempotencyKey.body, IdempotencyKey.set_cookies,
+    ).where(IdempotencyKey.key == key)).first()
+    db.session.rollback()
+    if row is None or row.endpoint != request.endpoint or row.user_id != user_id:
+        abort(422, description=f'{HEADER} уже использован для другого запроса')
+    if row.status_code is None:
+        response = make_response('Запрос с этим ключом ещё выполняется', 409)
+        response.headers['Retry-After'] = '1'
+        return response
+    response = current_app.response_class(row.body or b'', status=row.status_code, mimetype=row.mimetype)
+    if row.location:
+        response.headers['Location'] = row.location
+    for cookie in (row.set_cookies or '').splitlines():
+        response.headers.add('Set-Cookie', cookie)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _store(key: str, response) -> None:
+    db.session.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+        status_code=response.status_code,
+        location=response.headers.get('Location'),
+        mimetype=response.mimetype,
+        body=None if response.direct_passthrough else response.get_data(),
+        set_cookies='\n'.join(response.headers.getlist('Set-Cookie')) or None,
+    ))
+    db.session.commit()
+
+
+def idempotent(view):
+    """Выполнить обработчик не более одного раза на ключ идемпотентности.
+
+    Без ключа обработчик работает как обычно. Если обработчик ничего не
+    закоммитил (ошибка валидации), ключ освобождается — исправленную форму
+    можно отправить с тем же ключом.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _request_key()
+        if key is None:
+            return view(*args, **kwargs)
+        user_id = current_user.id if current_user.is_authenticated else None
+        if not _claim(key, user_id):
+            return _replay(key, user_id)
+
+        db.session.info[_COMMITTED] = False
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            committed = db.session.info.pop(_COMMITTED, False)
+            db.session.rollback()
+            if committed:
+                # Записи уже зафиксированы: повтор не должен ни выполнить их снова,
+                # ни получать 409 «ещё выполняется» до purge — он получит этот 500
+                _store(key, current_app.response_class('Запрос завершился ошибкой после записи', 500))
+            raise
+        committed = db.session.info.pop(_COMMITTED, False)
+        if committed:
+            # Cookie корзины ставятся в after_this_request обработчика — сохранить ответ после них
+            @after_this_request
+            def _store_response(response):
+                _store(key, response)
+                return response
+        else:
+            db.session.rollback()
+        return response
+    return wrapper
+
+
+def purge(older_than: timedelta) -> int:
+    removed = IdempotencyKey.query.filter(IdempotencyKey.created_at < datetime.utcnow() - older_than).delete()
+    db.session.commit()
+    return removed
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_committed(session):
+    if _COMMITTED in session.info:
+        session.info[_COMMITTED] = True
@@ -0,0 +1,288 @@
+import logging
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+from uuid import uuid4
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from models.catalog import Product
+from models.employees import Employee
+from models.jobs import Job
+from models.user import User
+from services import jobs
+
+
+logger = logging.getLogger(__name__)
+
+# Загруженные картинки обрабатывает manage.py worker: запрос только проверяет
+# файл и кладёт его в UPLOAD_INCOMING_DIR (вне static). Задача снимает
+# метаданные, поворачивает по EXIF, уменьшает и пишет WebP/AVIF-варианты
+# фиксированных ширин, и только потом записывает путь в модель — до этого
+# на сайте остаётся прежняя картинка.
+#
+# Имя обработанного файла <uuid>_<ширина>.jpg|png, варианты рядом:
+# <uuid>_<ширина>-<w>.webp|avif. По имени шаблон строит srcset без обращений
+# к диску и БД; старые загрузки без такого имени отдаются как есть.
+
+IMAGE_JOB = 'images.process'
+ALLOWED_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+WIDTHS = (320, 640, 1024, 1600)
+MAX_WIDTH = WIDTHS[-1]
+MAX_PIXELS = 40_000_000
+# Первым — формат, который браузер выберет при поддержке
+VARIANT_FORMATS = (
+    ('avif', 'image/avif', {'quality': 55}),
+    ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+)
+PENDING_NOTICE = 'Фото обрабатывается и появится через несколько секунд'
+PROCESSED_NAME = re.compile(r'^(?P<stem>[0-9a-f]{32})_(?P<width>\d+)\.(?:jpg|png)$')
+
+
+class Target(NamedTuple):
+    model: Type
+    field: str
+    folder: str
+    # Аватары и фото сотрудников хранятся как /static/..., блюда — путём внутри static
+    static_prefix: bool
+
+
+TARGETS: Dict[str, Target] = {
+    'product': Target(Product, 'image_url', 'products', False),
+    'avatar': Target(User, 'avatar_url', 'avatars', True),
+    'employee': Target(Employee, 'photo_url', 'employees', True),
+}
+
+
+class ImageRejected(ValueError):
+    """Загруженный файл не принят; текст — для flash."""
+
+
+def _incoming_dir() -> str:
+    path = current_app.config['UPLOAD_INCOMING_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _upload_dir(folder: str) -> str:
+    path = os.path.join(current_app.static_folder, 'uploads', folder)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _static_relative(path: Optional[str]) -> Optional[str]:
+    """Путь загрузки внутри static или None для внешних ссылок."""
+    if not path or path.startswith(('http://', 'https://')):
+        return None
+    if path.startswith('/static/'):
+        return path[len('/static/'):]
+    return path.lstrip('/')
+
+
+def variant_widths(width: int) -> List[int]:
+    return [w for w in WIDTHS if w < width] + [width]
+
+
+def accept(file_storage) -> str:
+    """Проверить загрузку и сохранить во входящие; вернуть имя для schedule()."""
+    stream = file_storage.stream
+    try:
+        with Image.open(stream) as image:
+            image_format = image.format
+            width, height = image.size
+            image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise ImageRejected('Файл повреждён или не является изображением')
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageRejected('Неподдерживаемый формат изображения. Используйте JPG, PNG, GIF или WEBP')
+    if width * height > MAX_PIXELS:
+        raise ImageRejected('Слишком большое изображение: не больше 40 мегапикселей')
+    name = f'{uuid4().hex}{ALLOWED_FORMATS[image_format]}'
+    stream.seek(0)
+    file_storage.save(os.path.join(_incoming_dir(), name))
+    return name
+
+
+def schedule(target: str, obj_id: int, incoming: str) -> bool:
+    """Обработать принятую загрузку для объекта; вызывать до commit.
+
+    При IMAGES_ASYNC в текущей транзакции ставится задача (True — картинка
+    появится позже), иначе обработка идёт сразу (для разработки без воркера).
+    """
+    payload = {'target': target, 'id': obj_id, 'incoming': incoming}
+    if current_app.config.get('IMAGES_ASYNC'):
+        jobs.enqueue(IMAGE_JOB, payload)
+        return True
+    _process(payload)
+    return False
+
+
+def _resized(image: Image.Image, width: int) -> Image.Image:
+    if image.width == width:
+        return image
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+
+
+def render(source: str, folder: str, stem: str) -> str:
+    """Записать очищенный оригинал и варианты в uploads/folder; вернуть имя оригинала.
+
+    Метаданные (EXIF, GPS, комментарии) не переносятся: файлы сохраняются из
+    пикселей. Анимация GIF не сохраняется — берётся первый кадр.
+    """
+    target_dir = _upload_dir(folder)
+    with Image.open(source) as original:
+        # JPEG декодируется сразу в уменьшенном масштабе, если он больше нужного
+        original.draft('RGB', (MAX_WIDTH, MAX_WIDTH))
+        image = ImageOps.exif_transpose(original)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = _resized(image.convert('RGBA' if has_alpha else 'RGB'), min(image.width, MAX_WIDTH))
+    image.info.clear()
+
+    width = image.width
+    name = f'{stem}_{width}.png' if has_alpha else f'{stem}_{width}.jpg'
+    if has_alpha:
+        image.save(os.path.join(target_dir, name), 'PNG', optimize=True)
+    else:
+        image.save(os.path.join(target_dir, name), 'JPEG', quality=85, optimize=True, progressive=True)
+    for w in variant_widths(width):
+        variant = _resized(image, w)
+        for ext, _, options in VARIANT_FORMATS:
+            variant.save(os.path.join(target_dir, f'{stem}_{width}-{w}.{ext}'), ext.upper(), **options)
+    return name
+
+
+def _files(path: Optional[str]) -> List[str]:
+    """Файлы загрузки на диске: сам файл и его варианты."""
+    relative = _static_relative(path)
+    if not relative:
+        return []
+    absolute = os.path.join(current_app.static_folder, relative.replace('/', os.sep))
+    files = [absolute]
+    match = PROCESSED_NAME.match(os.path.basename(relative))
+    if match:
+        base = os.path.join(os.path.dirname(absolute), f'{match["stem"]}_{match["width"]}')
+        files += [f'{base}-{w}.{ext}' for w in variant_widths(int(match['width'])) for ext, _, _ in VARIANT_FORMATS]
+    return files
+
+
+def remove(path: Optional[str]) -> None:
+    """Удалить загрузку вместе с вариантами; отсутствующие файлы пропускаются."""
+    for file in _files(path):
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+
+def _remove_after_commit(files: List[str]) -> None:
+    db.session.info.setdefault('images_discard', []).extend(files)
+
+
+@event.listens_for(Session, 'after_commit')
+def _discard_on_commit(session):
+    for file in session.info.pop('images_discard', ()):
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_on_rollback(session):
+    session.info.pop('images_discard', None)
+
+
+# Кодирование AVIF занимает ядро целиком; по одной задаче на воркер загрузки
+# одного объекта к тому же применяются в порядке очереди
+@jobs.task(IMAGE_JOB, concurrency=1)
+def _process(payload: dict) -> None:
+    target = TARGETS[payload['target']]
+    source = os.path.join(_incoming_dir(), payload['incoming'])
+    if not os.path.exists(source):
+        # Исходник удалил purge_incoming — обрабатывать нечего
+        return
+    obj = db.session.get(target.model, payload['id'])
+    if obj is None:
+        os.remove(source)
+        return
+    name = render(source, target.folder, os.path.splitext(payload['incoming'])[0])
+    relative = f'uploads/{target.folder}/{name}'
+    stored = f'/static/{relative}' if target.static_prefix else relative
+    previous = getattr(obj, target.field)
+    setattr(obj, target.field, stored)
+    # Исходник и прежнюю картинку — только когда новый путь зафиксирован
+    _remove_after_commit([source] + (_files(previous) if previous != stored else []))
+
+
+def sources(path: Optional[str]) -> Optional[dict]:
+    """Для шаблона: src и список (type, srcset) картинки; None — картинки нет."""
+    if not path:
+        return None
+    relative = _static_relative(path)
+    if relative is None:
+        return {'src': path, 'sources': []}
+    src = url_for('static', filename=relative)
+    match = PROCESSED_NAME.match(os.path.basename(relative))
+    if not match:
+        return {'src': src, 'sources': []}
+    folder = os.path.dirname(relative)
+    base = f'{folder}/{match["stem"]}_{match["width"]}'
+    srcsets: List[Tuple[str, str]] = []
+    for ext, mime, _ in VARIANT_FORMATS:
+        srcsets.append((mime, ', '.join(
+            f'{url_for("static", filename=f"{base}-{w}.{ext}")} {w}w' for w in variant_widths(int(match['width']))
+        )))
+    return {'src': src, 'sources': srcsets}
+
+
+def backfill(inline: bool = False) -> Dict[str, int]:
+    """Поставить в обработку загрузки, сохранённые до конвейера; вернуть счётчики по видам."""
+    counts: Dict[str, int] = {}
+    for kind, target in TARGETS.items():
+        column = getattr(target.model, target.field)
+        rows = db.session.query(target.model.id, column).filter(column.isnot(None)).all()
+        for obj_id, path in rows:
+            relative = _static_relative(path)
+            if not relative or PROCESSED_NAME.match(os.path.basename(relative)):
+                continue
+            absolute = os.path.join(current_app.static_folder, relative.replace('/', os.sep))
+            if not os.path.exists(absolute):
+                logger.warning('Upload %s of %s #%s is missing', path, kind, obj_id)
+                continue
+            with open(absolute, 'rb') as fh:
+                try:
+                    with Image.open(fh) as image:
+                        image_format = image.format
+                except (UnidentifiedImageError, OSError):
+                    logger.warning('Upload %s of %s #%s is not an image', path, kind, obj_id)
+                    continue
+            if image_format not in ALLOWED_FORMATS:
+                continue
+            incoming = f'{uuid4().hex}{ALLOWED_FORMATS[image_format]}'
+            with open(absolute, 'rb') as src, open(os.path.join(_incoming_dir(), incoming), 'wb') as dst:
+                dst.write(src.read())
+            payload = {'target': kind, 'id': obj_id, 'incoming': incoming}
+            if inline:
+                _process(payload)
+            else:
+                jobs.enqueue(IMAGE_JOB, payload)
+            db.session.commit()
+            counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+def purge_incoming(older_than_seconds: float) -> int:
+    """Удалить входящие, которые так и не обработали (запрос откатился после accept)."""
+    queued = {name for (name,) in db.session.query(Job.payload['incoming'].astext).filter(Job.kind == IMAGE_JOB)}
+    removed = 0
+    cutoff = time.time() - older_than_seconds
+    for entry in os.scandir(_incoming_dir()):
+        if entry.is_file() and entry.name not in queued and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
@@ -0,0 +1,212 @@
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional, Set
+
+from sqlalchemy import delete, insert, text, update
+
+from app import db
+from models.jobs import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Очередь фоновых задач в таблице jobs. Задача ставится в транзакции запроса и
+# видна воркерам только после commit; воркеры (manage.py worker) разбирают её
+# через FOR UPDATE SKIP LOCKED, не мешая друг другу.
+
+# Модули, регистрирующие обработчики через @task
+HANDLER_MODULES = ('services.mailer', 'services.backflush', 'services.images')
+
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+# Задача в статусе running без продления дольше этого — воркер умер, задачу
+# можно взять снова. Живой воркер продлевает аренду своих задач каждые
+# HEARTBEAT_SECONDS, поэтому долгий обработчик (медленный SMTP, большой AVIF)
+# не уходит второму воркеру, пока выполняется.
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 30
+RECLAIM_EVERY_SECONDS = 60
+
+CLAIM_SQL = text("""
+UPDATE jobs
+SET status = 'running', attempts = attempts + 1, locked_at = :now, locked_by = :worker
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE status = 'queued' AND run_at <= :now AND kind <> ALL(:busy)
+    ORDER BY run_at, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, payload, attempts, max_attempts
+""")
+
+
+class Handler(NamedTuple):
+    func: Callable[[dict], None]
+    concurrency: Optional[int]
+
+
+_handlers: Dict[str, Handler] = {}
+
+
+def task(kind: str, concurrency: Optional[int] = None):
+    """Зарегистрировать обработчик задач kind.
+
+    Обработчик не коммитит сам: его записи в БД фиксируются вместе с удалением
+    задачи. concurrency — сколько таких задач воркер выполняет одновременно.
+    """
+    def decorator(func):
+        _handlers[kind] = Handler(func, concurrency)
+        return func
+    return decorator
+
+
+def enqueue(kind: str, payload: dict, delay: float = 0, max_attempts: int = 5) -> None:
+    """Поставить задачу в текущей транзакции; при rollback её не будет."""
+    db.session.execute(insert(Job).values(
+        kind=kind,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    ))
+
+
+def backoff(attempts: int) -> float:
+    """Пауза перед повтором: экспоненциально, с разбросом, чтобы повторы не шли пачкой."""
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def reclaim_stale() -> int:
+    """Вернуть в очередь задачи, взятые умершими воркерами."""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=LEASE_SECONDS))
+        .values(status='queued', run_at=now, locked_at=None, locked_by=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def heartbeat(worker: str, job_ids) -> int:
+    """Продлить аренду выполняемых задач воркера."""
+    if not job_ids:
+        return 0
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.status == 'running', Job.locked_by == worker)
+        .values(locked_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+class Worker:
+    """Процесс-воркер: concurrency потоков, каждый берёт по одной задаче."""
+
+    def __init__(self, app, concurrency: int = 4, poll_seconds: float = 1.0):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        self._active: Set[int] = set()
+        for module in HANDLER_MODULES:
+            importlib.import_module(module)
+
+    def stop(self, *_) -> None:
+        self._stop.set()
+
+    def _busy_kinds(self):
+        return [kind for kind, handler in _handlers.items()
+                if handler.concurrency and self._running.get(kind, 0) >= handler.concurrency]
+
+    def _claim(self):
+        # Под замком: лимит concurrency по видам задач соблюдается между потоками
+        with self._lock:
+            row = db.session.execute(CLAIM_SQL, {
+                'now': datetime.utcnow(), 'worker': self.name, 'busy': self._busy_kinds(),
+            }).first()
+            db.session.commit()
+            if row is not None:
+                self._running[row.kind] = self._running.get(row.kind, 0) + 1
+                self._active.add(row.id)
+            return row
+
+    def _execute(self, job) -> None:
+        handler = _handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f'Нет обработчика задач {job.kind}')
+            handler.func(job.payload)
+            db.session.execute(delete(Job).where(Job.id == job.id))
+            db.session.commit()
+            with self._lock:
+                self.processed += 1
+        except Exception as exc:
+            db.session.rollback()
+            final = job.attempts >= job.max_attempts
+            logger.warning('Job %s #%s failed (attempt %s/%s): %s',
+                           job.kind, job.id, job.attempts, job.max_attempts, exc)
+            values = {'last_error': traceback.format_exc()[-2000:], 'locked_at': None, 'locked_by': None}
+            if final:
+                values['status'] = 'failed'
+            else:
+                values.update(status='queued', run_at=datetime.utcnow() + timedelta(seconds=backoff(job.attempts)))
+            db.session.execute(update(Job).where(Job.id == job.id).values(**values))
+            db.session.commit()
+            with self._lock:
+                self.failed += final
+        finally:
+            with self._lock:
+                self._running[job.kind] -= 1
+                self._active.discard(job.id)
+
+    def _loop(self, once: bool) -> None:
+        with self.app.app_context():
+            while not self._stop.is_set():
+                job = self._claim()
+                if job is None:
+                    if once:
+                        return
+                    self._stop.wait(self.poll_seconds)
+                    continue
+                self._execute(job)
+            db.session.remove()
+
+    def run(self, once: bool = False) -> None:
+        """Работать до SIGTERM/SIGINT; once — разобрать готовые задачи и выйти."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        threads = [threading.Thread(target=self._loop, args=(once,), name=f'job-worker-{i}', daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        reclaimed_at, beat_at = 0.0, time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            if time.monotonic() - beat_at >= HEARTBEAT_SECONDS:
+                with self._lock:
+                    active = list(self._active)
+                with self.app.app_context():
+                    heartbeat(self.name, active)
+                beat_at = time.monotonic()
+            if time.monotonic() - reclaimed_at >= RECLAIM_EVERY_SECONDS:
+                with self.app.app_context():
+                    if reclaim_stale():
+                        logger.warning('Reclaimed stale jobs')
+                reclaimed_at = time.monotonic()
+            for thread in threads:
+                thread.join(timeout=0.5)
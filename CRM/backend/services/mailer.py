@@ -0,0 +1,55 @@
+from typing import Optional
+
+from flask import current_app
+from flask_mail import Message
+
+from app import mail
+from services import jobs
+
+
+# Письма отправляет manage.py worker: обработчик запроса только ставит задачу
+# и не ждёт SMTP. Без MAIL_DEFAULT_SENDER почта выключена.
+
+MAIL_JOB = 'mail.send'
+
+
+@jobs.task(MAIL_JOB, concurrency=2)
+def _send(payload: dict) -> None:
+    mail.send(Message(
+        subject=payload['subject'],
+        recipients=[payload['to']],
+        body=payload['body'],
+        sender=payload.get('sender') or current_app.config.get('MAIL_DEFAULT_SENDER'),
+    ))
+
+
+def send_mail(to: Optional[str], subject: str, body: str) -> bool:
+    """Поставить письмо в очередь текущей транзакции; False — почта выключена или нет адреса."""
+    if not to or '@' not in to or not current_app.config.get('MAIL_DEFAULT_SENDER'):
+        return False
+    jobs.enqueue(MAIL_JOB, {'to': to, 'subject': subject, 'body': body}, max_attempts=8)
+    return True
+
+
+def order_placed(to: Optional[str], order_id: int, customer_name: str, total) -> bool:
+    return send_mail(to, f'Заказ №{order_id} принят', (
+        f'{customer_name}, спасибо за заказ!\n\n'
+        f'Номер заказа: {order_id}\n'
+        f'Сумма: {total} ₽\n\n'
+        'Мы свяжемся с вами для подтверждения.'
+    ))
+
+
+def application_received(to: Optional[str], name: str, position: Optional[str]) -> bool:
+    return send_mail(to, 'Мы получили вашу анкету', (
+        f'{name}, спасибо за интерес к работе у нас'
+        f'{f" на позиции «{position}»" if position else ""}.\n\n'
+        'Мы рассмотрим анкету и свяжемся с вами.'
+    ))
+
+
+def registered(to: Optional[str], full_name: Optional[str]) -> bool:
+    return send_mail(to, 'Регистрация завершена', (
+        f'{full_name or "Здравствуйте"}, вы зарегистрированы.\n\n'
+        'Войдите на сайт с e-mail и паролем, указанными при регистрации.'
+    ))
@@ -0,0 +1,75 @@
+import threading
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from models.catalog import Category, Modifier, Product, ProductModifier
+from services import versions
+
+
+MENU = 'menu'
+FEATURED_LIMIT = 6
+
+versions.watch(MENU, Category, Product, Modifier, ProductModifier)
+
+
+class MenuCategory(NamedTuple):
+    id: int
+    name: str
+
+
+class MenuProduct(NamedTuple):
+    id: int
+    name: str
+    price: Decimal
+    image_url: Optional[str]
+    description: Optional[str]
+    portion_grams: Optional[int]
+    protein_100g: Optional[Decimal]
+    fat_100g: Optional[Decimal]
+    carb_100g: Optional[Decimal]
+    kcal_100g: Optional[int]
+    category_id: Optional[int]
+    category_name: Optional[str]
+
+
+class Menu(NamedTuple):
+    """Неизменяемый снимок публичного меню одной версии."""
+    version: int
+    categories: List[MenuCategory]
+    products: List[MenuProduct]
+    by_id: Dict[int, MenuProduct]
+    by_category: Dict[Optional[int], List[MenuProduct]]
+    featured: List[MenuProduct]
+
+
+_lock = threading.Lock()
+_state: Dict[str, Optional[Menu]] = {'menu': None}
+
+
+def _load(version: int) -> Menu:
+    categories = [MenuCategory(c.id, c.name) for c in Category.query.order_by(Category.name.asc()).all()]
+    names = {c.id: c.name for c in categories}
+    products = [
+        MenuProduct(
+            p.id, p.name, Decimal(p.price or 0), p.image_url, p.description, p.portion_grams,
+            p.protein_100g, p.fat_100g, p.carb_100g, p.kcal_100g, p.category_id, names.get(p.category_id),
+        )
+        for p in Product.query.filter_by(active=True).order_by(Product.name.asc()).all()
+    ]
+    by_category: Dict[Optional[int], List[MenuProduct]] = {}
+    for product in products:
+        by_category.setdefault(product.category_id, []).append(product)
+    featured = sorted(products, key=lambda p: (-p.price, p.name))[:FEATURED_LIMIT]
+    return Menu(version, categories, products, {p.id: p for p in products}, by_category, featured)
+
+
+def get_menu() -> Menu:
+    """Меню из памяти воркера; перечитывается из БД только при смене версии каталога."""
+    version = versions.current(MENU)
+    with _lock:
+        menu = _state['menu']
+        # Отстающая реплика видит старую версию — более свежее меню не сбрасывается
+        if menu is None or menu.version < version:
+            menu = _load(version)
+            _state['menu'] = menu
+        return menu
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import NamedTuple, Optional, Tuple
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from models.reviews import Review
+from services import versions
+from services.menu_cache import MENU
+
+
+REVIEWS = 'reviews'
+
+versions.watch(REVIEWS, Review)
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    mimetype: str
+    etag: str
+
+
+_lock = threading.Lock()
+_pages: 'OrderedDict[Tuple, CachedPage]' = OrderedDict()
+
+
+def _key() -> Optional[Tuple]:
+    """Ключ кэша или None, если запрос нельзя обслужить из кэша."""
+    if request.method != 'GET' or current_user.is_authenticated or session.get('_flashes'):
+        return None
+    args = tuple(sorted(request.args.items(multi=True)))
+    # Смена версии каталога или отзывов даёт новые ключи; старые вытеснит LRU
+    return request.endpoint, args, 'anonymous', versions.current(MENU), versions.current(REVIEWS)
+
+
+def _get(key: Tuple) -> Optional[CachedPage]:
+    with _lock:
+        page = _pages.get(key)
+        if page is not None:
+            _pages.move_to_end(key)
+        return page
+
+
+def _put(key: Tuple, page: CachedPage) -> None:
+    limit = current_app.config.get('PAGE_CACHE_SIZE', 256)
+    with _lock:
+        _pages[key] = page
+        _pages.move_to_end(key)
+        while len(_pages) > limit:
+            _pages.popitem(last=False)
+
+
+def clear() -> None:
+    with _lock:
+        _pages.clear()
+
+
+def cached_page(view):
+    """Кэшировать готовый HTML страницы для анонимных посетителей.
+
+    Персональные данные в такие страницы не попадают: счётчик корзины
+    подставляется на клиенте из cookie cart_count.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('PAGE_CACHE_SIZE'):
+            return view(*args, **kwargs)
+        key = _key()
+        if key is None:
+            return view(*args, **kwargs)
+
+        page = _get(key)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code != 200 or response.direct_passthrough
+                    or 'Set-Cookie' in response.headers or session.modified):
+                return response
+            if not response.get_etag()[0]:
+                response.add_etag()
+            page = CachedPage(response.get_data(), response.mimetype, response.get_etag()[0])
+            _put(key, page)
+
+        response = current_app.response_class(page.body, mimetype=page.mimetype)
+        response.set_etag(page.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, List, Optional, Sequence
+
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _decode_value(key, value):
+    """Значение курсора в тип колонки key; ValueError/TypeError — курсор подделан."""
+    if value is None:
+        raise TypeError(value)
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is Decimal:
+        if not isinstance(value, (str, int)) or isinstance(value, bool):
+            raise TypeError(value)
+        return Decimal(value)
+    if python_type is int:
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(value)
+        return value
+    if python_type is str and not isinstance(value, str):
+        raise TypeError(value)
+    return value
+
+
+def _cursor_values(cursor: Optional[list], keys) -> Optional[tuple]:
+    """Курсор в значениях ключей; None — курсора нет или он не подходит к keys."""
+    if cursor is None or len(cursor) != len(keys):
+        return None
+    try:
+        return tuple(_decode_value(key, value) for key, value in zip(keys, cursor))
+    except (ValueError, TypeError, ArithmeticError):
+        return None
+
+
+class Page:
+    """Одна страница keyset-выборки: строки и курсор на следующую."""
+
+    def __init__(self, items: List, next_cursor: Optional[str], per_page: int, param: str):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+        self.param = param
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def url_for_next(self, endpoint: Optional[str] = None, **values) -> Optional[str]:
+        """Ссылка на следующую страницу с сохранением прочих GET-параметров."""
+        if not self.has_next:
+            return None
+        args = request.args.to_dict()
+        args.update(request.view_args or {})
+        args.update(values)
+        args[self.param] = self.next_cursor
+        if self.per_page != DEFAULT_PER_PAGE:
+            args['per_page'] = self.per_page
+        return url_for(endpoint or request.endpoint, **args)
+
+    def as_json(self, serialize: Callable, endpoint: Optional[str] = None) -> dict:
+        return {
+            'items': [serialize(item) for item in self.items],
+            'next_cursor': self.next_cursor,
+            'next_url': self.url_for_next(endpoint),
+        }
+
+
+def keyset_page(query, *keys, descending: bool = False, param: str = 'after',
+                per_page: Optional[int] = None) -> Page:
+    """Страница query, упорядоченного по keys, начиная после курсора из request.args[param].
+
+    keys должны однозначно упорядочивать строки (последним ключом — id).
+    В отличие от OFFSET, стоимость страницы не растёт с её номером.
+    """
+    if per_page is None:
+        per_page = request.args.get('per_page', type=int) or DEFAULT_PER_PAGE
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    # Подделанный или чужой курсор игнорируется, как и битый base64
+    cursor = _cursor_values(decode_cursor(request.args.get(param)), keys)
+    if cursor is not None:
+        position = tuple_(*keys)
+        query = query.filter(position < cursor if descending else position > cursor)
+
+    order = [k.desc() for k in keys] if descending else [k.asc() for k in keys]
+    rows = query.add_columns(*keys).order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1][1:])
+    return Page([row[0] for row in rows], next_cursor, per_page, param)
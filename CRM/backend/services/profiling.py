@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from flask import Flask, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.exceptions import HTTPException
+
+
+# Профилирование запросов (PROFILING=true). Для доли запросов
+# PROFILING_SAMPLE_RATE считаются число SQL-запросов, время в БД, самые
+# медленные запросы и время рендеринга шаблонов. Замеры копятся в кольцевом
+# буфере процесса (страница /crm/_perf) и в счётчиках по endpoint'ам
+# (/crm/_perf/metrics, формат Prometheus). Запросы вне выборки стоят один
+# random() в WSGI-обёртке.
+
+# Гистограмма длительности запроса для Prometheus, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_LENGTH = 500
+ENDPOINT_CACHE_SIZE = 4096
+# Статика и сами страницы профилирования в замеры не попадают
+SKIP_ENDPOINTS = {'static', 'assets', 'perf.index', 'perf.metrics'}
+
+
+class Sample(NamedTuple):
+    at: float
+    endpoint: str
+    method: str
+    status: int
+    seconds: float
+    queries: int
+    db_seconds: float
+    template_seconds: float
+    slowest: Tuple[Tuple[float, str], ...]
+
+
+class _Profile:
+    __slots__ = ('started', 'endpoint', 'method', 'status', 'queries', 'db_seconds', 'template_seconds', 'template_started', 'statements')
+
+    def __init__(self, endpoint: str, method: str):
+        self.started = time.perf_counter()
+        self.endpoint = endpoint
+        self.method = method
+        self.status = 500
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_started = 0.0
+        self.statements: List[Tuple[float, str]] = []
+
+
+class _Totals:
+    __slots__ = ('count', 'seconds', 'db_seconds', 'template_seconds', 'queries', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.queries = 0
+        self.buckets = [0] * len(BUCKETS)
+
+
+_current: ContextVar[Optional[_Profile]] = ContextVar('crm_profile', default=None)
+_lock = threading.Lock()
+_samples: Deque[Sample] = deque(maxlen=1000)
+_totals: Dict[Tuple[str, str], _Totals] = {}
+_config = {'enabled': False, 'sample_rate': 0.0, 'slowest': 3}
+
+
+def init_app(app: Flask) -> None:
+    """Подключить профилирование, если оно включено в конфиге."""
+    global _samples
+    if not app.config.get('PROFILING'):
+        return
+    _config.update(
+        enabled=True,
+        sample_rate=app.config.get('PROFILING_SAMPLE_RATE', 0.1),
+        slowest=app.config.get('PROFILING_SLOWEST', 3),
+    )
+    _samples = deque(maxlen=app.config.get('PROFILING_BUFFER', 1000))
+    app.wsgi_app = _Sampler(app, app.wsgi_app)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    # На класс Engine — попадут и движки, созданные позже (реплики)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def enabled() -> bool:
+    return _config['enabled']
+
+
+class _Sampler:
+    """WSGI-обёртка: решает, попадёт ли запрос в выборку.
+
+    Хуки Flask (before/after_request) стоили бы каждому запросу; здесь запрос
+    вне выборки платит только random(). Endpoint выборочного запроса
+    определяется по url_map заранее, код ответа — из start_response. Для
+    потоковых ответов (SSE) время — до начала отдачи тела.
+    """
+
+    def __init__(self, app: Flask, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        # (метод, путь) -> endpoint: сопоставление с url_map дороже самого замера
+        self.endpoints: Dict[Tuple[str, str], str] = {}
+
+    def __call__(self, environ, start_response):
+        if random.random() >= _config['sample_rate']:
+            return self.wsgi_app(environ, start_response)
+        method = environ.get('REQUEST_METHOD', 'GET')
+        key = (method, environ.get('PATH_INFO', ''))
+        endpoint = self.endpoints.get(key)
+        if endpoint is None:
+            if len(self.endpoints) >= ENDPOINT_CACHE_SIZE:
+                self.endpoints.clear()
+            endpoint = self.endpoints[key] = self._endpoint(environ)
+        if endpoint in SKIP_ENDPOINTS:
+            return self.wsgi_app(environ, start_response)
+        profile = _Profile(endpoint, method)
+
+        def capture_status(status, headers, exc_info=None):
+            profile.status = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        token = _current.set(profile)
+        try:
+            return self.wsgi_app(environ, capture_status)
+        finally:
+            _current.reset(token)
+            _record(profile)
+
+    def _endpoint(self, environ) -> str:
+        adapter = self.app.url_map.bind_to_environ(environ, server_name=self.app.config.get('SERVER_NAME'))
+        try:
+            rule, _ = adapter.match(return_rule=True)
+        except HTTPException:
+            return 'unknown'
+        return rule.endpoint
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._crm_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, '_crm_started', None)
+    if profile is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile.queries += 1
+    profile.db_seconds += elapsed
+    profile.statements.append((elapsed, statement))
+
+
+def _template_started(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None:
+        profile.template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None and profile.template_started:
+        profile.template_seconds += time.perf_counter() - profile.template_started
+        profile.template_started = 0.0
+
+
+def _record(profile: _Profile) -> None:
+    slowest = sorted(profile.statements, key=lambda item: item[0], reverse=True)[:_config['slowest']]
+    sample = Sample(
+        at=time.time(),
+        endpoint=profile.endpoint,
+        method=profile.method,
+        status=profile.status,
+        seconds=time.perf_counter() - profile.started,
+        queries=profile.queries,
+        db_seconds=profile.db_seconds,
+        template_seconds=profile.template_seconds,
+        slowest=tuple((seconds, ' '.join(statement.split())[:STATEMENT_LENGTH]) for seconds, statement in slowest),
+    )
+    with _lock:
+        _samples.append(sample)
+        totals = _totals.get((sample.endpoint, sample.method))
+        if totals is None:
+            totals = _totals[(sample.endpoint, sample.method)] = _Totals()
+        totals.count += 1
+        totals.seconds += sample.seconds
+        totals.db_seconds += sample.db_seconds
+        totals.template_seconds += sample.template_seconds
+        totals.queries += sample.queries
+        for i, bound in enumerate(BUCKETS):
+            if sample.seconds <= bound:
+                totals.buckets[i] += 1
+
+
+def samples() -> List[Sample]:
+    with _lock:
+        return list(_samples)
+
+
+def profiled_requests() -> int:
+    """Сколько запросов попало в выборку с запуска (или с reset())."""
+    with _lock:
+        return sum(totals.count for totals in _totals.values())
+
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+
+
+class EndpointStats(NamedTuple):
+    endpoint: str
+    method: str
+    count: int
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    avg_queries: float
+    avg_db_ms: float
+    avg_template_ms: float
+
+
+def _percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def endpoint_stats() -> List[EndpointStats]:
+    """Сводка по буферу: перцентили длительности и средние по каждому endpoint'у."""
+    groups: Dict[Tuple[str, str], List[Sample]] = {}
+    for sample in samples():
+        groups.setdefault((sample.endpoint, sample.method), []).append(sample)
+    stats = []
+    for (endpoint, method), items in groups.items():
+        durations = sorted(s.seconds * 1000 for s in items)
+        count = len(items)
+        stats.append(EndpointStats(
+            endpoint, method, count,
+            _percentile(durations, 0.5), _percentile(durations, 0.95), durations[-1],
+            sum(s.queries for s in items) / count,
+            sum(s.db_seconds for s in items) * 1000 / count,
+            sum(s.template_seconds for s in items) * 1000 / count,
+        ))
+    return sorted(stats, key=lambda s: s.p95_ms, reverse=True)
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus() -> str:
+    """Счётчики по endpoint'ам с запуска процесса в текстовом формате Prometheus.
+
+    Считаются только попавшие в выборку запросы; доля — crm_profiling_sample_rate.
+    """
+    with _lock:
+        rows = [(key, totals.count, totals.seconds, totals.db_seconds, totals.template_seconds,
+                 totals.queries, list(totals.buckets)) for key, totals in sorted(_totals.items())]
+    lines = [
+        '# HELP crm_profiling_sample_rate Share of requests that are profiled.',
+        '# TYPE crm_profiling_sample_rate gauge',
+        f'crm_profiling_sample_rate {_config["sample_rate"]}',
+        '# HELP crm_request_duration_seconds Request duration of profiled requests.',
+        '# TYPE crm_request_duration_seconds histogram',
+    ]
+    for (endpoint, method), count, seconds, _, _, _, buckets in rows:
+        labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+        for bound, cumulative in zip(BUCKETS, buckets):
+            lines.append(f'crm_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'crm_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'crm_request_duration_seconds_sum{{{labels}}} {seconds:.6f}')
+        lines.append(f'crm_request_duration_seconds_count{{{labels}}} {count}')
+    for name, index, help_text in (
+        ('crm_request_db_seconds_total', 3, 'Time spent in SQL statements by profiled requests.'),
+        ('crm_request_template_seconds_total', 4, 'Template rendering time of profiled requests.'),
+        ('crm_request_queries_total', 5, 'SQL statements executed by profiled requests.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for row in rows:
+            (endpoint, method), value = row[0], row[index]
+            formatted = f'{value:.6f}' if isinstance(value, float) else str(value)
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}",method="{method}"}} {formatted}')
+    return '\n'.join(lines) + '\n'
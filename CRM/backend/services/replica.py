@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+
+from flask import Flask, current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# Чтение с реплики Postgres (DATABASE_REPLICA_URL, bind 'replica'). На реплику
+# уходят только GET-запросы тяжёлых экранов для чтения (REPLICA_ENDPOINTS),
+# всё остальное и любые записи (flush) — на основную базу. Пользователь,
+# только что записавший что-то сам, REPLICA_STICKY_SECONDS читает с основной
+# базы: время его последней записи лежит в cookie сессии, отставание реплики
+# он не увидит. Кэши версий (services/versions.py) держатся отдельно для
+# каждой базы, поэтому снимок, прочитанный с реплики, не подменит свежий.
+
+REPLICA = 'replica'
+WRITE_KEY = '_db_write'
+REPLICA_ENDPOINTS = {
+    'dashboard.index',
+    'inventory.index',
+    'inventory.stock_on_date',
+    'site.menu',
+    'site.reviews',
+    'site.reviews_api',
+}
+
+
+class RoutingSession(FlaskSession):
+    """Сессия Flask-SQLAlchemy, которая в помеченном запросе читает с реплики."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # INSERT/UPDATE/DELETE и flush — всегда на основную базу
+        if (bind is None and self.info.get(REPLICA) and not self._flushing
+                and not getattr(clause, 'is_dml', False)):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _db():
+    return current_app.extensions['sqlalchemy']
+
+
+def init_app(app: Flask) -> None:
+    """Включить маршрутизацию, если в конфиге задана реплика."""
+    if not app.config.get('DATABASE_REPLICA_URL'):
+        return
+    app.before_request(_route)
+    if not event.contains(Session, 'after_flush', _track_write):
+        event.listen(Session, 'after_flush', _track_write)
+        event.listen(Session, 'do_orm_execute', _track_statement)
+        event.listen(Session, 'after_commit', _remember_write)
+        event.listen(Session, 'after_rollback', _forget_write)
+
+
+def _route() -> None:
+    if request.method not in ('GET', 'HEAD') or request.endpoint not in REPLICA_ENDPOINTS:
+        return
+    written = session.get(WRITE_KEY)
+    if written and time.time() - written < current_app.config.get('REPLICA_STICKY_SECONDS', 5):
+        return
+    _db().session.info[REPLICA] = True
+
+
+def routed() -> bool:
+    """Читает ли сессия текущего запроса с реплики."""
+    return bool(_db().session.info.get(REPLICA))
+
+
+@contextmanager
+def primary():
+    """Внутри блока — чтение с основной базы даже в запросе, ушедшем на реплику."""
+    info = _db().session.info
+    was_routed = info.pop(REPLICA, False)
+    try:
+        yield
+    finally:
+        if was_routed:
+            info[REPLICA] = True
+
+
+def _track_write(session_, flush_context):
+    session_.info['db_wrote'] = True
+
+
+def _track_statement(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['db_wrote'] = True
+
+
+def _remember_write(session_):
+    if session_.info.pop('db_wrote', False) and has_request_context():
+        session[WRITE_KEY] = time.time()
+
+
+def _forget_write(session_):
+    session_.info.pop('db_wrote', None)
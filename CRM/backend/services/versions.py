@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Dict, Set, Type
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import db
+from models.cache import CacheVersion
+from services import replica
+
+
+# Версии кэшируемых данных (строки cache_versions), общие для всех воркеров.
+# Воркер перечитывает их не чаще раза в CACHE_VERSION_CHECK_SECONDS; запись
+# отслеживаемой модели поднимает версию в той же транзакции. Версии с основной
+# базы и с реплики хранятся раздельно: версия, прочитанная с реплики, не старше
+# данных, которые запрос с неё же прочитает.
+
+_lock = threading.Lock()
+_state: Dict[str, Dict[str, object]] = {'versions': {}, 'checked_at': {}}
+_watched: Dict[Type, Set[str]] = {}
+
+
+def watch(name: str, *models: Type) -> None:
+    """Поднимать версию name при любой записи в models."""
+    for model in models:
+        _watched.setdefault(model, set()).add(name)
+
+
+def current(name: str) -> int:
+    interval = current_app.config.get('CACHE_VERSION_CHECK_SECONDS', 2.0)
+    source = replica.REPLICA if replica.routed() else 'primary'
+    with _lock:
+        now = time.monotonic()
+        if now - _state['checked_at'].get(source, 0.0) >= interval:
+            rows = db.session.execute(select(CacheVersion.name, CacheVersion.version)).all()
+            _state['versions'][source] = dict(rows)
+            _state['checked_at'][source] = now
+        return _state['versions'][source].get(name, 0)
+
+
+def invalidate_local() -> None:
+    """Перечитать версии на следующем обращении."""
+    with _lock:
+        _state['checked_at'].clear()
+
+
+def _touched(session: Session) -> Set[str]:
+    names: Set[str] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        names |= _watched.get(type(obj), set())
+    return names
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_write(session, flush_context):
+    bumped = session.info.setdefault('bumped_versions', set())
+    for name in sorted(_touched(session) - bumped):
+        CacheVersion.bump(name, session.connection())
+        bumped.add(name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('bumped_versions', None):
+        invalidate_local()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('bumped_versions', None)
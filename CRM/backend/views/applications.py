@@ -1,35 +1,43 @@
-from flask import Blueprint, render_template, abort, request, redirect, url_for, flash
-from flask_login import login_required, current_user
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required
 
 from app import db
 from models.crm import JobApplication
+from services import auth
+from services.pagination import keyset_page
 
 
 bp = Blueprint('applications', __name__, url_prefix='/crm/applications')
 
 
-def _ensure_admin():
-    role_name = None
-    if current_user.role:
-        role_name = (current_user.role.name or '').lower()
-    else:
-        role_name = (current_user.role_name or '').lower()
-    if role_name != 'admin':
-        abort(403)
-
-
 @bp.route('/')
 @login_required
+@auth.admin_required
 def index():
-    _ensure_admin()
-    applications = JobApplication.query.order_by(JobApplication.id.desc()).all()
-    return render_template('applications/index.html', applications=applications)
+    page = keyset_page(JobApplication.query, JobApplication.id, descending=True)
+    return render_template('applications/index.html', applications=page.items, page=page)
+
+
+@bp.route('/api/')
+@login_required
+@auth.admin_required
+def index_api():
+    page = keyset_page(JobApplication.query, JobApplication.id, descending=True)
+    return jsonify(page.as_json(lambda a: {
+        'id': a.id,
+        'name': a.name,
+        'desired_position': a.desired_position,
+        'city': a.city,
+        'phone': a.phone,
+        'email': a.email,
+        'comment': a.comment,
+    }))
 
 
 @bp.post('/<int:application_id>/comment')
 @login_required
+@auth.admin_required
 def update_comment(application_id: int):
-    _ensure_admin()
     application = JobApplication.query.get_or_404(application_id)
     comment = (request.form.get('comment') or '').strip()
     application.comment = comment or None
@@ -40,8 +48,8 @@ def update_comment(application_id: int):
 
 @bp.post('/<int:application_id>/delete')
 @login_required
+@auth.admin_required
 def delete(application_id: int):
-    _ensure_admin()
     application = JobApplication.query.get_or_404(application_id)
     db.session.delete(application)
     db.session.commit()
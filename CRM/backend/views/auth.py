@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from models.user import User, Role
+from services import auth, mailer
 
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -10,8 +11,7 @@ bp = Blueprint('auth', __name__, url_prefix='/auth')
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        role_name = (current_user.role.name if current_user.role else current_user.role_name or '').lower()
-        if role_name == 'user':
+        if auth.is_portal_user():
             return redirect(url_for('site.home'))
         return redirect(url_for('dashboard.index'))
     if request.method == 'POST':
@@ -22,8 +22,9 @@ def login():
             flash('Неверный email или пароль', 'danger')
         else:
             login_user(user, remember=True)
-            role_name = (user.role.name if user.role else user.role_name or '').lower()
-            if role_name == 'user':
+            # Гостевая корзина перенесена в корзину пользователя (services/cart_store.py)
+            db.session.commit()
+            if auth.is_portal_user(user):
                 return redirect(url_for('site.home'))
             return redirect(url_for('dashboard.index'))
     return render_template('auth/login.html')
@@ -51,6 +52,7 @@ def register():
             user.role_name = 'user' if role else 'staff'
             user.set_password(password)
             db.session.add(user)
+            mailer.registered(email, full_name)
             db.session.commit()
             flash('Успешная регистрация. Войдите.', 'success')
             return redirect(url_for('auth.login'))
@@ -60,8 +62,7 @@ def register():
 @bp.route('/portal-info')
 @login_required
 def portal_info():
-    role_name = (current_user.role.name if current_user.role else current_user.role_name or '').lower()
-    if role_name != 'user':
+    if not auth.is_portal_user():
         return redirect(url_for('dashboard.index'))
     portal_url = current_app.config.get('PORTAL_URL') or url_for('site.home')
     return render_template('auth/portal_info.html', portal_url=portal_url)
@@ -1,16 +1,15 @@
-import os
 from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Optional, Tuple
-from uuid import uuid4
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload, selectinload
 
 from app import db
 from models.catalog import Category, Product
+from services import images
 
 
 bp = Blueprint('catalog', __name__, url_prefix='/crm/catalog')
@@ -105,32 +104,14 @@ def _product_to_form_data(product: Product) -> Dict[str, str]:
     }
 
 
-def _store_product_image(file_storage, previous_path: Optional[str] = None) -> Optional[str]:
+def _accept_image(file_storage, errors: List[str]) -> Optional[str]:
     if not file_storage or not file_storage.filename:
-        return previous_path
-
-    filename = secure_filename(file_storage.filename)
-    if not filename:
-        return previous_path
-
-    _, ext = os.path.splitext(filename)
-    unique_name = f'{uuid4().hex}{ext.lower()}'
-    upload_dir = os.path.join(current_app.static_folder, 'uploads', 'products')
-    os.makedirs(upload_dir, exist_ok=True)
-
-    target_path = os.path.join(upload_dir, unique_name)
-    file_storage.save(target_path)
-
-    if previous_path and not previous_path.startswith(('http://', 'https://')):
-        old_path = os.path.join(current_app.static_folder, previous_path.replace('/', os.sep))
-        if os.path.exists(old_path):
-            try:
-                os.remove(old_path)
-            except OSError:
-                pass
-
-    relative_path = os.path.join('uploads', 'products', unique_name).replace('\\', '/')
-    return relative_path
+        return None
+    try:
+        return images.accept(file_storage)
+    except images.ImageRejected as exc:
+        errors.append(str(exc))
+        return None
 
 
 @bp.route('/')
@@ -141,7 +122,7 @@ def list_products():
         view_mode = 'grid'
 
     selected_category_id = request.args.get('category', type=int)
-    product_query = Product.query
+    product_query = Product.query.options(joinedload(Product.category))
     if selected_category_id is not None:
         product_query = product_query.filter(Product.category_id == selected_category_id)
 
@@ -198,7 +179,8 @@ def manage_categories():
             flash('Категория добавлена', 'success')
             return redirect(url_for('catalog.manage_categories'))
 
-    categories = Category.query.order_by(Category.name.asc()).all()
+    # parent берётся из identity map, children — одним selectin-запросом
+    categories = Category.query.options(selectinload(Category.children)).order_by(Category.name.asc()).all()
     counts = dict(
         db.session.query(Category.id, func.count(Product.id))
         .outerjoin(Product, Product.category_id == Category.id)
@@ -239,6 +221,8 @@ def new_product():
     categories = Category.query.order_by(Category.name.asc()).all()
     if request.method == 'POST':
         data, errors = _extract_product_form(request.form)
+        if not errors:
+            incoming = _accept_image(request.files.get('image_file'), errors)
         if errors:
             for error in errors:
                 flash(error, 'warning')
@@ -249,13 +233,15 @@ def new_product():
                 form_data=request.form.to_dict(),
             )
         product = Product(**data)
-        image_file = request.files.get('image_file')
-        image_path = _store_product_image(image_file)
-        if image_path:
-            product.image_url = image_path
         db.session.add(product)
+        pending = False
+        if incoming:
+            db.session.flush()
+            pending = images.schedule('product', product.id, incoming)
         db.session.commit()
         flash('Блюдо создано', 'success')
+        if pending:
+            flash(images.PENDING_NOTICE, 'info')
         return redirect(url_for('catalog.list_products'))
 
     return render_template(
@@ -273,6 +259,8 @@ def edit_product(product_id: int):
     categories = Category.query.order_by(Category.name.asc()).all()
     if request.method == 'POST':
         data, errors = _extract_product_form(request.form)
+        if not errors:
+            incoming = _accept_image(request.files.get('image_file'), errors)
         if errors:
             for error in errors:
                 flash(error, 'warning')
@@ -284,12 +272,11 @@ def edit_product(product_id: int):
             )
         for field, value in data.items():
             setattr(product, field, value)
-        image_file = request.files.get('image_file')
-        image_path = _store_product_image(image_file, product.image_url)
-        if image_path != product.image_url:
-            product.image_url = image_path
+        pending = bool(incoming) and images.schedule('product', product.id, incoming)
         db.session.commit()
         flash('Блюдо обновлено', 'success')
+        if pending:
+            flash(images.PENDING_NOTICE, 'info')
         return redirect(url_for('catalog.list_products'))
 
     return render_template(
@@ -308,13 +295,7 @@ def delete_product(product_id: int):
         image_path = product.image_url
         db.session.delete(product)
         db.session.commit()
-        if image_path and not image_path.startswith(('http://', 'https://')):
-            absolute = os.path.join(current_app.static_folder, image_path.replace('/', os.sep))
-            if os.path.exists(absolute):
-                try:
-                    os.remove(absolute)
-                except OSError:
-                    pass
+        images.remove(image_path)
         flash('Блюдо удалено', 'success')
     except IntegrityError:
         db.session.rollback()
@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
 from app import db
 from models.crm import Customer, LoyaltyTier, Promotion
+from services.pagination import keyset_page
 
 
 bp = Blueprint('crm', __name__, url_prefix='/crm/customers')
@@ -10,10 +11,17 @@ bp = Blueprint('crm', __name__, url_prefix='/crm/customers')
 @bp.route('/')
 @login_required
 def index():
-    customers = Customer.query.all()
+    page = keyset_page(Customer.query, Customer.id)
     promotions = Promotion.query.all()
     tiers = LoyaltyTier.query.all()
-    return render_template('crm/index.html', customers=customers, promotions=promotions, tiers=tiers)
+    return render_template('crm/index.html', customers=page.items, page=page, promotions=promotions, tiers=tiers)
+
+
+@bp.route('/api/')
+@login_required
+def index_api():
+    page = keyset_page(Customer.query, Customer.id)
+    return jsonify(page.as_json(lambda c: {'id': c.id, 'name': c.name, 'phone': c.phone, 'points': c.points}))
 
 
 @bp.route('/customer/create', methods=['POST'])
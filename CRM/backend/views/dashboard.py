@@ -4,9 +4,10 @@ from typing import Optional
 from flask import Blueprint, render_template
 from flask_login import login_required
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from app import db
-from models.orders import DeliveryOrder, Order, Payment
+from models.orders import DailySales, DeliveryOrder, Order
 
 bp = Blueprint('dashboard', __name__, url_prefix='/crm')
 
@@ -23,41 +24,30 @@ def index():
     today = datetime.utcnow().date()
     yesterday = today - timedelta(days=1)
 
-    orders_today = (
-        db.session.query(func.count(Order.id))
-        .filter(func.date(Order.created_at) == today)
-        .scalar()
-    )
-    orders_yesterday = (
-        db.session.query(func.count(Order.id))
-        .filter(func.date(Order.created_at) == yesterday)
-        .scalar()
-    )
-    revenue_today_raw = (
-        db.session.query(func.coalesce(func.sum(Order.total), 0))
-        .filter(
-            func.date(Order.created_at) == today,
-            Order.status == 'paid',
+    # Итоги обоих дней одним запросом из витрины daily_sales
+    kpis = {
+        day: (int(orders or 0), float(revenue or 0))
+        for day, orders, revenue in (
+            db.session.query(
+                DailySales.day,
+                func.sum(DailySales.orders_count),
+                func.sum(DailySales.revenue),
+            )
+            .filter(DailySales.day.in_([today, yesterday]))
+            .group_by(DailySales.day)
+            .all()
         )
-        .scalar()
-    )
-    revenue_yesterday_raw = (
-        db.session.query(func.coalesce(func.sum(Order.total), 0))
-        .filter(
-            func.date(Order.created_at) == yesterday,
-            Order.status == 'paid',
-        )
-        .scalar()
-    )
-    revenue_today = float(revenue_today_raw or 0)
-    revenue_yesterday = float(revenue_yesterday_raw or 0)
+    }
+    orders_today, revenue_today = kpis.get(today, (0, 0.0))
+    orders_yesterday, revenue_yesterday = kpis.get(yesterday, (0, 0.0))
     open_orders = Order.query.filter_by(status='open').count()
     pending_delivery = DeliveryOrder.query.filter(
         DeliveryOrder.status.notin_(['done', 'cancelled'])
     ).count()
 
     latest_orders = (
-        Order.query.order_by(Order.created_at.desc()).limit(5).all()
+        Order.query.options(joinedload(Order.table))
+        .order_by(Order.created_at.desc()).limit(5).all()
     )
     latest_deliveries = (
         DeliveryOrder.query.order_by(DeliveryOrder.created_at.desc())
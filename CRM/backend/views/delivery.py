@@ -1,24 +1,81 @@
 from decimal import Decimal
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required
+from sqlalchemy.orm import selectinload
 from app import db
-from models.orders import DeliveryOrder, DeliveryOrderItem
+from models.orders import DeliveryOrder, DeliveryOrderItem, DailySales
 from models.employees import Employee
 from models.catalog import Product, Category
+from services import events
+from services.backflush import backflush
+from services.pagination import keyset_page
 
 
 bp = Blueprint('delivery', __name__, url_prefix='/crm/delivery')
 
 
+ACTIVE_STATUSES = ('new', 'in_progress')
+ARCHIVE_STATUSES = ('done', 'cancelled')
+
+
+def _archive_page():
+    return keyset_page(
+        DeliveryOrder.query.options(selectinload(DeliveryOrder.items))
+        .filter(DeliveryOrder.status.in_(ARCHIVE_STATUSES)),
+        DeliveryOrder.id,
+        descending=True,
+    )
+
+
 @bp.route('/')
 @login_required
 def home():
-    new_orders = DeliveryOrder.query.filter_by(status='new').all()
-    in_progress = DeliveryOrder.query.filter_by(status='in_progress').all()
-    done = DeliveryOrder.query.filter_by(status='done').all()
-    cancelled = DeliveryOrder.query.filter_by(status='cancelled').all()
-    return render_template('delivery/home.html', new_orders=new_orders, in_progress=in_progress, done=done, cancelled=cancelled)
+    # Активные колонки доски — целиком одним запросом; выполненные и отменённые
+    # копятся бесконечно, поэтому из архива показывается одна keyset-страница.
+    by_status = {'new': [], 'in_progress': [], 'done': [], 'cancelled': []}
+    active = (
+        DeliveryOrder.query.options(selectinload(DeliveryOrder.items))
+        .filter(DeliveryOrder.status.in_(ACTIVE_STATUSES))
+        .order_by(DeliveryOrder.id.asc())
+        .all()
+    )
+    archive = _archive_page()
+    for o in active + archive.items:
+        by_status[o.status].append(o)
+    return render_template('delivery/home.html', new_orders=by_status['new'], in_progress=by_status['in_progress'],
+                           done=by_status['done'], cancelled=by_status['cancelled'], page=archive)
+
+
+@bp.route('/api/archive/')
+@login_required
+def archive_api():
+    page = _archive_page()
+    return jsonify(page.as_json(lambda o: {
+        'id': o.id,
+        'status': o.status,
+        'customer_name': o.customer_name,
+        'phone': o.phone,
+        'total': float(o.total or 0),
+        'created_at': o.created_at.isoformat() if o.created_at else None,
+        'items': [{'product_name': i.product_name, 'qty': i.qty} for i in o.items],
+    }))
+
+
+@bp.route('/card/<int:order_id>')
+@login_required
+def card(order_id: int):
+    """Одна карточка доски — для точечного обновления по событию."""
+    order = DeliveryOrder.query.options(selectinload(DeliveryOrder.items)).filter_by(id=order_id).first()
+    if order is None:
+        return '', 204
+    return render_template('delivery/_card.html', o=order)
+
+
+@bp.route('/events')
+@login_required
+def events_stream():
+    return events.event_stream(events.DELIVERY)
 
 
 @bp.route('/new')
@@ -44,8 +101,12 @@ def create():
         receive_method=request.form.get('receive_method') or 'delivery',
         planned_at=datetime.fromisoformat(request.form.get('planned_at')) if request.form.get('planned_at') else None,
         payment_type=request.form.get('payment_type') or 'cash',
+        created_at=datetime.utcnow(),
     )
     db.session.add(o)
+    DailySales.record(o.created_at.date(), o.source or 'phone', deliveries=1)
+    db.session.flush()
+    events.publish(events.DELIVERY, id=o.id, status=o.status)
     db.session.commit()
     return redirect(url_for('delivery.edit', order_id=o.id))
 
@@ -88,26 +149,34 @@ def edit(order_id: int):
 @bp.route('/<int:order_id>/add', methods=['POST'])
 @login_required
 def add_item(order_id: int):
-    order = DeliveryOrder.query.get_or_404(order_id)
     product_id = int(request.form.get('product_id'))
     qty = int(request.form.get('qty') or '1')
     product = Product.query.get_or_404(product_id)
     line_sum = Decimal(product.price) * qty
-    item = DeliveryOrderItem(order_id=order.id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum)
-    order.total = (Decimal(order.total) + line_sum)
-    db.session.add(item)
+    # Сумма меняется одним UPDATE: параллельные добавления не теряют друг друга
+    if DeliveryOrder.add_to_total(order_id, line_sum) is None:
+        abort(404)
+    db.session.add(DeliveryOrderItem(order_id=order_id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum))
+    events.publish(events.DELIVERY, id=order_id)
     db.session.commit()
-    return redirect(url_for('delivery.edit', order_id=order.id))
+    return redirect(url_for('delivery.edit', order_id=order_id))
 
 
 @bp.route('/<int:order_id>/status', methods=['POST'])
 @login_required
 def set_status(order_id: int):
-    order = DeliveryOrder.query.get_or_404(order_id)
+    order = DeliveryOrder.query.filter_by(id=order_id).with_for_update().first_or_404()
     status = request.form.get('status')
     courier_id = request.form.get('courier_id')
-    if status in ['new', 'in_progress', 'done', 'cancelled']:
+    if status in ['new', 'in_progress', 'done', 'cancelled'] and status != order.status:
+        sold = [(i.product_id, i.qty) for i in order.items]
+        if status == 'done':
+            backflush(sold, 'delivery', order.id, f'Доставка #{order.id}')
+        elif order.status == 'done':
+            # заказ вернули из «Выполнен» — возвращаем ингредиенты на склад
+            backflush(sold, 'delivery', order.id, f'Возврат доставки #{order.id}', sign=1)
         order.status = status
+        events.publish(events.DELIVERY, id=order.id, status=status)
     # сохраняем курьера, если передан
     if courier_id is not None:
         order.courier_id = int(courier_id) if courier_id else None
@@ -1,11 +1,10 @@
 from datetime import datetime, date, time
-import os
-from uuid import uuid4
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required, current_user
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required
 from app import db
 from models.employees import Employee, Shift
-from werkzeug.utils import secure_filename
+from services import auth, images
+from services.pagination import keyset_page
 
 
 bp = Blueprint('employees', __name__, url_prefix='/crm/employees')
@@ -19,8 +18,21 @@ POSITIONS = [
 @bp.route('/')
 @login_required
 def index():
-    employees = Employee.query.order_by(Employee.full_name.asc()).all()
-    return render_template('employees/index.html', employees=employees, positions=POSITIONS)
+    page = keyset_page(Employee.query, Employee.full_name, Employee.id)
+    return render_template('employees/index.html', employees=page.items, page=page, positions=POSITIONS)
+
+
+@bp.route('/api/')
+@login_required
+def index_api():
+    page = keyset_page(Employee.query, Employee.full_name, Employee.id)
+    return jsonify(page.as_json(lambda e: {
+        'id': e.id,
+        'full_name': e.full_name,
+        'position': e.position,
+        'phone': e.phone,
+        'birth_date': e.birth_date.isoformat() if e.birth_date else None,
+    }))
 
 
 @bp.route('/create', methods=['POST'])
@@ -35,14 +47,13 @@ def create_employee():
     if not full_name or not position:
         flash('Заполните ФИО и должность', 'warning')
         return redirect(url_for('employees.index'))
-    photo_path = None
+    incoming = None
     if photo and photo.filename:
-        uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads', 'employees')
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = os.path.splitext(photo.filename)[1].lower()
-        filename = secure_filename(f"{uuid4().hex}{ext}")
-        photo.save(os.path.join(uploads_dir, filename))
-        photo_path = f"/static/uploads/employees/{filename}"
+        try:
+            incoming = images.accept(photo)
+        except images.ImageRejected as exc:
+            flash(str(exc), 'warning')
+            return redirect(url_for('employees.index'))
 
     emp = Employee(
         full_name=full_name,
@@ -50,37 +61,33 @@ def create_employee():
         birth_date=datetime.strptime(birth_date, '%Y-%m-%d').date() if birth_date else None,
         phone=phone,
         address=address,
-        photo_url=photo_path,
     )
     db.session.add(emp)
+    pending = False
+    if incoming:
+        db.session.flush()
+        pending = images.schedule('employee', emp.id, incoming)
     db.session.commit()
     flash('Сотрудник добавлен', 'success')
+    if pending:
+        flash(images.PENDING_NOTICE, 'info')
     return redirect(url_for('employees.index'))
 
 
 @bp.route('/delete/<int:employee_id>', methods=['POST'])
 @login_required
 def delete_employee(employee_id: int):
-    # Проверка прав администратора
-    role_name = (current_user.role.name if current_user.role else current_user.role_name or '').lower()
-    if role_name != 'admin':
+    if not auth.is_admin():
         flash('У вас нет прав для удаления сотрудников', 'danger')
         return redirect(url_for('employees.index'))
 
     emp = Employee.query.get_or_404(employee_id)
 
-    # Удаление файла фото, если он существует
-    if emp.photo_url:
-        try:
-            photo_path = emp.photo_url.replace('/static/', '')
-            full_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', photo_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
-        except Exception:
-            pass  # Игнорируем ошибки при удалении файла
-
+    photo_url = emp.photo_url
     db.session.delete(emp)
     db.session.commit()
+    # Фото и его варианты — после удаления записи
+    images.remove(photo_url)
     flash('Сотрудник удален', 'success')
     return redirect(url_for('employees.index'))
 
@@ -97,16 +104,19 @@ def update_employee(employee_id: int):
     emp.address = request.form.get('address') or emp.address
 
     photo = request.files.get('photo')
+    pending = False
     if photo and photo.filename:
-        uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads', 'employees')
-        os.makedirs(uploads_dir, exist_ok=True)
-        ext = os.path.splitext(photo.filename)[1].lower()
-        filename = secure_filename(f"{uuid4().hex}{ext}")
-        photo.save(os.path.join(uploads_dir, filename))
-        emp.photo_url = f"/static/uploads/employees/{filename}"
+        try:
+            pending = images.schedule('employee', emp.id, images.accept(photo))
+        except images.ImageRejected as exc:
+            db.session.rollback()
+            flash(str(exc), 'warning')
+            return redirect(url_for('employees.index'))
 
     db.session.commit()
     flash('Данные сотрудника обновлены', 'success')
+    if pending:
+        flash(images.PENDING_NOTICE, 'info')
     return redirect(url_for('employees.index'))
 
 
@@ -1,12 +1,14 @@
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
+from sqlalchemy.orm import joinedload
 from app import db
 from models.inventory import (
     StockItem, StockMovement, Warehouse, StockBalance,
     Supplier, Purchase, PurchaseItem,
-    InventoryDoc, InventoryLine
+    Transfer, TransferItem, WriteOff, WriteOffItem,
+    InventoryDoc, InventoryLine, StockSnapshot, post_movements
 )
 
 
@@ -19,7 +21,9 @@ def index():
     warehouses = Warehouse.query.all()
     suppliers = Supplier.query.all()
     items = StockItem.query.all()
-    moves = StockMovement.query.order_by(StockMovement.id.desc()).limit(20).all()
+    moves = (StockMovement.query
+             .options(joinedload(StockMovement.item), joinedload(StockMovement.warehouse))
+             .order_by(StockMovement.id.desc()).limit(20).all())
     return render_template('inventory/home.html', warehouses=warehouses, suppliers=suppliers, items=items, moves=moves)
 
 
@@ -57,14 +61,42 @@ def manual_move():
 
 
 def _apply_movement(warehouse_id: int, item_id: int, delta: Decimal, doc_type: str, doc_id: int, note: str | None = None):
-    bal = StockBalance.query.filter_by(warehouse_id=warehouse_id, item_id=item_id).first()
-    if not bal:
-        bal = StockBalance(warehouse_id=warehouse_id, item_id=item_id, quantity=Decimal('0'))
-        db.session.add(bal)
-        db.session.flush()
-    bal.quantity = (bal.quantity or 0) + Decimal(delta)
-    mv = StockMovement(warehouse_id=warehouse_id, item_id=item_id, delta=delta, doc_type=doc_type, doc_id=doc_id, note=note)
-    db.session.add(mv)
+    post_movements([(warehouse_id, item_id, delta)], doc_type, doc_id, note)
+
+
+def _claim_posting(model, doc_id: int) -> bool:
+    """Атомарно перевести документ в posted; False, если его уже провели."""
+    # status допускает NULL: != 'posted' на такой строке даёт NULL, а не True
+    updated = (
+        db.session.query(model)
+        .filter(model.id == doc_id, model.status.is_distinct_from('posted'))
+        .update({model.status: 'posted'}, synchronize_session=False)
+    )
+    return updated == 1
+
+
+@bp.route('/stock-on-date')
+@login_required
+def stock_on_date():
+    warehouses = Warehouse.query.order_by(Warehouse.name.asc()).all()
+    warehouse_id = request.args.get('warehouse_id', type=int) or (warehouses[0].id if warehouses else None)
+    try:
+        day = datetime.strptime(request.args.get('day', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = datetime.utcnow().date()
+    rows = []
+    if warehouse_id:
+        balances = StockSnapshot.as_of(warehouse_id, day)
+        items = {i.id: i for i in StockItem.query.filter(StockItem.id.in_(balances.keys())).all()} if balances else {}
+        rows = sorted(
+            ((items.get(item_id), qty) for item_id, qty in balances.items() if qty),
+            key=lambda r: (r[0].name if r[0] else ''),
+        )
+    return render_template('inventory/stock_on_date.html',
+                           warehouses=warehouses,
+                           warehouse_id=warehouse_id,
+                           day=day,
+                           rows=rows)
 
 
 # Warehouses & Suppliers
@@ -203,17 +235,219 @@ def purchase_delete_line(purchase_id: int, line_id: int):
 @login_required
 def purchase_post(purchase_id: int):
     doc = Purchase.query.get_or_404(purchase_id)
-    if doc.status == 'posted':
+    if not _claim_posting(Purchase, doc.id):
+        db.session.rollback()
         flash('Документ уже проведен', 'info')
         return redirect(url_for('inventory.purchase_edit', purchase_id=doc.id))
-    for line in doc.items:
-        _apply_movement(doc.warehouse_id, line.item_id, line.qty, 'purchase', doc.id, 'Поступление')
-    doc.status = 'posted'
+    post_movements(
+        ((doc.warehouse_id, line.item_id, line.qty) for line in doc.items),
+        'purchase', doc.id, 'Поступление',
+    )
     db.session.commit()
     flash('Поступление проведено', 'success')
     return redirect(url_for('inventory.purchase_edit', purchase_id=doc.id))
 
 
+# Transfer document
+@bp.route('/transfer/new')
+@login_required
+def transfer_new():
+    return render_template('inventory/transfer_edit.html',
+                           transfer=None,
+                           warehouses=Warehouse.query.all(),
+                           items=StockItem.query.all())
+
+
+@bp.route('/transfer/create', methods=['POST'])
+@login_required
+def transfer_create():
+    from_warehouse_id = int(request.form.get('from_warehouse_id'))
+    to_warehouse_id = int(request.form.get('to_warehouse_id'))
+    if from_warehouse_id == to_warehouse_id:
+        flash('Склад-отправитель и склад-получатель должны различаться', 'warning')
+        return redirect(url_for('inventory.transfer_new'))
+    doc = Transfer(from_warehouse_id=from_warehouse_id, to_warehouse_id=to_warehouse_id, status='draft')
+    db.session.add(doc)
+    db.session.commit()
+    flash('Черновик перемещения создан', 'success')
+    return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+
+
+@bp.route('/transfer/<int:transfer_id>')
+@login_required
+def transfer_edit(transfer_id: int):
+    doc = Transfer.query.get_or_404(transfer_id)
+    balances = StockBalance.query.filter_by(warehouse_id=doc.from_warehouse_id).all()
+    bal_map = {b.item_id: b.quantity for b in balances}
+    return render_template('inventory/transfer_edit.html',
+                           transfer=doc,
+                           warehouses=Warehouse.query.all(),
+                           items=StockItem.query.all(),
+                           bal_map=bal_map)
+
+
+@bp.route('/transfer/<int:transfer_id>/update', methods=['POST'])
+@login_required
+def transfer_update(transfer_id: int):
+    doc = Transfer.query.get_or_404(transfer_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+    from_warehouse_id = int(request.form.get('from_warehouse_id') or doc.from_warehouse_id)
+    to_warehouse_id = int(request.form.get('to_warehouse_id') or doc.to_warehouse_id)
+    if from_warehouse_id == to_warehouse_id:
+        flash('Склад-отправитель и склад-получатель должны различаться', 'warning')
+        return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+    doc.from_warehouse_id = from_warehouse_id
+    doc.to_warehouse_id = to_warehouse_id
+    db.session.commit()
+    flash('Шапка документа обновлена', 'success')
+    return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+
+
+@bp.route('/transfer/<int:transfer_id>/add', methods=['POST'])
+@login_required
+def transfer_add_item(transfer_id: int):
+    doc = Transfer.query.get_or_404(transfer_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+    item_id = int(request.form.get('item_id'))
+    qty = Decimal(request.form.get('qty'))
+    db.session.add(TransferItem(transfer_id=doc.id, item_id=item_id, qty=qty))
+    db.session.commit()
+    return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+
+
+@bp.route('/transfer/<int:transfer_id>/line/<int:line_id>/delete', methods=['POST'])
+@login_required
+def transfer_delete_line(transfer_id: int, line_id: int):
+    doc = Transfer.query.get_or_404(transfer_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+    line = TransferItem.query.filter_by(id=line_id, transfer_id=doc.id).first_or_404()
+    db.session.delete(line)
+    db.session.commit()
+    flash('Позиция удалена', 'success')
+    return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+
+
+@bp.route('/transfer/<int:transfer_id>/post', methods=['POST'])
+@login_required
+def transfer_post(transfer_id: int):
+    doc = Transfer.query.get_or_404(transfer_id)
+    if not _claim_posting(Transfer, doc.id):
+        db.session.rollback()
+        flash('Документ уже проведен', 'info')
+        return redirect(url_for('inventory.transfer_edit', transfer_id=doc.id))
+    # Расход со склада-отправителя и приход на склад-получатель одним пакетом
+    lines = []
+    for line in doc.items:
+        lines.append((doc.from_warehouse_id, line.item_id, -Decimal(line.qty)))
+        lines.append((doc.to_warehouse_id, line.item_id, Decimal(line.qty)))
+    post_movements(lines, 'transfer', doc.id, 'Перемещение')
+    db.session.commit()
+    flash('Перемещение проведено', 'success')
+    return redirect(url_for('inventory.transfer_edit', transfer_id=transfer_id))
+
+
+# Write-off document
+@bp.route('/writeoff/new')
+@login_required
+def writeoff_new():
+    return render_template('inventory/writeoff_edit.html',
+                           writeoff=None,
+                           warehouses=Warehouse.query.all(),
+                           items=StockItem.query.all())
+
+
+@bp.route('/writeoff/create', methods=['POST'])
+@login_required
+def writeoff_create():
+    warehouse_id = int(request.form.get('warehouse_id'))
+    reason = (request.form.get('reason') or '').strip() or None
+    doc = WriteOff(warehouse_id=warehouse_id, reason=reason, status='draft')
+    db.session.add(doc)
+    db.session.commit()
+    flash('Черновик списания создан', 'success')
+    return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+
+
+@bp.route('/writeoff/<int:writeoff_id>')
+@login_required
+def writeoff_edit(writeoff_id: int):
+    doc = WriteOff.query.get_or_404(writeoff_id)
+    balances = StockBalance.query.filter_by(warehouse_id=doc.warehouse_id).all()
+    bal_map = {b.item_id: b.quantity for b in balances}
+    return render_template('inventory/writeoff_edit.html',
+                           writeoff=doc,
+                           warehouses=Warehouse.query.all(),
+                           items=StockItem.query.all(),
+                           bal_map=bal_map)
+
+
+@bp.route('/writeoff/<int:writeoff_id>/update', methods=['POST'])
+@login_required
+def writeoff_update(writeoff_id: int):
+    doc = WriteOff.query.get_or_404(writeoff_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+    warehouse_id = request.form.get('warehouse_id') or None
+    if warehouse_id:
+        doc.warehouse_id = int(warehouse_id)
+    doc.reason = (request.form.get('reason') or '').strip() or None
+    db.session.commit()
+    flash('Шапка документа обновлена', 'success')
+    return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+
+
+@bp.route('/writeoff/<int:writeoff_id>/add', methods=['POST'])
+@login_required
+def writeoff_add_item(writeoff_id: int):
+    doc = WriteOff.query.get_or_404(writeoff_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+    item_id = int(request.form.get('item_id'))
+    qty = Decimal(request.form.get('qty'))
+    db.session.add(WriteOffItem(writeoff_id=doc.id, item_id=item_id, qty=qty))
+    db.session.commit()
+    return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+
+
+@bp.route('/writeoff/<int:writeoff_id>/line/<int:line_id>/delete', methods=['POST'])
+@login_required
+def writeoff_delete_line(writeoff_id: int, line_id: int):
+    doc = WriteOff.query.get_or_404(writeoff_id)
+    if doc.status == 'posted':
+        flash('Документ проведен и недоступен для редактирования', 'warning')
+        return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+    line = WriteOffItem.query.filter_by(id=line_id, writeoff_id=doc.id).first_or_404()
+    db.session.delete(line)
+    db.session.commit()
+    flash('Позиция удалена', 'success')
+    return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+
+
+@bp.route('/writeoff/<int:writeoff_id>/post', methods=['POST'])
+@login_required
+def writeoff_post(writeoff_id: int):
+    doc = WriteOff.query.get_or_404(writeoff_id)
+    if not _claim_posting(WriteOff, doc.id):
+        db.session.rollback()
+        flash('Документ уже проведен', 'info')
+        return redirect(url_for('inventory.writeoff_edit', writeoff_id=doc.id))
+    post_movements(
+        ((doc.warehouse_id, line.item_id, -Decimal(line.qty)) for line in doc.items),
+        'writeoff', doc.id, doc.reason or 'Списание',
+    )
+    db.session.commit()
+    flash('Списание проведено', 'success')
+    return redirect(url_for('inventory.writeoff_edit', writeoff_id=writeoff_id))
+
+
 # Inventory document
 @bp.route('/inventory/new')
 @login_required
@@ -277,17 +511,20 @@ def inv_set(inv_id: int):
 @login_required
 def inv_post(inv_id: int):
     doc = InventoryDoc.query.get_or_404(inv_id)
-    if doc.status == 'posted':
+    if not _claim_posting(InventoryDoc, doc.id):
+        db.session.rollback()
         flash('Инвентаризация уже проведена', 'info')
         return redirect(url_for('inventory.inv_edit', inv_id=doc.id))
-    balances = StockBalance.query.filter_by(warehouse_id=doc.warehouse_id).all()
+    # Остатки блокируются до конца проведения, чтобы разница считалась от актуальных значений
+    balances = StockBalance.query.filter_by(warehouse_id=doc.warehouse_id).with_for_update().all()
     bal_map = {b.item_id: b.quantity for b in balances}
-    for line in doc.lines:
-        acct = Decimal(bal_map.get(line.item_id, 0) or 0)
-        diff = Decimal(line.counted_qty or 0) - acct
-        if diff != 0:
-            _apply_movement(doc.warehouse_id, line.item_id, diff, 'inventory', doc.id, 'Корректировка инвентаризации')
-    doc.status = 'posted'
+    post_movements(
+        (
+            (doc.warehouse_id, line.item_id, Decimal(line.counted_qty or 0) - Decimal(bal_map.get(line.item_id, 0) or 0))
+            for line in doc.lines
+        ),
+        'inventory', doc.id, 'Корректировка инвентаризации',
+    )
     db.session.commit()
     flash('Инвентаризация проведена', 'success')
     return redirect(url_for('inventory.inv_edit', inv_id=doc.id))
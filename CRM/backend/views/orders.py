@@ -1,9 +1,14 @@
+from datetime import datetime
 from decimal import Decimal
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
+from sqlalchemy.orm import joinedload
 from app import db
-from models.orders import Table, Order, OrderItem, Payment
+from models.orders import Table, Order, OrderItem, Payment, DailySales
 from models.catalog import Product
+from services import events
+from services.backflush import backflush
+from services.idempotency import idempotent
 
 
 bp = Blueprint('orders', __name__, url_prefix='/crm/orders')
@@ -13,7 +18,7 @@ bp = Blueprint('orders', __name__, url_prefix='/crm/orders')
 @login_required
 def index():
     tables = Table.query.order_by(Table.name.asc()).all()
-    open_orders = Order.query.filter_by(status='open').all()
+    open_orders = Order.query.options(joinedload(Order.table)).filter_by(status='open').all()
     status_map = {'open': 'Открыт', 'paid': 'Оплачен', 'cancelled': 'Отменён'}
     return render_template('orders/index.html', tables=tables, orders=open_orders, status_map=status_map)
 
@@ -22,8 +27,12 @@ def index():
 @login_required
 def open_order():
     table_id = request.form.get('table_id')
-    order = Order(table_id=table_id)
+    now = datetime.utcnow()
+    order = Order(table_id=table_id, created_at=now)
     db.session.add(order)
+    DailySales.record(now.date(), 'pos', orders=1)
+    db.session.flush()
+    events.publish(events.KITCHEN, id=order.id, status='open')
     db.session.commit()
     flash('Открыт новый заказ', 'success')
     return redirect(url_for('orders.view', order_id=order.id))
@@ -69,27 +78,40 @@ def view(order_id: int):
 
 @bp.route('/<int:order_id>/add', methods=['POST'])
 @login_required
+@idempotent
 def add_item(order_id: int):
-    order = Order.query.get_or_404(order_id)
     product_id = int(request.form.get('product_id'))
     qty = int(request.form.get('qty') or '1')
     product = Product.query.get_or_404(product_id)
     line_sum = Decimal(product.price) * qty
-    item = OrderItem(order_id=order.id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum)
-    order.total = (Decimal(order.total) + line_sum)
-    db.session.add(item)
+    # Сумма меняется одним UPDATE: параллельные добавления не теряют друг друга
+    if Order.add_to_total(order_id, line_sum) is None:
+        db.session.rollback()
+        Order.query.get_or_404(order_id)
+        flash('Заказ уже оплачен', 'info')
+        return redirect(url_for('orders.index'))
+    db.session.add(OrderItem(order_id=order_id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum))
+    events.publish(events.KITCHEN, id=order_id)
     db.session.commit()
-    return redirect(url_for('orders.view', order_id=order.id))
+    return redirect(url_for('orders.view', order_id=order_id))
 
 
 @bp.route('/<int:order_id>/pay', methods=['POST'])
 @login_required
+@idempotent
 def pay(order_id: int):
-    order = Order.query.get_or_404(order_id)
+    # Блокировка строки заказа: повторная оплата ждёт и видит status='paid'
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
+    if order.status == 'paid':
+        flash('Заказ уже оплачен', 'info')
+        return redirect(url_for('orders.index'))
     amount = order.total
     payment = Payment(order_id=order.id, amount=amount, method=request.form.get('method', 'cash'))
     order.status = 'paid'
     db.session.add(payment)
+    DailySales.record(order.created_at.date(), 'pos', revenue=amount)
+    backflush(((i.product_id, i.qty) for i in order.items), 'sale', order.id, f'Продажа, чек #{order.id}')
+    events.publish(events.KITCHEN, id=order.id, status='paid')
     db.session.commit()
     flash('Заказ оплачен', 'success')
     return redirect(url_for('orders.index'))
@@ -0,0 +1,45 @@
+import hmac
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, render_template, request
+from flask_login import login_required
+
+from services import auth, profiling
+
+
+bp = Blueprint('perf', __name__, url_prefix='/crm/_perf')
+
+
+@bp.route('/')
+@login_required
+@auth.admin_required
+def index():
+    samples = profiling.samples()
+    slow = sorted(samples, key=lambda s: s.seconds, reverse=True)[:20]
+    return render_template(
+        'perf/index.html',
+        enabled=profiling.enabled(),
+        sample_rate=current_app.config.get('PROFILING_SAMPLE_RATE'),
+        buffered=len(samples),
+        stats=profiling.endpoint_stats(),
+        slow=slow,
+        started_at=lambda sample: datetime.fromtimestamp(sample.at).strftime('%d.%m %H:%M:%S'),
+    )
+
+
+def _metrics_allowed() -> bool:
+    # Prometheus ходит без сессии: Authorization: Bearer <PROFILING_METRICS_TOKEN>
+    token = current_app.config.get('PROFILING_METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token):
+        return True
+    return auth.is_admin()
+
+
+@bp.route('/metrics')
+def metrics():
+    if not profiling.enabled():
+        abort(404)
+    if not _metrics_allowed():
+        abort(403)
+    return Response(profiling.prometheus(), mimetype='text/plain; version=0.0.4')
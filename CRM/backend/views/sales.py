@@ -1,10 +1,17 @@
+from datetime import datetime
 from decimal import Decimal
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, make_response
 from flask_login import login_required
+from sqlalchemy import delete
+from sqlalchemy.orm import joinedload, selectinload
 from app import db
-from models.orders import Table, Order, OrderItem, Payment
+from models.orders import Table, Order, OrderItem, Payment, DailySales
 from models.employees import Employee
 from models.catalog import Product, Category
+from services import events
+from services.backflush import backflush
+from services.idempotency import idempotent
+from services.menu_cache import get_menu
 
 
 bp = Blueprint('sales', __name__, url_prefix='/crm/sales')
@@ -26,8 +33,12 @@ def order_new():
     table_id = request.form.get('table_id') or None
     guest_count = int(request.form.get('guest_count') or '1')
     waiter = request.form.get('waiter') or None
-    order = Order(table_id=table_id, guest_count=guest_count, waiter=waiter)
+    now = datetime.utcnow()
+    order = Order(table_id=table_id, guest_count=guest_count, waiter=waiter, created_at=now)
     db.session.add(order)
+    DailySales.record(now.date(), 'pos', orders=1)
+    db.session.flush()
+    events.publish(events.KITCHEN, id=order.id, status='open')
     db.session.commit()
     return redirect(url_for('sales.order_view', order_id=order.id))
 
@@ -35,25 +46,65 @@ def order_new():
 @bp.route('/order/<int:order_id>')
 @login_required
 def order_view(order_id: int):
-    categories = Category.query.all()
-    products = Product.query.filter_by(active=True).all()
-    order = Order.query.get_or_404(order_id)
-    return render_template('sales/order.html', order=order, categories=categories, products=products)
+    # Сетку блюд страница получает из api/catalog (кэш браузера + ETag), а не из БД
+    order = Order.query.options(selectinload(Order.items)).filter_by(id=order_id).first_or_404()
+    return render_template('sales/order.html', order=order)
+
+
+def _add_line(order_id: int, product, qty: int):
+    """Новая позиция и сумма чека после неё; (None, None), если чек закрыт."""
+    line_sum = Decimal(product.price) * qty
+    total = Order.add_to_total(order_id, line_sum)
+    if total is None:
+        return None, None
+    item = OrderItem(order_id=order_id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum)
+    db.session.add(item)
+    events.publish(events.KITCHEN, id=order_id)
+    return item, total
+
+
+def _change_qty(order_id: int, item_id: int, delta: int):
+    # Позиция блокируется раньше заказа — в том же порядке, что и при удалении
+    item = OrderItem.query.filter_by(id=item_id, order_id=order_id).with_for_update().first_or_404()
+    new_qty = max(1, item.qty + delta)
+    diff = (new_qty - item.qty) * item.unit_price
+    item.qty = new_qty
+    item.sum = item.unit_price * new_qty
+    events.publish(events.KITCHEN, id=order_id)
+    return item, Order.add_to_total(order_id, diff)
+
+
+def _remove_line(order_id: int, item_id: int):
+    table = OrderItem.__table__
+    line_sum = db.session.execute(
+        delete(table).where(table.c.id == item_id, table.c.order_id == order_id).returning(table.c.sum)
+    ).scalar()
+    if line_sum is None:
+        abort(404)
+    events.publish(events.KITCHEN, id=order_id)
+    return Order.add_to_total(order_id, -line_sum)
+
+
+def _order_closed(order_id: int):
+    """Ответ формы, когда правка не прошла: чека нет (404) или он уже оплачен."""
+    db.session.rollback()
+    Order.query.get_or_404(order_id)
+    flash('Чек уже закрыт', 'info')
+    return redirect(url_for('sales.home'))
 
 
 @bp.route('/order/<int:order_id>/add', methods=['POST'])
 @login_required
+@idempotent
 def order_add(order_id: int):
-    order = Order.query.get_or_404(order_id)
     product_id = int(request.form.get('product_id'))
     qty = int(request.form.get('qty') or '1')
     product = Product.query.get_or_404(product_id)
-    line_sum = Decimal(product.price) * qty
-    item = OrderItem(order_id=order.id, product_id=product.id, product_name=product.name, qty=qty, unit_price=product.price, sum=line_sum)
-    order.total = (Decimal(order.total) + line_sum)
-    db.session.add(item)
+    item, total = _add_line(order_id, product, qty)
+    if total is None:
+        return _order_closed(order_id)
     db.session.commit()
-    return redirect(url_for('sales.order_view', order_id=order.id))
+    return redirect(url_for('sales.order_view', order_id=order_id))
 
 
 @bp.route('/order/<int:order_id>/qty', methods=['POST'])
@@ -61,38 +112,162 @@ def order_add(order_id: int):
 def order_qty(order_id: int):
     item_id = int(request.form.get('item_id'))
     delta = int(request.form.get('delta'))
-    order = Order.query.get_or_404(order_id)
-    item = OrderItem.query.get_or_404(item_id)
-    new_qty = max(1, item.qty + delta)
-    diff = (new_qty - item.qty) * item.unit_price
-    item.qty = new_qty
-    item.sum = item.unit_price * new_qty
-    order.total = (Decimal(order.total) + Decimal(diff))
+    item, total = _change_qty(order_id, item_id, delta)
+    if total is None:
+        return _order_closed(order_id)
     db.session.commit()
-    return redirect(url_for('sales.order_view', order_id=order.id))
+    return redirect(url_for('sales.order_view', order_id=order_id))
 
 
 @bp.route('/order/<int:order_id>/remove', methods=['POST'])
 @login_required
 def order_remove(order_id: int):
     item_id = int(request.form.get('item_id'))
-    order = Order.query.get_or_404(order_id)
-    item = OrderItem.query.get_or_404(item_id)
-    order.total = (Decimal(order.total) - Decimal(item.sum))
-    db.session.delete(item)
+    if _remove_line(order_id, item_id) is None:
+        return _order_closed(order_id)
     db.session.commit()
-    return redirect(url_for('sales.order_view', order_id=order.id))
+    return redirect(url_for('sales.order_view', order_id=order_id))
+
+
+# JSON API кассы: одно нажатие — один короткий запрос, в ответе только
+# изменённая позиция и новая сумма чека.
+
+def _line_json(item: OrderItem) -> dict:
+    return {
+        'id': item.id,
+        'product_id': item.product_id,
+        'product_name': item.product_name,
+        'qty': item.qty,
+        'unit_price': float(item.unit_price),
+        'sum': float(item.sum),
+    }
+
+
+def _ensure_open(order_id: int, total) -> None:
+    if total is None:
+        db.session.rollback()
+        Order.query.get_or_404(order_id)
+        abort(make_response(jsonify({'error': 'Чек уже закрыт'}), 409))
+
+
+@bp.route('/api/catalog/')
+@login_required
+def api_catalog():
+    """Сетка блюд кассы из кэша меню; браузер хранит её до смены версии каталога."""
+    menu = get_menu()
+    response = jsonify({
+        'version': menu.version,
+        'categories': [{'id': c.id, 'name': c.name} for c in menu.categories],
+        'products': [
+            {'id': p.id, 'name': p.name, 'price': float(p.price), 'category_id': p.category_id}
+            for p in menu.products
+        ],
+    })
+    response.set_etag(f'pos-menu-{menu.version}')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@bp.route('/api/order/<int:order_id>/')
+@login_required
+def api_order(order_id: int):
+    order = Order.query.options(selectinload(Order.items)).filter_by(id=order_id).first_or_404()
+    return jsonify({
+        'id': order.id,
+        'status': order.status,
+        'total': float(order.total or 0),
+        'lines': [_line_json(i) for i in order.items],
+    })
+
+
+@bp.route('/api/order/<int:order_id>/lines/', methods=['POST'])
+@login_required
+@idempotent
+def api_line_add(order_id: int):
+    data = request.get_json(silent=True) or {}
+    # Цена и название — из кэша меню: нажатие не читает каталог из БД
+    product = get_menu().by_id.get(int(data.get('product_id') or 0))
+    if product is None:
+        return jsonify({'error': 'Блюдо не найдено или снято с продажи'}), 404
+    qty = max(1, int(data.get('qty') or 1))
+    item, total = _add_line(order_id, product, qty)
+    _ensure_open(order_id, total)
+    db.session.flush()
+    # Ответ собирается до commit: после него ORM перечитал бы позицию
+    payload = {'total': float(total), 'line': _line_json(item)}
+    db.session.commit()
+    return jsonify(payload), 201
+
+
+@bp.route('/api/order/<int:order_id>/lines/<int:item_id>/', methods=['PATCH'])
+@login_required
+def api_line_qty(order_id: int, item_id: int):
+    data = request.get_json(silent=True) or {}
+    item, total = _change_qty(order_id, item_id, int(data.get('delta') or 0))
+    _ensure_open(order_id, total)
+    payload = {'total': float(total), 'line': _line_json(item)}
+    db.session.commit()
+    return jsonify(payload)
+
+
+@bp.route('/api/order/<int:order_id>/lines/<int:item_id>/', methods=['DELETE'])
+@login_required
+def api_line_remove(order_id: int, item_id: int):
+    total = _remove_line(order_id, item_id)
+    _ensure_open(order_id, total)
+    payload = {'total': float(total), 'removed': item_id}
+    db.session.commit()
+    return jsonify(payload)
 
 
 @bp.route('/order/<int:order_id>/pay', methods=['POST'])
 @login_required
+@idempotent
 def order_pay(order_id: int):
-    order = Order.query.get_or_404(order_id)
+    # Блокировка строки заказа: повторное закрытие ждёт и видит status='paid'
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
+    if order.status == 'paid':
+        flash('Чек уже закрыт', 'info')
+        return redirect(url_for('sales.home'))
     method = request.form.get('method', 'cash')
     payment = Payment(order_id=order.id, amount=order.total, method=method)
     order.status = 'paid'
     db.session.add(payment)
+    DailySales.record(order.created_at.date(), 'pos', revenue=order.total)
+    backflush(((i.product_id, i.qty) for i in order.items), 'sale', order.id, f'Продажа, чек #{order.id}')
+    events.publish(events.KITCHEN, id=order.id, status='paid')
     db.session.commit()
     flash('Чек закрыт', 'success')
     return redirect(url_for('sales.home'))
 
+
+@bp.route('/kitchen')
+@login_required
+def kitchen():
+    """Кухонный экран: открытые чеки с позициями, обновляется по событиям кассы."""
+    orders = (
+        Order.query.options(joinedload(Order.table), selectinload(Order.items))
+        .filter_by(status='open')
+        .order_by(Order.id.asc())
+        .all()
+    )
+    return render_template('sales/kitchen.html', orders=orders)
+
+
+@bp.route('/kitchen/ticket/<int:order_id>')
+@login_required
+def kitchen_ticket(order_id: int):
+    order = (
+        Order.query.options(joinedload(Order.table), selectinload(Order.items))
+        .filter_by(id=order_id, status='open')
+        .first()
+    )
+    if order is None:
+        return '', 204
+    return render_template('sales/_ticket.html', o=order)
+
+
+@bp.route('/kitchen/events')
+@login_required
+def kitchen_events():
+    return events.event_stream(events.KITCHEN)
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+from datetime import datetime
 from decimal import Decimal
 from typing import Dict, List, Tuple
 
 from flask import (
     Blueprint,
+    abort,
+    make_response,
     render_template,
-    session,
     request,
     redirect,
     url_for,
@@ -15,33 +17,24 @@ from flask import (
     jsonify,
 )
 from flask_login import current_user, login_required
-import os
-from uuid import uuid4
-from werkzeug.utils import secure_filename
 from models.user import User
 
 from app import db
-from models.catalog import Product, Category
-from models.orders import DeliveryOrder, DeliveryOrderItem
+from models.catalog import Product
+from models.orders import DeliveryOrder, DailySales
 from models.crm import Customer, JobApplication
 from models.reviews import Review
+from services import events, images, mailer
+from services.cart_store import load_cart, save_cart
+from services.idempotency import idempotent
+from services.menu_cache import MenuProduct, get_menu
+from services.page_cache import cached_page
+from services.pagination import keyset_page
 
 
 bp = Blueprint('site', __name__)
 
 
-def _get_cart() -> Dict[str, int]:
-    cart = session.get('cart')
-    if not isinstance(cart, dict):
-        cart = {}
-    return {str(k): int(v) for k, v in cart.items() if int(v) > 0}
-
-
-def _save_cart(cart: Dict[str, int]) -> None:
-    session['cart'] = cart
-    session.modified = True
-
-
 def _cart_items(cart: Dict[str, int]) -> Tuple[List[Dict[str, object]], Decimal]:
     if not cart:
         return [], Decimal('0')
@@ -68,46 +61,42 @@ def _cart_items(cart: Dict[str, int]) -> Tuple[List[Dict[str, object]], Decimal]
     return items, total
 
 
-@bp.context_processor
-def inject_cart_summary():
-    cart = _get_cart()
-    quantity = sum(cart.values())
-    return {'site_cart_count': quantity}
+def _conditional(response, etag: str | None = None):
+    """ETag (по версии меню или по содержимому) и 304 на совпавший If-None-Match."""
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    return response.make_conditional(request)
 
 
 @bp.route('/')
+@cached_page
 def home():
-    featured_products = (
-        Product.query.filter_by(active=True)
-        .order_by(Product.price.desc(), Product.name.asc())
-        .limit(6)
-        .all()
-    )
-    categories = Category.query.order_by(Category.name.asc()).limit(6).all()
-    return render_template(
+    menu = get_menu()
+    # Страница зависит и от сессии (корзина, flash), поэтому ETag — по содержимому
+    return _conditional(make_response(render_template(
         'site/home.html',
-        featured_products=featured_products,
-        categories=categories,
-    )
+        featured_products=menu.featured,
+        categories=menu.categories[:6],
+    )))
 
 
 @bp.route('/menu/')
+@cached_page
 def menu():
-    categories = Category.query.order_by(Category.name.asc()).all()
-    products = Product.query.filter_by(active=True).order_by(Product.name.asc()).all()
-    products_by_category: Dict[int | None, List[Product]] = {}
-    for product in products:
-        products_by_category.setdefault(product.category_id, []).append(product)
-    return render_template(
+    menu = get_menu()
+    return _conditional(make_response(render_template(
         'site/menu.html',
-        categories=categories,
-        products_by_category=products_by_category,
-    )
+        categories=menu.categories,
+        products_by_category=menu.by_category,
+    )))
 
 
 @bp.route('/basket/')
 def basket():
-    cart = _get_cart()
+    cart = load_cart()
     items, total = _cart_items(cart)
     return render_template('site/basket.html', items=items, total=total)
 
@@ -119,16 +108,17 @@ def basket_add():
     if not product_id:
         flash('Не удалось определить товар', 'warning')
         return redirect(request.referrer or url_for('site.menu'))
-    cart = _get_cart()
+    cart = load_cart()
     cart[product_id] = cart.get(product_id, 0) + max(1, qty)
-    _save_cart(cart)
+    save_cart(cart)
+    db.session.commit()
     flash('Товар добавлен в корзину', 'success')
     return redirect(request.referrer or url_for('site.basket'))
 
 
 @bp.route('/basket/update', methods=['POST'])
 def basket_update():
-    cart = _get_cart()
+    cart = load_cart()
     for product_id, qty in request.form.items():
         if not product_id.startswith('qty_'):
             continue
@@ -139,7 +129,8 @@ def basket_update():
                 cart.pop(pid, None)
         except ValueError:
             continue
-    _save_cart(cart)
+    save_cart(cart)
+    db.session.commit()
     flash('Корзина обновлена', 'success')
     return redirect(url_for('site.basket'))
 
@@ -147,24 +138,27 @@ def basket_update():
 @bp.route('/basket/remove', methods=['POST'])
 def basket_remove():
     product_id = request.form.get('product_id')
-    cart = _get_cart()
+    cart = load_cart()
     if product_id in cart:
         cart.pop(product_id)
-        _save_cart(cart)
+        save_cart(cart)
+        db.session.commit()
         flash('Товар удалён из корзины', 'info')
     return redirect(url_for('site.basket'))
 
 
 @bp.route('/basket/clear', methods=['POST'])
 def basket_clear():
-    _save_cart({})
+    save_cart({})
+    db.session.commit()
     flash('Корзина очищена', 'info')
     return redirect(url_for('site.basket'))
 
 
 @bp.route('/basket/checkout', methods=['POST'])
+@idempotent
 def basket_checkout():
-    cart = _get_cart()
+    cart = load_cart()
     items, total = _cart_items(cart)
     if not items:
         flash('В корзине нет товаров', 'warning')
@@ -194,7 +188,23 @@ def basket_checkout():
         flash('Укажите имя и контактный телефон', 'warning')
         return redirect(url_for('site.basket'))
 
-    order = DeliveryOrder(
+    if contact_email:
+        email_note = f"E-mail: {contact_email}"
+        comment = f"{comment}\n{email_note}" if comment else email_note
+
+    # Одна транзакция: заказ, позиции, клиент, витрина, событие доски и очистка корзины
+    created_at = datetime.utcnow()
+    order_id = DeliveryOrder.place(
+        (
+            {
+                'product_id': item['product'].id,
+                'product_name': item['product'].name,
+                'qty': item['quantity'],
+                'unit_price': item['price'],
+                'sum': item['line_total'],
+            }
+            for item in items
+        ),
         status='new',
         source='site',
         customer_name=customer_name,
@@ -206,42 +216,22 @@ def basket_checkout():
         receive_method='delivery',
         payment_type=request.form.get('payment_type') or 'cash',
         total=total,
+        created_at=created_at,
+        user_id=current_user.id if current_user.is_authenticated else None,
     )
-    if current_user.is_authenticated:
-        order.user_id = current_user.id
-    if contact_email:
-        email_note = f"E-mail: {contact_email}"
-        order.comment = f"{order.comment}\n{email_note}" if order.comment else email_note
-    order.phone = contact_phone
-    db.session.add(order)
-    db.session.flush()
-
-    for item in items:
-        product: Product = item['product']
-        db.session.add(
-            DeliveryOrderItem(
-                order_id=order.id,
-                product_id=product.id,
-                product_name=product.name,
-                qty=item['quantity'],
-                unit_price=item['price'],
-                sum=item['line_total'],
-            )
-        )
-
-    customer = Customer.query.filter_by(phone=contact_phone).first()
-    if not customer:
-        customer = Customer(phone=contact_phone, name=customer_name)
-        db.session.add(customer)
-    customer.points = (customer.points or 0) + int(total)
+    Customer.add_points(contact_phone, customer_name, int(total))
+    DailySales.record(created_at.date(), 'site', deliveries=1)
+    events.publish(events.DELIVERY, id=order_id, status='new')
+    mailer.order_placed(contact_email, order_id, customer_name, total)
+    save_cart({})
 
     db.session.commit()
-    _save_cart({})
     flash('Спасибо! Заказ принят, мы свяжемся с вами.', 'success')
     return redirect(url_for('site.profile') if current_user.is_authenticated else url_for('site.home'))
 
 
 @bp.route('/policy/')
+@cached_page
 def policy():
     return render_template('site/policy.html')
 
@@ -257,6 +247,7 @@ def _parse_rating(raw: str | None) -> int:
 
 
 @bp.route('/reviews/', methods=['GET', 'POST'])
+@cached_page
 def reviews():
     form_data = {
         'service_rating': request.form.get('service_rating', '5'),
@@ -291,13 +282,33 @@ def reviews():
             flash('Спасибо за отзыв! Он поможет нам стать лучше.', 'success')
             return redirect(url_for('site.reviews') + '#reviews-list')
 
-    reviews_list = Review.query.order_by(Review.created_at.desc()).all()
-    return render_template('site/reviews.html', reviews=reviews_list, form_data=form_data)
+    page = keyset_page(Review.query, Review.created_at, Review.id, descending=True)
+    return render_template('site/reviews.html', reviews=page.items, page=page, form_data=form_data)
+
+
+@bp.route('/api/reviews/')
+def reviews_api():
+    page = keyset_page(Review.query, Review.created_at, Review.id, descending=True)
+    return jsonify(page.as_json(lambda r: {
+        'id': r.id,
+        'author_name': r.author_name or 'Гость',
+        'created_at': r.created_at.isoformat(),
+        'service_rating': r.service_rating,
+        'product_rating': r.product_rating,
+        'ambience_rating': r.ambience_rating,
+        'recommend_rating': r.recommend_rating,
+        'average_score': r.average_score(),
+        'comment': r.comment,
+        'location': r.location,
+    }))
 
 
 @bp.route('/api/products/<int:product_id>/')
 def product_details(product_id: int):
-    product = Product.query.filter_by(id=product_id, active=True).first_or_404()
+    menu = get_menu()
+    product: MenuProduct | None = menu.by_id.get(product_id)
+    if product is None:
+        abort(404)
     image_url = product.image_url or ''
     if image_url and not image_url.startswith(('http://', 'https://')):
         image_url = url_for('static', filename=image_url)
@@ -312,12 +323,15 @@ def product_details(product_id: int):
         'fat_100g': float(product.fat_100g) if product.fat_100g is not None else None,
         'carb_100g': float(product.carb_100g) if product.carb_100g is not None else None,
         'kcal_100g': product.kcal_100g,
-        'category': product.category.name if product.category else None,
+        'category': product.category_name,
     }
-    return jsonify(data)
+    response = jsonify(data)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return _conditional(response, f'menu-{menu.version}-{product_id}')
 
 
 @bp.route('/work/', methods=['GET', 'POST'])
+@cached_page
 def work():
     if request.method == 'POST':
         name = (request.form.get('name') or '').strip()
@@ -333,10 +347,11 @@ def work():
                 name=name[:120],
                 desired_position=desired_position[:120] or None,
                 city=city[:120] or None,
-                phone=contact_phone[:50] or None,
+                phone=phone[:50] or None,
                 email=email[:120] or None,
             )
             db.session.add(application)
+            mailer.application_received(email, name, desired_position or None)
             db.session.commit()
             flash('Спасибо! Мы свяжемся с вами.', 'success')
             return redirect(url_for('site.work'))
@@ -416,26 +431,14 @@ def update_password():
 def update_avatar():
     avatar = request.files.get('avatar')
     if avatar and avatar.filename:
-        ext = os.path.splitext(avatar.filename)[1].lower()
-        if ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-            flash('Неподдерживаемый формат изображения. Используйте JPG, PNG, GIF или WEBP', 'warning')
+        try:
+            incoming = images.accept(avatar)
+        except images.ImageRejected as exc:
+            flash(str(exc), 'warning')
             return redirect(url_for('site.profile'))
-
-        if current_user.avatar_url:
-            try:
-                old_path = current_user.avatar_url.replace('/static/', '')
-                full_old_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', old_path)
-                if os.path.exists(full_old_path):
-                    os.remove(full_old_path)
-            except Exception:
-                pass
-        uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads', 'avatars')
-        os.makedirs(uploads_dir, exist_ok=True)
-        filename = secure_filename(f"{uuid4().hex}{ext}")
-        avatar.save(os.path.join(uploads_dir, filename))
-        current_user.avatar_url = f"/static/uploads/avatars/{filename}"
+        pending = images.schedule('avatar', current_user.id, incoming)
         db.session.commit()
-        flash('Аватар успешно обновлен', 'success')
+        flash(images.PENDING_NOTICE if pending else 'Аватар успешно обновлен', 'success')
     else:
         flash('Файл не выбран', 'warning')
     return redirect(url_for('site.profile'))
@@ -444,16 +447,10 @@ def update_avatar():
 @bp.route('/profile/delete-avatar', methods=['POST'])
 @login_required
 def delete_avatar():
-    if current_user.avatar_url:
-        try:
-            avatar_path = current_user.avatar_url.replace('/static/', '')
-            full_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', avatar_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
-        except Exception:
-            pass
+    avatar_url = current_user.avatar_url
     current_user.avatar_url = None
     db.session.commit()
+    images.remove(avatar_url)
     flash('Аватар удален', 'success')
     return redirect(url_for('site.profile'))
 
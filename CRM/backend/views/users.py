@@ -1,10 +1,14 @@
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import current_user, login_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from app import db
 from models.user import User, Role
+from services import auth
+from services.pagination import keyset_page
 
 bp = Blueprint('users', __name__, url_prefix='/crm/users')
 
@@ -18,13 +22,6 @@ ROLE_DESCRIPTIONS: Dict[str, str] = {
 ROLE_ORDER = ['user', 'staff', 'manager', 'admin']
 
 
-def _is_admin(user: Optional[User]) -> bool:
-    if not user:
-        return False
-    role_name = (user.role.name if user.role else user.role_name or '').lower()
-    return role_name == 'admin'
-
-
 def _ensure_core_roles() -> List[Role]:
     core_names = set(ROLE_ORDER)
     existing_roles = Role.query.filter(Role.name.in_(core_names)).all()
@@ -41,34 +38,48 @@ def _ensure_core_roles() -> List[Role]:
     return sorted(existing_roles, key=lambda r: role_index.get(r.name, len(role_index)))
 
 
-def _normalize_role_name(user: User) -> str:
-    if user.role:
-        return (user.role.name or '').lower()
-    return (user.role_name or '').lower()
-
-
 @bp.before_request
 def ensure_admin_access():
     if not current_user.is_authenticated:
         return current_app.login_manager.unauthorized()
-    if not _is_admin(current_user):
-        abort(403)
+    auth.ensure_admin()
+
+
+def _users_page():
+    # Пользователи без имени — в конце списка, как и раньше
+    return keyset_page(
+        User.query.options(joinedload(User.role)),
+        User.full_name.is_(None), func.coalesce(User.full_name, ''), User.email, User.id,
+    )
 
 
 @bp.route('/', methods=['GET'])
 @login_required
 def index():
     roles = _ensure_core_roles()
-    users = User.query.order_by(User.full_name.is_(None), User.full_name.asc(), User.email.asc()).all()
+    page = _users_page()
     return render_template(
         'users/index.html',
-        users=users,
+        users=page.items,
+        page=page,
         roles=roles,
         role_descriptions=ROLE_DESCRIPTIONS,
-        normalize_role=_normalize_role_name,
+        normalize_role=auth.role_of,
     )
 
 
+@bp.route('/api/')
+@login_required
+def index_api():
+    page = _users_page()
+    return jsonify(page.as_json(lambda u: {
+        'id': u.id,
+        'email': u.email,
+        'full_name': u.full_name,
+        'role': auth.role_of(u),
+    }))
+
+
 @bp.route('/<int:user_id>/role', methods=['POST'])
 @login_required
 def update_role(user_id: int):